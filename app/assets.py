@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+try:
+    import brotli  # optional, only used to precompress assets
+except ImportError:
+    brotli = None
+
+
+# Files under static/ that get fingerprinted. Uploads already have random names.
+FINGERPRINT_SUFFIXES = {".js", ".css", ".svg", ".json", ".txt"}
+COMPRESSIBLE_SUFFIXES = {".js", ".css", ".svg", ".json", ".txt", ".html"}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+MEDIA_TYPES = {
+    ".js": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".svg": "image/svg+xml",
+    ".json": "application/json",
+    ".txt": "text/plain; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+}
+
+
+class StaticAsset:
+    """A static file loaded into memory together with its precompressed variants."""
+
+    def __init__(self, name: str, content: bytes, mtime: float):
+        self.name = name
+        self.digest = hashlib.sha256(content).hexdigest()[:12]
+        path = Path(name)
+        self.hashed_name = path.with_name(f"{path.stem}.{self.digest}{path.suffix}").as_posix()
+        self.media_type = MEDIA_TYPES.get(path.suffix, "application/octet-stream")
+        self.etag = f'"{self.digest}"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+
+        # encoding -> body; only keep compressed variants that actually save bytes
+        self.bodies: Dict[str, bytes] = {"identity": content}
+        if path.suffix in COMPRESSIBLE_SUFFIXES:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.bodies["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+                if len(compressed) < len(content):
+                    self.bodies["br"] = compressed
+
+    def pick_encoding(self, accept_encoding: str) -> str:
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and encoding in accepted:
+                return encoding
+        return "identity"
+
+
+class AssetManifest:
+    """Content-hashed manifest of static assets, computed once at startup."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.assets: Dict[str, StaticAsset] = {}
+        self._by_hashed_name: Dict[str, StaticAsset] = {}
+
+    def build(self) -> "AssetManifest":
+        assets = {}
+        for path in sorted(self.directory.iterdir()):
+            if not path.is_file() or path.suffix not in FINGERPRINT_SUFFIXES:
+                continue
+            asset = StaticAsset(path.name, path.read_bytes(), path.stat().st_mtime)
+            assets[asset.name] = asset
+        self.assets = assets
+        self._by_hashed_name = {asset.hashed_name: asset for asset in assets.values()}
+        return self
+
+    def url(self, name: str) -> str:
+        """Return the fingerprinted URL for a static file (falls back to the plain path)."""
+        asset = self.assets.get(name)
+        return f"/static/{asset.hashed_name if asset else name}"
+
+    def lookup(self, path: str):
+        """Resolve a request path to (asset, is_hashed) or (None, False)."""
+        asset = self._by_hashed_name.get(path)
+        if asset is not None:
+            return asset, True
+        return self.assets.get(path), False
+
+
+class HashedStaticFiles(StaticFiles):
+    """StaticFiles that serves manifest assets from memory, precompressed.
+
+    Fingerprinted paths are cached forever; plain paths are revalidated via ETag.
+    Anything outside the manifest (e.g. uploads) goes through StaticFiles as usual.
+    """
+
+    def __init__(self, *args, manifest: Optional[AssetManifest] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope) -> Response:
+        asset, is_hashed = (None, False)
+        if self.manifest is not None and scope["method"] in ("GET", "HEAD"):
+            asset, is_hashed = self.manifest.lookup(path)
+        if asset is None:
+            return await super().get_response(path, scope)
+
+        cache_control = IMMUTABLE_CACHE_CONTROL if is_hashed else REVALIDATE_CACHE_CONTROL
+        return asset_response(asset, Headers(scope=scope), scope["method"], cache_control)
+
+
+def asset_response(asset: StaticAsset, request_headers: Headers, method: str, cache_control: str) -> Response:
+    """Build a (possibly 304) response for an in-memory asset, honouring Accept-Encoding."""
+    encoding = asset.pick_encoding(request_headers.get("accept-encoding", ""))
+    headers = {
+        "cache-control": cache_control,
+        "etag": asset.etag,
+        "last-modified": asset.last_modified,
+        "vary": "Accept-Encoding",
+    }
+    if encoding != "identity":
+        headers["content-encoding"] = encoding
+
+    if_none_match = request_headers.get("if-none-match", "")
+    if asset.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    body = asset.bodies[encoding]
+    if method == "HEAD":
+        headers["content-length"] = str(len(body))
+        return Response(status_code=200, headers=headers, media_type=asset.media_type)
+    return Response(body, headers=headers, media_type=asset.media_type)
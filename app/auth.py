@@ -0,0 +1,136 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from fastapi import Depends, Header, HTTPException, status
+
+from .settings import settings
+
+
+class InitDataError(ValueError):
+    pass
+
+
+class TelegramUser:
+    """Identity taken from verified Telegram WebApp initData."""
+
+    def __init__(self, id: int, auth_date: int, data: dict):
+        self.id = id
+        self.auth_date = auth_date
+        self.data = data  # the decoded "user" object
+
+
+@lru_cache(maxsize=4)
+def _secret_key(bot_token: str) -> bytes:
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+def verify_init_data(init_data: str, bot_token: str, max_age: int, now: Optional[float] = None) -> TelegramUser:
+    """Check the initData signature and age, as described in the Telegram Mini Apps docs.
+
+    Raises InitDataError when the data is malformed, forged or expired.
+    """
+    try:
+        fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+    except ValueError:
+        raise InitDataError("malformed initData")
+    received_hash = fields.pop("hash", None)
+    if not received_hash:
+        raise InitDataError("initData is not signed")
+
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    expected_hash = hmac.new(_secret_key(bot_token), data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        raise InitDataError("invalid initData signature")
+
+    try:
+        auth_date = int(fields["auth_date"])
+        user = json.loads(fields["user"])
+        user_id = int(user["id"])
+    except (KeyError, ValueError, TypeError):
+        raise InitDataError("initData has no user")
+    if max_age and (now if now is not None else time.time()) - auth_date > max_age:
+        raise InitDataError("initData has expired")
+    return TelegramUser(user_id, auth_date, user)
+
+
+class InitDataCache:
+    """Bounded LRU of verified initData, so one session is not re-hashed per request.
+
+    Keyed by the raw initData string: its hash field already makes it unique
+    per session, and using the whole string means a known hash can never be
+    paired with different fields. A hit rechecks auth_date so an entry never
+    outlives the initData's own expiry.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()  # sync routes run in the threadpool
+
+    def verify(self, init_data: str, bot_token: str, max_age: int) -> TelegramUser:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(init_data)
+            if entry is not None:
+                user, cached_at = entry
+                if now - cached_at < self.ttl and not (max_age and now - user.auth_date > max_age):
+                    self._entries.move_to_end(init_data)
+                    return user
+                del self._entries[init_data]
+
+        user = verify_init_data(init_data, bot_token, max_age, now)
+        with self._lock:
+            self._entries[init_data] = (user, now)
+            self._entries.move_to_end(init_data)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return user
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+init_data_cache = InitDataCache(settings.auth_cache_size, settings.auth_cache_ttl)
+
+
+def legacy_header_allowed() -> bool:
+    # Without a bot token nothing can be verified (local development)
+    return settings.auth_allow_telegram_id_header or not settings.bot_token
+
+
+def authenticate(init_data: Optional[str], telegram_id: Optional[str]) -> int:
+    """Telegram user id of the caller; raises HTTPException when not authenticated."""
+    if init_data and settings.bot_token:
+        try:
+            return init_data_cache.verify(init_data, settings.bot_token, settings.auth_max_age).id
+        except InitDataError as e:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+    if telegram_id is not None and legacy_header_allowed():
+        try:
+            return int(telegram_id)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid X-Telegram-Id header")
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="X-Telegram-Init-Data header missing")
+
+
+def get_telegram_user_id(
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    x_telegram_id: Optional[str] = Header(None, alias="X-Telegram-Id"),
+) -> int:
+    """Authenticated Telegram user id (shared dependency for all routers)."""
+    return authenticate(x_telegram_init_data, x_telegram_id)
+
+
+def require_admin(telegram_user_id: int = Depends(get_telegram_user_id)) -> int:
+    if telegram_user_id != settings.admin_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    return telegram_user_id
@@ -0,0 +1,183 @@
+"""
+Обработчики команд Telegram бота.
+
+Общий роутер подключается и в bot.py (long polling), и в API процессе
+(webhook режим, см. app/telegram.py), поэтому бот ведёт себя одинаково
+в обоих режимах.
+"""
+
+import logging
+
+from aiogram import F, Router, types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
+
+from .menu import MenuPage, menu_cache
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+router = Router(name="bakery")
+
+MENU_CALLBACK_PREFIX = "menu:"
+
+
+@router.message(Command("start"))
+async def start_command(message: types.Message):
+    """
+    Обработчик команды /start
+    Отправляет приветственное сообщение с кнопкой для открытия Mini App
+    """
+    user_id = message.from_user.id
+    username = message.from_user.username or message.from_user.first_name
+    
+    # Проверяем, является ли пользователь администратором
+    is_admin = user_id == settings.admin_id
+    
+    welcome_text = f"👋 Привет, {username}!\n\n"
+    welcome_text += "🍰 Добро пожаловать в пекарню 'Свежая выпечка'!\n\n"
+    
+    if is_admin:
+        welcome_text += "👑 Вы вошли как администратор.\n"
+        welcome_text += "У вас есть доступ к панели управления товарами.\n\n"
+    else:
+        welcome_text += "📱 Здесь вы можете:\n"
+        welcome_text += "• Просматривать наше меню\n"
+        welcome_text += "• Делать заказы\n"
+        welcome_text += "• Узнавать о доставке\n\n"
+    
+    welcome_text += "Нажмите кнопку ниже, чтобы открыть приложение:"
+    
+    # Создаем кнопку для открытия Mini App
+    web_app_button = types.InlineKeyboardButton(
+        text="🍰 Открыть пекарню" if not is_admin else "👑 Открыть админ-панель",
+        web_app=types.WebAppInfo(url=settings.web_app_url)
+    )
+    
+    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[web_app_button]])
+    
+    await message.answer(
+        welcome_text,
+        reply_markup=keyboard
+    )
+    
+    logger.info(f"Пользователь {user_id} ({username}) {'админ' if is_admin else 'обычный'} открыл бота")
+
+@router.message(Command("help"))
+async def help_command(message: types.Message):
+    """
+    Обработчик команды /help
+    Показывает справку по использованию бота
+    """
+    help_text = """
+🤖 <b>Справка по боту пекарни</b>
+
+<b>Доступные команды:</b>
+/start - Начать работу с ботом
+/help - Показать эту справку
+/menu - Открыть меню пекарни
+/admin - Информация для администраторов
+
+<b>Как пользоваться:</b>
+1. Нажмите /start для начала
+2. Нажмите кнопку "Открыть пекарню"
+3. Выберите товары и оформите заказ
+
+<b>Поддержка:</b>
+Если у вас есть вопросы, обратитесь к администратору.
+    """
+    
+    await message.answer(help_text, parse_mode="HTML")
+
+@router.message(Command("menu"))
+async def menu_command(message: types.Message):
+    """
+    Обработчик команды /menu
+    Отправляет актуальное меню из базы (первую страницу) с кнопками товаров
+    """
+    page = await menu_cache.get_page(0)
+    await message.answer(page.text, reply_markup=menu_keyboard(page), parse_mode="HTML")
+
+@router.callback_query(F.data.startswith(MENU_CALLBACK_PREFIX))
+async def menu_page_callback(callback: types.CallbackQuery):
+    """
+    Листание страниц меню кнопками «‹ Назад» / «Далее ›»
+    """
+    try:
+        page_number = int(callback.data[len(MENU_CALLBACK_PREFIX):])
+    except ValueError:
+        page_number = 0
+    page = await menu_cache.get_page(page_number)
+    if callback.message is not None:
+        try:
+            await callback.message.edit_text(page.text, reply_markup=menu_keyboard(page), parse_mode="HTML")
+        except TelegramBadRequest:
+            # "message is not modified" — пользователь нажал на текущую страницу
+            pass
+    await callback.answer()
+
+def menu_keyboard(page: MenuPage) -> types.InlineKeyboardMarkup:
+    """Клавиатура страницы меню; собирается один раз и хранится вместе со страницей."""
+    if page.markup is None:
+        rows = [
+            [types.InlineKeyboardButton(text=label, web_app=types.WebAppInfo(url=url))]
+            for label, url in page.buttons
+        ]
+        if page.pages > 1:
+            nav = []
+            if page.page > 0:
+                nav.append(types.InlineKeyboardButton(
+                    text="‹ Назад", callback_data=f"{MENU_CALLBACK_PREFIX}{page.page - 1}"))
+            nav.append(types.InlineKeyboardButton(
+                text=f"{page.page + 1}/{page.pages}", callback_data=f"{MENU_CALLBACK_PREFIX}{page.page}"))
+            if page.page < page.pages - 1:
+                nav.append(types.InlineKeyboardButton(
+                    text="Далее ›", callback_data=f"{MENU_CALLBACK_PREFIX}{page.page + 1}"))
+            rows.append(nav)
+        rows.append([types.InlineKeyboardButton(
+            text="🍰 Открыть меню", web_app=types.WebAppInfo(url=settings.web_app_url))])
+        page.markup = types.InlineKeyboardMarkup(inline_keyboard=rows)
+    return page.markup
+
+@router.message(Command("admin"))
+async def admin_command(message: types.Message):
+    """
+    Обработчик команды /admin
+    Показывает информацию для администраторов
+    """
+    user_id = message.from_user.id
+    
+    if user_id == settings.admin_id:
+        admin_text = "👑 <b>Панель администратора</b>\n\n"
+        admin_text += "У вас есть доступ к следующим функциям:\n"
+        admin_text += "• Добавление новых товаров\n"
+        admin_text += "• Редактирование существующих товаров\n"
+        admin_text += "• Удаление товаров\n"
+        admin_text += "• Просмотр всех заказов\n"
+        admin_text += "• Загрузка изображений\n\n"
+        admin_text += "Нажмите кнопку ниже, чтобы открыть админ-панель:"
+        
+        web_app_button = types.InlineKeyboardButton(
+            text="👑 Открыть админ-панель",
+            web_app=types.WebAppInfo(url=settings.web_app_url)
+        )
+        
+        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[web_app_button]])
+        
+        await message.answer(admin_text, reply_markup=keyboard, parse_mode="HTML")
+    else:
+        await message.answer(
+            "❌ У вас нет прав администратора.\n"
+            "Обратитесь к администратору для получения доступа.",
+            parse_mode="HTML"
+        )
+
+@router.message()
+async def handle_other_messages(message: types.Message):
+    """
+    Обработчик всех остальных сообщений
+    """
+    await message.answer(
+        "🤖 Я не понимаю эту команду.\n"
+        "Используйте /help для получения справки или /start для начала работы."
+    )
@@ -0,0 +1,366 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from sqlalchemy import func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .settings import settings
+from .telegram import get_telegram_bot
+
+logger = logging.getLogger(__name__)
+
+
+LEASE_TIMEOUT = timedelta(seconds=60)  # a runner silent for this long is presumed dead
+HEARTBEAT_INTERVAL = LEASE_TIMEOUT / 3  # lease renewed this often, even while nothing is sent
+RESUME_INTERVAL = LEASE_TIMEOUT         # unfinished broadcasts without a live runner picked up this often
+FLUSH_EVERY = 50                       # results persisted per batch
+FLUSH_INTERVAL = 1.0                   # ... or at least this often (seconds)
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, bursts up to ``capacity``.
+
+    The default capacity of one token spaces sends evenly; a larger burst on
+    top of a full rate would trip Telegram's per-second limit.
+
+    pause() stops handing out tokens for a while, which is how a Telegram 429
+    (retry_after) is honoured for every sender sharing the bucket.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else 1.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+def create_broadcast(db: Session, text: str) -> models.Broadcast:
+    """Create a broadcast addressed to every customer who has ordered, minus blocked chats."""
+    broadcast = models.Broadcast(text=text, status=models.BroadcastStatus.PENDING)
+    db.add(broadcast)
+    db.flush()
+
+    # One INSERT ... SELECT DISTINCT: the recipient list never passes through Python
+    customers = (
+        select(literal(broadcast.id), models.Order.telegram_user_id)
+        .where(models.Order.telegram_user_id.not_in(select(models.BlockedUser.telegram_user_id)))
+        .distinct()
+    )
+    result = db.execute(
+        insert(models.BroadcastRecipient).from_select(["broadcast_id", "telegram_user_id"], customers)
+    )
+    broadcast.total = result.rowcount
+    db.commit()
+    db.refresh(broadcast)
+    return broadcast
+
+
+def _claim(broadcast_id: int, runner_id: str) -> bool:
+    """Take the lease on a broadcast; False if another live process holds it."""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(models.Broadcast)
+            .where(
+                models.Broadcast.id == broadcast_id,
+                models.Broadcast.status.in_([models.BroadcastStatus.PENDING, models.BroadcastStatus.RUNNING]),
+                or_(
+                    models.Broadcast.runner_id.is_(None),
+                    models.Broadcast.runner_id == runner_id,
+                    models.Broadcast.heartbeat_at < now - LEASE_TIMEOUT,
+                ),
+            )
+            .values(
+                status=models.BroadcastStatus.RUNNING,
+                runner_id=runner_id,
+                heartbeat_at=now,
+                started_at=func.coalesce(models.Broadcast.started_at, now),
+            )
+        )
+        db.commit()
+        return result.rowcount == 1
+    finally:
+        db.close()
+
+
+def _unfinished_broadcasts() -> List[int]:
+    db = SessionLocal()
+    try:
+        return [row[0] for row in db.query(models.Broadcast.id).filter(
+            models.Broadcast.status.in_([models.BroadcastStatus.PENDING, models.BroadcastStatus.RUNNING])
+        ).all()]
+    finally:
+        db.close()
+
+
+def _broadcast_text(broadcast_id: int) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        return db.query(models.Broadcast.text).filter(models.Broadcast.id == broadcast_id).scalar()
+    finally:
+        db.close()
+
+
+def _pending_recipients(broadcast_id: int) -> List[tuple]:
+    db = SessionLocal()
+    try:
+        return db.query(
+            models.BroadcastRecipient.id,
+            models.BroadcastRecipient.telegram_user_id,
+            models.BroadcastRecipient.attempts,
+        ).filter(
+            models.BroadcastRecipient.broadcast_id == broadcast_id,
+            models.BroadcastRecipient.status == models.RecipientStatus.PENDING,
+        ).order_by(models.BroadcastRecipient.id).all()
+    finally:
+        db.close()
+
+
+def _flush(broadcast_id: int, runner_id: str, results: List[dict], finished: bool, release: bool = False) -> bool:
+    """Persist a batch of recipient results and the counters in one transaction.
+
+    ``release`` gives the lease up (this process is shutting down), so that
+    the next one resumes the broadcast without waiting for LEASE_TIMEOUT.
+    Returns False when the broadcast was cancelled or the lease was lost.
+    """
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        counts = Counter(result["status"] for result in results)
+        if results:
+            # ORM bulk UPDATE by primary key: one executemany for the whole batch
+            db.execute(update(models.BroadcastRecipient), [
+                {key: value for key, value in result.items() if key != "telegram_user_id"}
+                for result in results
+            ])
+            for result in results:
+                if result["status"] == models.RecipientStatus.BLOCKED:
+                    db.merge(models.BlockedUser(
+                        telegram_user_id=result["telegram_user_id"], reason=result["error"], blocked_at=now,
+                    ))
+        values = {
+            "sent": models.Broadcast.sent + counts.get(models.RecipientStatus.SENT, 0),
+            "failed": models.Broadcast.failed + counts.get(models.RecipientStatus.FAILED, 0),
+            "blocked": models.Broadcast.blocked + counts.get(models.RecipientStatus.BLOCKED, 0),
+            "heartbeat_at": now,
+        }
+        # Counters are applied even if the broadcast was cancelled meanwhile:
+        # these messages were delivered
+        db.execute(
+            update(models.Broadcast)
+            .where(models.Broadcast.id == broadcast_id, models.Broadcast.runner_id == runner_id)
+            .values(**values)
+        )
+        # Still ours and still running? (cancel flips the status, a takeover the runner)
+        if finished:
+            values = {"status": models.BroadcastStatus.COMPLETED, "finished_at": now}
+        else:
+            values = {"runner_id": None} if release else {"heartbeat_at": now}
+        running = db.execute(
+            update(models.Broadcast)
+            .where(
+                models.Broadcast.id == broadcast_id,
+                models.Broadcast.runner_id == runner_id,
+                models.Broadcast.status == models.BroadcastStatus.RUNNING,
+            )
+            .values(**values)
+        ).rowcount == 1
+        db.commit()
+        return running
+    finally:
+        db.close()
+
+
+class BroadcastRunner:
+    """Sends one broadcast: a shared token bucket, N concurrent senders, batched progress."""
+
+    def __init__(self, broadcast_id: int, runner_id: str, bucket: TokenBucket):
+        self.broadcast_id = broadcast_id
+        self.runner_id = runner_id
+        self.bucket = bucket
+        self._results: List[dict] = []
+        self._last_flush = time.monotonic()
+        self._flush_lock = asyncio.Lock()
+        self.stopped = False  # cancelled or lease lost
+
+    async def run(self, text: str) -> None:
+        queue: asyncio.Queue = asyncio.Queue()
+        for recipient in await asyncio.to_thread(_pending_recipients, self.broadcast_id):
+            queue.put_nowait(recipient)
+
+        senders = [
+            asyncio.create_task(self._sender(queue, text))
+            for _ in range(max(1, settings.broadcast_concurrency))
+        ]
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await asyncio.gather(*senders)
+        except asyncio.CancelledError:
+            # Shutdown: save what was sent and hand the lease back
+            await self._flush(finished=False, release=True)
+            raise
+        finally:
+            heartbeat.cancel()
+            for sender in senders:
+                sender.cancel()
+        await self._flush(finished=not self.stopped)
+
+    async def _heartbeat(self) -> None:
+        # Senders flush only after a send; during a long retry_after pause
+        # nothing would renew the lease and another process could take over
+        while not self.stopped:
+            await asyncio.sleep(HEARTBEAT_INTERVAL.total_seconds())
+            await self._flush(finished=False)
+
+    async def _sender(self, queue: asyncio.Queue, text: str) -> None:
+        from aiogram.exceptions import (
+            TelegramBadRequest,
+            TelegramForbiddenError,
+            TelegramNotFound,
+            TelegramRetryAfter,
+        )
+
+        bot = get_telegram_bot()
+        while not self.stopped:
+            try:
+                recipient_id, chat_id, attempts = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await self.bucket.acquire()
+            if self.stopped:
+                return  # the lease was lost while waiting; the new runner sends it
+            attempts += 1
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+                self._record(recipient_id, chat_id, models.RecipientStatus.SENT, attempts)
+            except TelegramRetryAfter as e:
+                # Flood limit: every sender backs off, then this chat is retried
+                self.bucket.pause(e.retry_after)
+                queue.put_nowait((recipient_id, chat_id, attempts - 1))
+            except (TelegramForbiddenError, TelegramNotFound) as e:
+                self._record(recipient_id, chat_id, models.RecipientStatus.BLOCKED, attempts, e.message)
+            except TelegramBadRequest as e:
+                if "chat not found" in e.message.lower():
+                    self._record(recipient_id, chat_id, models.RecipientStatus.BLOCKED, attempts, e.message)
+                else:
+                    self._record(recipient_id, chat_id, models.RecipientStatus.FAILED, attempts, e.message)
+            except Exception as e:
+                if attempts < settings.broadcast_max_attempts:
+                    queue.put_nowait((recipient_id, chat_id, attempts))
+                else:
+                    self._record(recipient_id, chat_id, models.RecipientStatus.FAILED, attempts, str(e))
+            if len(self._results) >= FLUSH_EVERY or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                await self._flush(finished=False)
+
+    def _record(self, recipient_id: int, chat_id: int, status, attempts: int, error: Optional[str] = None):
+        self._results.append({
+            "id": recipient_id,
+            "telegram_user_id": chat_id,
+            "status": status,
+            "attempts": attempts,
+            "error": error[:255] if error else None,
+        })
+
+    async def _flush(self, finished: bool, release: bool = False) -> None:
+        async with self._flush_lock:
+            results, self._results = self._results, []
+            self._last_flush = time.monotonic()
+            # Even with no results: the flush renews the lease
+            still_running = await asyncio.to_thread(
+                _flush, self.broadcast_id, self.runner_id, results, finished, release
+            )
+            if not still_running:
+                self.stopped = True
+
+
+class BroadcastManager:
+    """Runs broadcasts in this process and resumes interrupted ones on startup."""
+
+    def __init__(self):
+        self.runner_id = uuid4().hex
+        self.bucket = TokenBucket(settings.broadcast_rate)
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._resumer: Optional[asyncio.Task] = None
+
+    async def start(self, broadcast_id: int) -> bool:
+        if broadcast_id in self._tasks or get_telegram_bot() is None:
+            return False
+        if not await asyncio.to_thread(_claim, broadcast_id, self.runner_id):
+            return False
+        task = asyncio.create_task(self._run(broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+        return True
+
+    async def _run(self, broadcast_id: int) -> None:
+        text = await asyncio.to_thread(_broadcast_text, broadcast_id)
+        try:
+            runner = BroadcastRunner(broadcast_id, self.runner_id, self.bucket)
+            await runner.run(text)
+            logger.info("Broadcast %s %s", broadcast_id, "stopped" if runner.stopped else "finished")
+        except Exception:
+            logger.exception("Broadcast %s stopped", broadcast_id)
+
+    async def resume(self) -> None:
+        """Pick up broadcasts left running by a crashed or restarted process."""
+        for broadcast_id in await asyncio.to_thread(_unfinished_broadcasts):
+            await self.start(broadcast_id)
+
+    def start_resuming(self) -> None:
+        """resume() now and every RESUME_INTERVAL.
+
+        Once is not enough: a crashed worker's lease only expires after
+        LEASE_TIMEOUT, and in a rolling restart the old worker still holds
+        its lease while the new one starts.
+        """
+        if self._resumer is None:
+            self._resumer = asyncio.create_task(self._resume_loop())
+
+    async def _resume_loop(self) -> None:
+        while True:
+            try:
+                await self.resume()
+            except Exception:
+                logger.exception("Resuming broadcasts failed")
+            await asyncio.sleep(RESUME_INTERVAL.total_seconds())
+
+    async def stop(self) -> None:
+        if self._resumer is not None:
+            self._resumer.cancel()
+            await asyncio.gather(self._resumer, return_exceptions=True)
+            self._resumer = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+broadcast_manager = BroadcastManager()
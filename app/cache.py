@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import catalog
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[str, str], None]
+
+
+class MemoryCache:
+    """Per-process cache and pub/sub: exact for a single worker, per-worker otherwise."""
+
+    CLEANUP_EVERY = 1024
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[bytes, Optional[float]]] = {}  # key -> (value, expires at)
+        self._handlers: Dict[str, List[MessageHandler]] = {}
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._writes += 1
+        if self._writes % self.CLEANUP_EVERY == 0:
+            now = time.monotonic()
+            self._entries = {
+                key: entry for key, entry in self._entries.items() if entry[1] is None or entry[1] > now
+            }
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._entries[key] = (str(value).encode(), None)
+        return value
+
+    async def publish(self, channel: str, message: str) -> None:
+        for handler in list(self._handlers.get(channel, ())):
+            handler(channel, message)
+
+    async def listen(self, channels: Iterable[str], handler: MessageHandler,
+                     on_subscribe: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+        """Call ``handler(channel, message)`` for every message until cancelled."""
+        channels = list(channels)
+        for channel in channels:
+            self._handlers.setdefault(channel, []).append(handler)
+        try:
+            if on_subscribe is not None:
+                await on_subscribe()
+            await asyncio.Event().wait()
+        finally:
+            for channel in channels:
+                self._handlers[channel].remove(handler)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisCache:
+    """Cache and pub/sub shared by all workers through any server speaking the
+    Redis protocol (needs the optional ``redis`` package).
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio
+
+        self._redis = redis.asyncio.from_url(url, socket_timeout=settings.cache_timeout,
+                                             socket_connect_timeout=settings.cache_timeout)
+        # Subscriptions sit idle between messages, so they get no read timeout
+        self._subscriber = redis.asyncio.from_url(url, socket_connect_timeout=settings.cache_timeout)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        await self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(key)
+
+    async def incr(self, key: str) -> int:
+        return await self._redis.incr(key)
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self._redis.publish(channel, message)
+
+    async def listen(self, channels: Iterable[str], handler: MessageHandler,
+                     on_subscribe: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+        """Call ``handler(channel, message)`` for every message until cancelled.
+
+        Reconnects after connection errors; ``on_subscribe`` runs after every
+        (re)subscription so the caller can catch up on messages it missed.
+        """
+        channels = list(channels)
+        while True:
+            pubsub = self._subscriber.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(*channels)
+                if on_subscribe is not None:
+                    await on_subscribe()
+                while True:
+                    message = await pubsub.get_message(timeout=None)
+                    if message is not None and message["type"] == "message":
+                        handler(message["channel"].decode(), message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache subscription to %s lost (%s), reconnecting", ", ".join(channels), e)
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+        await self._subscriber.aclose()
+
+
+def create_cache():
+    if settings.cache_backend == "redis":
+        try:
+            return RedisCache(settings.cache_redis_url)
+        except ImportError:
+            logger.warning("CACHE_BACKEND=redis but the redis package is not installed; "
+                           "caches and catalog versions are per worker")
+    return MemoryCache()
+
+
+class CatalogSync:
+    """Keeps catalog.current_version() in step across worker processes.
+
+    A bump increments a counter in the shared cache and publishes the new
+    version; every worker (and bot.py) subscribed to the channel applies it
+    as soon as the message arrives, so caches keyed on the version are
+    rebuilt everywhere, not only in the worker that served the admin write.
+    With the memory backend this is just the local bump.
+    """
+
+    VERSION_KEY = "catalog:version"
+    CHANNEL = "catalog:version"
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            subscribed = asyncio.Event()
+
+            async def on_subscribe():
+                await self._catch_up()
+                subscribed.set()
+
+            self._task = asyncio.create_task(self.backend.listen([self.CHANNEL], self._on_message, on_subscribe))
+            # Start serving with the shared version, unless the backend is down
+            try:
+                await asyncio.wait_for(subscribed.wait(), timeout=settings.cache_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Catalog version bus is not reachable yet; starting with the local version")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._loop = None
+        await self.backend.close()
+
+    async def _catch_up(self) -> None:
+        version = await self.backend.get(self.VERSION_KEY)
+        if version is not None:
+            catalog.apply_version(int(version))
+
+    def _on_message(self, channel: str, message: str) -> None:
+        catalog.apply_version(int(message))
+
+    async def _bump(self) -> int:
+        version = await self.backend.incr(self.VERSION_KEY)
+        local = catalog.current_version()
+        if version <= local:
+            # Bumped locally while the backend was unreachable: move the shared counter past us
+            version = local + 1
+            await self.backend.set(self.VERSION_KEY, str(version).encode())
+        catalog.apply_version(version)
+        await self.backend.publish(self.CHANNEL, str(version))
+        return version
+
+    def bump(self) -> int:
+        """Mark the catalog as changed in every worker. Call after every committed product or pricing rules write.
+
+        Meant for sync routes running in the threadpool: waits (at most
+        CACHE_TIMEOUT) until the bump is published. Without a running bus,
+        or if the backend fails, only this process is bumped.
+        """
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not loop:
+                future = asyncio.run_coroutine_threadsafe(self._bump(), loop)
+                try:
+                    return future.result(timeout=settings.cache_timeout)
+                except Exception as e:
+                    future.cancel()
+                    logger.warning("Could not publish catalog version bump (%s); other workers may serve "
+                                   "a stale catalog until the next one", e)
+        return catalog.bump_version()
+
+
+cache = create_cache()
+catalog_sync = CatalogSync(cache)
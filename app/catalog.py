@@ -0,0 +1,29 @@
+import threading
+
+
+# Monotonic catalog version. Anything derived from the products or pricing
+# rules tables (rendered pages, cached listings, compiled pricing rules) is
+# keyed on it and rebuilt after a bump.
+# With several workers, cache.catalog_sync keeps it the same in all of them.
+_version = 0
+_lock = threading.Lock()
+
+
+def current_version() -> int:
+    return _version
+
+
+def bump_version() -> int:
+    """Mark the catalog as changed in this process (admin writes use cache.catalog_sync.bump())."""
+    global _version
+    with _lock:
+        _version += 1
+        return _version
+
+
+def apply_version(version: int) -> None:
+    """Move to a version bumped elsewhere (another worker); never goes back."""
+    global _version
+    with _lock:
+        if version > _version:
+            _version = version
@@ -1,16 +1,40 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
+import logging
 import os
 from pathlib import Path
 
-# Build absolute path to app.db next to this file, independent of CWD
+from .metrics import instrument_engine
+from .money import KOPECKS_PER_RUBLE, Kopecks
+from .querybudget import track_queries
+
+logger = logging.getLogger(__name__)
+
+# Build absolute path to app.db next to this file, independent of CWD.
+# DATABASE_URL overrides it (benchmarks run against a throwaway database).
 BASE_DIR = Path(__file__).resolve().parent
 DB_FILE = BASE_DIR / "app.db"
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_FILE.as_posix()}"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{DB_FILE.as_posix()}"
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 15}
 )
+
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL: readers never block the writer, and with several workers a
+        # transaction that starts with a write waits its turn (busy timeout)
+        # instead of failing with "database is locked"
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+instrument_engine(engine)  # SQL latency and per-request query counts for /metrics
+track_queries(engine)  # per-request statement fingerprints for QueryBudgetMiddleware
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -23,3 +47,81 @@ def get_db():
         db.close()
 
 
+def add_missing_columns(conn):
+    """create_all() skips new columns on existing tables; ALTER TABLE them in.
+
+    Only for additive changes: new columns must be nullable or have a server_default.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            ddl = column.type.compile(conn.dialect)
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += f" DEFAULT '{default}'" if isinstance(default, str) else f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {ddl}'))
+
+
+def create_missing_indexes(conn):
+    """create_all() skips indexes on tables that already exist; add them here."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def convert_money_columns(conn):
+    """Rewrite money columns still holding REAL rubles as INTEGER kopecks (money.Kopecks).
+
+    SQLite cannot change a column's type, so each one is rebuilt: a new
+    INTEGER column gets ROUND(value * 100), the old one is dropped (needs
+    SQLite 3.35) and the new one takes its name.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    money = {
+        table.name: {column.name: column for column in table.columns if isinstance(column.type, Kopecks)}
+        for table in Base.metadata.sorted_tables
+    }
+    converted = []
+    for table, columns in money.items():
+        for _, name, declared, *_ in conn.exec_driver_sql(f'PRAGMA table_info("{table}")').fetchall():
+            if name in columns and "INT" not in declared.upper():
+                converted.append((table, columns[name]))
+    for table, column in converted:
+        name, scratch = column.name, f"{column.name}__kopecks"
+        # NOT NULL columns need a default to be added; 0 kopecks
+        ddl = "INTEGER" if column.nullable else "INTEGER NOT NULL DEFAULT 0"
+        conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN "{scratch}" {ddl}')
+        conn.exec_driver_sql(
+            f'UPDATE "{table}" SET "{scratch}" = CAST(ROUND("{name}" * {KOPECKS_PER_RUBLE}) AS INTEGER)'
+        )
+        conn.exec_driver_sql(f'ALTER TABLE "{table}" DROP COLUMN "{name}"')
+        conn.exec_driver_sql(f'ALTER TABLE "{table}" RENAME COLUMN "{scratch}" TO "{name}"')
+    if converted:
+        logger.info("Converted money columns to kopecks: %s",
+                    ", ".join(f"{table}.{column.name}" for table, column in converted))
+
+
+def prepare_schema(bind=engine):
+    """Create tables, add new columns and indexes, convert old money columns.
+
+    Safe to run from several processes at once: on SQLite everything happens
+    in one BEGIN IMMEDIATE transaction, so the others wait for the write lock
+    and then inspect a schema with nothing left to do.
+    """
+    with bind.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        Base.metadata.create_all(bind=conn)
+        add_missing_columns(conn)
+        convert_money_columns(conn)  # REAL rubles -> INTEGER kopecks, once
+        create_missing_indexes(conn)
+        conn.commit()
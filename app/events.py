@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from uuid import uuid4
+
+from .money import to_rubles
+from .settings import settings
+
+
+# Put on a subscriber's queue when it fell behind and was dropped by the hub
+DROPPED = None
+
+
+class Subscription:
+    """One consumer of the hub. Reads events in order from a bounded queue."""
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Next event, or DROPPED if the subscriber was too slow and got disconnected."""
+        return await self.queue.get()
+
+
+class EventHub:
+    """In-process fan-out of order events to admin subscribers.
+
+    Every event gets a sequence number and is kept in a bounded history, so a
+    reconnecting client can resume from the last sequence number it saw.
+    Subscribers have bounded queues; one that falls behind is dropped rather
+    than buffered without limit, and is expected to reconnect and resume.
+
+    publish() may be called from sync routes running in the threadpool;
+    delivery to subscribers always happens on the event loop.
+    """
+
+    def __init__(self, history_size: int, queue_size: int):
+        # Changes on every process start, so clients can tell that seq numbers were reset
+        self.epoch = uuid4().hex[:12]
+        self.queue_size = queue_size
+        self._seq = 0
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._seq += 1
+            event = {"seq": self._seq, "type": event_type, "ts": time.time(), "data": data}
+            self._history.append(event)
+            loop = self._loop
+            has_subscribers = bool(self._subscribers)
+
+        if has_subscribers and loop is not None and not loop.is_closed():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                self._dispatch(event)
+            else:
+                loop.call_soon_threadsafe(self._dispatch, event)
+        return event
+
+    def _dispatch(self, event: Dict[str, Any]) -> None:
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription: Subscription) -> None:
+        self.unsubscribe(subscription)
+        subscription.dropped = True
+        # Make room for the sentinel so the consumer wakes up and disconnects
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(DROPPED)
+
+    def subscribe(self, since: Optional[int] = None, epoch: Optional[str] = None):
+        """Register a subscriber on the running loop.
+
+        Returns (subscription, backlog, complete, seq). ``backlog`` holds the
+        buffered events after ``since``; ``complete`` is False when those
+        events are no longer (or never were) in this process's history and
+        the client has to reload its state. ``seq`` is the last seq at
+        registration: the queue gets every event after it.
+        """
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.append(subscription)
+            seq = self._seq
+            if since is None:
+                return subscription, [], True, seq
+            if epoch is not None and epoch != self.epoch:
+                return subscription, [], False, seq
+            oldest = self._history[0]["seq"] if self._history else seq + 1
+            complete = oldest <= since + 1 and since <= seq
+            backlog = [event for event in self._history if event["seq"] > since]
+        return subscription, backlog, complete, seq
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+
+order_events = EventHub(
+    history_size=settings.order_events_history,
+    queue_size=settings.order_events_queue_size,
+)
+
+
+def _value(v):
+    return getattr(v, "value", v)
+
+
+def order_event_data(order) -> Dict[str, Any]:
+    """Compact order summary carried by order events."""
+    return {
+        "order_id": order.id,
+        "status": _value(order.status),
+        "payment_type": _value(order.payment_type),
+        "delivery_type": _value(order.delivery_type),
+        "customer_name": order.customer_name,
+        "total_amount": to_rubles(order.total_amount),
+    }
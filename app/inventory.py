@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .events import order_event_data, order_events
+from .settings import settings
+from .slots import SlotBookings, release_slots, reserve_slot, slot_index
+
+logger = logging.getLogger(__name__)
+
+
+def cart_quantities(lines: Iterable) -> Dict[int, int]:
+    """product_id -> total quantity (a product may appear on several lines)."""
+    quantities: Counter = Counter()
+    for line in lines:
+        quantities[line.product_id] += line.quantity
+    return dict(quantities)
+
+
+def reserve_stock(db: Session, quantities: Dict[int, int]) -> List[int]:
+    """Take stock for a whole cart in one conditional UPDATE.
+
+    Every tracked product is decremented only if it has enough left
+    (``stock >= qty``), untracked ones (stock NULL) always match. Returns the
+    ids that did not match (sold out or missing); then nothing must be kept
+    and the caller rolls back. The caller commits on success.
+    """
+    if not quantities:
+        return []
+    needed = case(quantities, value=models.Product.id)
+    result = db.execute(
+        update(models.Product)
+        .where(
+            models.Product.id.in_(quantities),
+            or_(models.Product.stock.is_(None), models.Product.stock >= needed),
+        )
+        .values(stock=models.Product.stock - needed)  # NULL stays NULL
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == len(quantities):
+        return []
+    available = dict(db.execute(
+        select(models.Product.id, func.coalesce(models.Product.stock, -1))
+        .where(models.Product.id.in_(quantities))
+    ).all())
+    # Our UPDATE holds the write lock, so this sees the stock it just checked
+    return sorted(
+        product_id for product_id, quantity in quantities.items()
+        if product_id not in available or 0 <= available[product_id] < quantity
+    )
+
+
+def _order_quantities(db: Session, order_ids: List[int]) -> Dict[int, int]:
+    return dict(db.execute(
+        select(models.OrderItem.product_id, func.sum(models.OrderItem.quantity))
+        .where(models.OrderItem.order_id.in_(order_ids))
+        .group_by(models.OrderItem.product_id)
+    ).all())
+
+
+class Released(NamedTuple):
+    order_ids: List[int]  # released here
+    slots: Dict[datetime, SlotBookings]  # for slot_index.record() once committed
+
+
+def release_stock(db: Session, order_ids: List[int]) -> Released:
+    """Give the orders' reserved stock and delivery slots back, at most once each.
+    The caller commits, then records ``slots`` in slot_index.
+
+    Clearing stock_reserved with a conditional UPDATE decides who releases an
+    order, so concurrent releases (a webhook racing the timeout sweeper, two
+    workers) return its stock only once.
+    """
+    if not order_ids:
+        return Released([], {})
+    released = db.execute(
+        update(models.Order)
+        .where(models.Order.id.in_(order_ids), models.Order.stock_reserved.is_(True))
+        .values(stock_reserved=False)
+        .returning(models.Order.id, models.Order.delivery_slot)
+        .execution_options(synchronize_session=False)
+    ).all()
+    claimed = [order_id for order_id, _ in released]
+    slots = release_slots(db, Counter(slot for _, slot in released if slot is not None))
+    quantities = _order_quantities(db, claimed) if claimed else {}
+    if quantities:
+        returned = case(quantities, value=models.Product.id)
+        db.execute(
+            update(models.Product)
+            .where(models.Product.id.in_(quantities), models.Product.stock.is_not(None))
+            .values(stock=models.Product.stock + returned)
+            .execution_options(synchronize_session=False)
+        )
+    return Released(claimed, slots)
+
+
+def restore_reservation(db: Session, order: models.Order) -> Optional[Dict[datetime, SlotBookings]]:
+    """Reserve stock again for an order whose reservation was released
+    (paid after it had timed out). Returns None if it has sold out since,
+    else the slot bookings to record in slot_index once committed.
+
+    Its delivery slot is booked again even if full: the order is paid.
+    """
+    if reserve_stock(db, _order_quantities(db, [order.id])):
+        return None
+    slots = {}
+    if order.delivery_slot is not None:
+        slots[order.delivery_slot] = reserve_slot(db, order.delivery_slot, force=True)
+    order.stock_reserved = True
+    return slots
+
+
+def release_expired(db: Session, timeout: float, now: Optional[datetime] = None, limit: int = 100) -> List[int]:
+    """Cancel online orders left unpaid for ``timeout`` seconds and release their stock."""
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=timeout)
+    expired = select(models.Order.id).where(
+        models.Order.status == models.OrderStatus.PENDING,
+        models.Order.payment_type == models.PaymentType.ONLINE,
+        models.Order.stock_reserved.is_(True),
+        models.Order.created_at < cutoff,
+    ).order_by(models.Order.created_at).limit(limit)
+    # Conditional on PENDING at update time: a payment that just succeeded wins
+    cancelled = [row[0] for row in db.execute(
+        update(models.Order)
+        .where(models.Order.id.in_(expired), models.Order.status == models.OrderStatus.PENDING)
+        .values(status=models.OrderStatus.CANCELLED, updated_at=datetime.utcnow())
+        .returning(models.Order.id)
+        .execution_options(synchronize_session=False)
+    )]
+    released = release_stock(db, cancelled)
+    db.commit()
+    slot_index.record(released.slots)
+    return sorted(cancelled)
+
+
+def _sweep_once() -> List[int]:
+    db = SessionLocal()
+    try:
+        cancelled = release_expired(db, settings.stock_reservation_timeout)
+        if cancelled:
+            for order in db.query(models.Order).filter(models.Order.id.in_(cancelled)).all():
+                order_events.publish("order.status_changed", order_event_data(order))
+        return cancelled
+    finally:
+        db.close()
+
+
+class ReservationSweeper:
+    """Periodically cancels unpaid online orders whose reservation timed out."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                cancelled = await asyncio.to_thread(_sweep_once)
+                if cancelled:
+                    logger.info("Released stock of %d unpaid orders", len(cancelled), extra={"order_ids": cancelled})
+            except Exception:
+                logger.exception("Stock reservation sweep failed")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+reservation_sweeper = ReservationSweeper(settings.stock_sweep_interval)
@@ -0,0 +1,327 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, time as dtime, timedelta
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import or_, update
+from sqlalchemy.dialects.sqlite import insert
+
+from . import models
+from .database import SessionLocal, engine
+from .metrics import (
+    DB_MAINTENANCE_DURATION,
+    DB_MAINTENANCE_LAST_SUCCESS,
+    DB_MAINTENANCE_RUNS,
+    requests_in_flight,
+    running_maintenance,
+)
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+LEASE_TIMEOUT = timedelta(hours=2)  # a task whose runner died is taken over after this
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    # Autocommit: PRAGMAs and VACUUM must not run inside a transaction
+    return sqlite3.connect(path, timeout=15, isolation_level=None)
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_database(source: Path, backup_dir: Path, keep: int, pages: int, pause: float,
+                    max_restarts: int = 3) -> str:
+    """Copy the live database into ``backup_dir`` with the SQLite backup API.
+
+    The copy goes ``pages`` pages per step with ``pause`` seconds between
+    steps; a step holds a read lock only while it copies, so requests keep
+    reading and writing. A write from another connection makes SQLite start
+    the copy over; after ``max_restarts`` the rest is copied in one step (in
+    WAL mode that reader still does not block writers). The copy must pass
+    quick_check before it is kept; the oldest beyond ``keep`` are deleted.
+    """
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    target = backup_dir / f"{source.stem}-{datetime.utcnow():%Y%m%d-%H%M%S}.db"
+    partial = target.with_name(target.name + ".partial")
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts
+        last_remaining = remaining
+        if pause:
+            time.sleep(pause)
+
+    src = _connect(source)
+    try:
+        dst = sqlite3.connect(partial)
+        try:
+            try:
+                src.backup(dst, pages=pages, progress=progress)
+            except _TooManyRestarts:
+                src.backup(dst)
+            result = dst.execute("PRAGMA quick_check").fetchone()[0]
+            if result != "ok":
+                raise RuntimeError(f"backup copy failed quick_check: {result}")
+        finally:
+            dst.close()
+        os.replace(partial, target)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    finally:
+        src.close()
+    for old in sorted(backup_dir.glob(f"{source.stem}-*.db"))[:-keep]:
+        old.unlink()
+    return f"{target.name}, {target.stat().st_size // 1024} KiB, {restarts} restarts"
+
+
+def optimize_database(source: Path) -> str:
+    """Refresh the query planner's statistics."""
+    conn = _connect(source)
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None:
+            conn.execute("ANALYZE")
+            return "ANALYZE (no statistics yet)"
+        # Re-analyze the tables that changed enough, sampling at most this many rows per index
+        conn.execute("PRAGMA analysis_limit=1000")
+        conn.execute("PRAGMA optimize=0x10002")  # all tables, not just this connection's
+        return "PRAGMA optimize"
+    finally:
+        conn.close()
+
+
+def vacuum_database(source: Path, pages: int) -> str:
+    """Give up to ``pages`` free pages back to the filesystem and truncate the WAL."""
+    conn = _connect(source)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Incremental vacuum needs auto_vacuum=INCREMENTAL, which takes one
+            # full VACUUM to switch on; it holds the write lock while it runs
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            summary = "switched to auto_vacuum=INCREMENTAL (full VACUUM)"
+        else:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()  # frees a page per row
+            summary = f"freed {min(free, pages)} of {free} free pages"
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return summary
+    finally:
+        conn.close()
+
+
+def check_integrity(source: Path) -> str:
+    conn = _connect(source)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check(20)")]
+    finally:
+        conn.close()
+    if problems != ["ok"]:
+        raise RuntimeError("integrity_check: " + "; ".join(problems))
+    return "ok"
+
+
+class MaintenanceJob(NamedTuple):
+    name: str
+    interval: float  # seconds between runs
+    in_window: bool  # only inside MAINTENANCE_WINDOW
+    run: Callable[[Path], str]  # returns a summary for the log
+
+
+def default_jobs(backup_dir: Path) -> List[MaintenanceJob]:
+    day = 24 * 3600
+    return [
+        MaintenanceJob("backup", settings.backup_interval, False, lambda source: backup_database(
+            source, backup_dir, settings.backup_keep, settings.backup_pages_per_step, settings.backup_step_pause,
+        )),
+        MaintenanceJob("optimize", day, True, optimize_database),
+        MaintenanceJob("vacuum", day, True, lambda source: vacuum_database(source, settings.vacuum_pages_per_run)),
+        MaintenanceJob("integrity", day, True, check_integrity),
+    ]
+
+
+def parse_window(value: str) -> Tuple[dtime, dtime]:
+    start, end = (dtime.fromisoformat(part.strip()) for part in value.split("-", 1))
+    return start, end
+
+
+def in_window(window: Tuple[dtime, dtime], now: datetime) -> bool:
+    start, end = window
+    if start <= end:
+        return start <= now.time() < end
+    return now.time() >= start or now.time() < end  # past midnight
+
+
+def _window_length(window: Tuple[dtime, dtime]) -> timedelta:
+    start, end = (datetime.combine(datetime.min, t) for t in window)
+    return (end - start) % timedelta(days=1)
+
+
+def _claim(job: MaintenanceJob, runner_id: str, due_before: datetime, now: datetime) -> bool:
+    """Take the lease on a due job; False if it ran recently or another live process holds it."""
+    task = models.MaintenanceTask
+    db = SessionLocal()
+    try:
+        db.execute(insert(task).values(name=job.name).on_conflict_do_nothing())
+        result = db.execute(
+            update(task)
+            .where(
+                task.name == job.name,
+                or_(task.finished_at.is_(None), task.finished_at < due_before),
+                or_(task.runner_id.is_(None), task.started_at < now - LEASE_TIMEOUT),
+            )
+            .values(runner_id=runner_id, started_at=now)
+        )
+        db.commit()
+        return result.rowcount == 1
+    finally:
+        db.close()
+
+
+def _finish(job: MaintenanceJob, runner_id: str, duration: float, error: Optional[str]) -> None:
+    task = models.MaintenanceTask
+    now = datetime.utcnow()
+    values = dict(runner_id=None, started_at=None, finished_at=now, duration=duration, error=error)
+    if error is None:
+        values["succeeded_at"] = now
+    db = SessionLocal()
+    try:
+        db.execute(update(task).where(task.name == job.name, task.runner_id == runner_id).values(**values))
+        db.commit()
+    finally:
+        db.close()
+
+
+class MaintenanceScheduler:
+    """Runs due maintenance jobs every ``interval`` seconds.
+
+    Every worker runs a scheduler; the lease in maintenance_tasks makes sure
+    a job runs in one of them at a time, and its finished_at that it runs
+    once per interval (once per window for in-window jobs) across all.
+    """
+
+    def __init__(self, jobs: List[MaintenanceJob], source: Optional[Path], interval: float, window: str):
+        self.jobs = jobs
+        self.source = source
+        self.interval = interval
+        self.window = parse_window(window)
+        self.runner_id = uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0 and self.source is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.run_due)
+            except Exception:
+                logger.exception("Database maintenance check failed")
+
+    def run_due(self, now: Optional[datetime] = None) -> List[str]:
+        """Run every job that is due now; returns the names of those that ran here."""
+        now = now or datetime.utcnow()
+        ran = []
+        for job in self.jobs:
+            if job.in_window and not in_window(self.window, now):
+                continue
+            if requests_in_flight() > settings.maintenance_max_in_flight:
+                DB_MAINTENANCE_RUNS.labels(job.name, "busy").inc()
+                continue
+            # In-window jobs: once per window, even if the last run started late in it
+            due_before = now - timedelta(seconds=job.interval)
+            if job.in_window:
+                due_before += _window_length(self.window)
+            if _claim(job, self.runner_id, due_before, now):
+                self.run_job(job)
+                ran.append(job.name)
+        return ran
+
+    def run_job(self, job: MaintenanceJob) -> bool:
+        """Run one job now (the caller holds its lease, or runs it by hand)."""
+        error = None
+        running_maintenance.set(job.name)
+        started = time.perf_counter()
+        try:
+            summary = job.run(self.source)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.exception("Database maintenance task %s failed", job.name)
+        finally:
+            duration = time.perf_counter() - started
+            running_maintenance.clear()
+        DB_MAINTENANCE_DURATION.labels(job.name).observe(duration)
+        DB_MAINTENANCE_RUNS.labels(job.name, "failed" if error else "ok").inc()
+        if error is None:
+            DB_MAINTENANCE_LAST_SUCCESS.labels(job.name).set_to_current_time()
+            logger.info("Database maintenance task %s done in %.2fs: %s", job.name, duration, summary,
+                        extra={"task": job.name, "duration": round(duration, 3)})
+        _finish(job, self.runner_id, duration, error)
+        return error is None
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def _database_path() -> Optional[Path]:
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return None
+    return Path(engine.url.database).resolve()
+
+
+DATABASE_PATH = _database_path()
+BACKUP_DIR = Path(settings.backup_dir) if settings.backup_dir else (
+    DATABASE_PATH.parent / "backups" if DATABASE_PATH is not None else None
+)
+if DATABASE_PATH is not None:
+    # Lets every worker label request latency while another one runs a task
+    running_maintenance.path = DATABASE_PATH.with_name(DATABASE_PATH.name + ".maintenance")
+
+maintenance_scheduler = MaintenanceScheduler(
+    default_jobs(BACKUP_DIR) if DATABASE_PATH is not None else [],
+    DATABASE_PATH if settings.maintenance_enabled else None,
+    settings.maintenance_check_interval,
+    settings.maintenance_window,
+)
+
+
+if __name__ == "__main__":
+    # python -m app.maintenance backup integrity: run tasks now, outside the
+    # window, unless a worker is running them at the moment
+    import argparse
+
+    from .database import Base
+
+    jobs = {job.name: job for job in maintenance_scheduler.jobs}
+    parser = argparse.ArgumentParser(description="Run database maintenance tasks now.")
+    parser.add_argument("tasks", nargs="+", choices=sorted(jobs))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    maintenance_scheduler.source = DATABASE_PATH
+    failed = []
+    for name in args.tasks:
+        now = datetime.utcnow()
+        if not _claim(jobs[name], maintenance_scheduler.runner_id, now, now):
+            logger.warning("Task %s is running in another process", name)
+            failed.append(name)
+        elif not maintenance_scheduler.run_job(jobs[name]):
+            failed.append(name)
+    raise SystemExit(1 if failed else 0)
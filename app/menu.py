@@ -0,0 +1,107 @@
+import asyncio
+import html
+import time
+from typing import List, Optional, Tuple
+
+from . import catalog, models
+from .database import SessionLocal
+from .money import KOPECKS_PER_RUBLE, format_rubles
+from .settings import settings
+
+
+def format_price(price: int) -> str:
+    """Kopecks as "250 ₽" for whole rubles, "249.90 ₽" otherwise."""
+    if price % KOPECKS_PER_RUBLE == 0:
+        return f"{price // KOPECKS_PER_RUBLE} ₽"
+    return f"{format_rubles(price)} ₽"
+
+
+def product_deep_link(product_id: int) -> str:
+    """Mini App URL that opens the menu scrolled to one product."""
+    separator = "&" if "?" in settings.web_app_url else "?"
+    return f"{settings.web_app_url}{separator}product={product_id}"
+
+
+class MenuPage:
+    """One rendered page of the /menu message."""
+
+    def __init__(self, page: int, pages: int, text: str, buttons: List[Tuple[str, str]]):
+        self.page = page
+        self.pages = pages
+        self.text = text
+        self.buttons = buttons  # (label, Mini App deep link) per product
+        self.markup = None      # filled in lazily by the bot handler
+
+
+def render_menu(products: List[models.Product], page_size: int) -> List[MenuPage]:
+    chunks = [products[i:i + page_size] for i in range(0, len(products), page_size)] or [[]]
+    pages = []
+    for index, chunk in enumerate(chunks):
+        text = "🍰 <b>Наше меню</b>"
+        if len(chunks) > 1:
+            text += f" (стр. {index + 1}/{len(chunks)})"
+        text += "\n\n"
+        if chunk:
+            for product in chunk:
+                text += f"• {html.escape(product.title)} — {format_price(product.price)}\n"
+        else:
+            text += "Скоро здесь появятся наши изделия.\n"
+        text += "\nНажмите на товар или кнопку ниже, чтобы открыть меню и сделать заказ:"
+        buttons = [
+            (f"{product.title} · {format_price(product.price)}", product_deep_link(product.id))
+            for product in chunk
+        ]
+        pages.append(MenuPage(index, len(chunks), text, buttons))
+    return pages
+
+
+def _load_products() -> List[models.Product]:
+    db = SessionLocal()
+    try:
+        products = db.query(models.Product).order_by(models.Product.created_at.desc()).all()
+        db.expunge_all()
+        return products
+    finally:
+        db.close()
+
+
+class MenuCache:
+    """Rendered /menu pages shared by every chat.
+
+    Rebuilt (one query) when the catalog version changes. bot.py in polling
+    mode runs in its own process and only sees version bumps from the API with
+    CACHE_BACKEND=redis, so entries also expire after MENU_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl: float, page_size: int):
+        self.ttl = ttl
+        self.page_size = page_size
+        self._pages: Optional[List[MenuPage]] = None
+        self._version = None
+        self._built_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _fresh(self) -> bool:
+        return (
+            self._pages is not None
+            and self._version == catalog.current_version()
+            and time.monotonic() - self._built_at < self.ttl
+        )
+
+    async def get_page(self, page: int) -> MenuPage:
+        if not self._fresh():
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                # Only the first caller after an invalidation hits the database
+                if not self._fresh():
+                    version = catalog.current_version()
+                    products = await asyncio.to_thread(_load_products)
+                    self._pages = render_menu(products, self.page_size)
+                    self._version = version
+                    self._built_at = time.monotonic()
+        pages = self._pages
+        return pages[min(max(page, 0), len(pages) - 1)]
+
+
+menu_cache = MenuCache(ttl=settings.menu_cache_ttl, page_size=settings.menu_page_size)
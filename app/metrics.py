@@ -0,0 +1,215 @@
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+
+# With several uvicorn workers the supervisor sets PROMETHEUS_MULTIPROC_DIR:
+# every process writes its samples there and /metrics aggregates all of them.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+MAINTENANCE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", multiprocess_mode="livesum"
+)
+
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQL statement latency", ["statement"], buckets=QUERY_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ["route"], buckets=QUERY_COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL per HTTP request", ["route"], buckets=LATENCY_BUCKETS
+)
+
+EXTERNAL_LATENCY = Histogram(
+    "external_call_duration_seconds", "Outbound API call latency", ["service", "operation"], buckets=LATENCY_BUCKETS
+)
+EXTERNAL_ERRORS = Counter(
+    "external_call_errors_total", "Failed outbound API calls", ["service", "operation", "error"]
+)
+
+ORDERS_CREATED = Counter("orders_created_total", "Orders created", ["payment_type"])
+PAYMENTS_CREATED = Counter("payments_created_total", "Online payments created in YooKassa")
+ORDERS_PAID = Counter("orders_paid_total", "Orders marked paid by the YooKassa webhook")
+
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cached reads by outcome: fresh, stale (served while refreshing), miss (built), coalesced (waited for a build)",
+    ["cache", "outcome"],
+)
+
+DB_MAINTENANCE_DURATION = Histogram(
+    "db_maintenance_duration_seconds", "Database maintenance task duration", ["task"], buckets=MAINTENANCE_BUCKETS
+)
+DB_MAINTENANCE_RUNS = Counter(
+    "db_maintenance_runs_total", "Database maintenance runs by outcome: ok, failed, busy (postponed)", ["task", "outcome"]
+)
+DB_MAINTENANCE_LAST_SUCCESS = Gauge(
+    "db_maintenance_last_success_timestamp_seconds", "When each maintenance task last succeeded", ["task"],
+    multiprocess_mode="max",
+)
+HTTP_LATENCY_DURING_MAINTENANCE = Histogram(
+    "http_request_duration_during_maintenance_seconds",
+    "HTTP request latency while a database maintenance task runs in any worker (compare with http_request_duration_seconds)",
+    ["task"], buckets=LATENCY_BUCKETS,
+)
+
+
+class RunningMaintenance:
+    """The database maintenance task running in any worker process, if any.
+
+    The worker running one keeps its name in a small file (``path``, set by
+    app.maintenance); request handling checks the file at most once a second.
+    """
+
+    CHECK_EVERY = 1.0
+
+    def __init__(self):
+        self.path = None
+        self._task: Optional[str] = None
+        self._checked = 0.0
+
+    def set(self, task: str) -> None:
+        self.path.write_text(task)
+        self._task, self._checked = task, time.monotonic()
+
+    def clear(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        self._task, self._checked = None, time.monotonic()
+
+    def current(self) -> Optional[str]:
+        if self.path is None:
+            return None
+        now = time.monotonic()
+        if now - self._checked >= self.CHECK_EVERY:
+            self._checked = now
+            try:
+                self._task = self.path.read_text() or None
+            except OSError:
+                self._task = None
+        return self._task
+
+
+running_maintenance = RunningMaintenance()
+
+
+def requests_in_flight() -> float:
+    """HTTP requests being handled by this process."""
+    return HTTP_IN_FLIGHT._value.get()
+
+
+# [statement count, seconds in SQL] of the HTTP request being handled.
+# Copied into threadpool/to_thread calls with the context, so sync routes count too.
+_request_sql: ContextVar[Optional[list]] = ContextVar("request_sql", default=None)
+
+
+def instrument_engine(engine) -> None:
+    """Time every SQL statement on ``engine`` and attribute it to the current request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_LATENCY.labels(statement.lstrip().split(None, 1)[0].upper()).observe(elapsed)
+        totals = _request_sql.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed
+
+
+def _route_label(scope) -> str:
+    # Route template, not the raw path, to keep label cardinality bounded
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    return scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL work per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        totals = [0, 0.0]
+        token = _request_sql.set(totals)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            _request_sql.reset(token)
+            method, route = scope["method"], _route_label(scope)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_LATENCY.labels(method, route).observe(elapsed)
+            maintenance = running_maintenance.current()
+            if maintenance is not None:
+                HTTP_LATENCY_DURING_MAINTENANCE.labels(maintenance).observe(elapsed)
+            DB_QUERIES_PER_REQUEST.labels(route).observe(totals[0])
+            DB_TIME_PER_REQUEST.labels(route).observe(totals[1])
+
+
+@asynccontextmanager
+async def track_external(service: str, operation: str):
+    """Time an outbound call and count it as an error if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        EXTERNAL_ERRORS.labels(service, operation, type(e).__name__).inc()
+        raise
+    finally:
+        EXTERNAL_LATENCY.labels(service, operation).observe(time.perf_counter() - started)
+
+
+async def telegram_request_middleware(make_request, bot, method):
+    """aiogram session middleware: every Bot API call, whichever code path made it."""
+    async with track_external("telegram", type(method).__name__):
+        return await make_request(bot, method)
+
+
+def render_metrics():
+    """(body, content type) for the /metrics endpoint."""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,9 +1,10 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String, Text, Float, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 import enum
 
 from .database import Base
+from .money import Kopecks
 
 
 class Product(Base):
@@ -12,8 +13,9 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
-    price = Column(Float, nullable=False)
+    price = Column(Kopecks, nullable=False)
     image = Column(String(1024), nullable=True)
+    stock = Column(Integer, nullable=True)  # units left; NULL = not tracked, never sells out
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
@@ -25,6 +27,21 @@ class OrderStatus(str, enum.Enum):
     CANCELLED = "cancelled"
 
 
+# Allowed manual status transitions (admin bulk updates): source -> targets
+ORDER_STATUS_TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.PAID, OrderStatus.PROCESSING, OrderStatus.COMPLETED, OrderStatus.CANCELLED},
+    OrderStatus.PAID: {OrderStatus.PROCESSING, OrderStatus.COMPLETED, OrderStatus.CANCELLED},
+    OrderStatus.PROCESSING: {OrderStatus.PAID, OrderStatus.COMPLETED, OrderStatus.CANCELLED},
+    OrderStatus.COMPLETED: set(),
+    OrderStatus.CANCELLED: set(),
+}
+
+
+def allowed_source_statuses(target: OrderStatus) -> set:
+    """Statuses an order may be in to be moved to ``target``."""
+    return {source for source, targets in ORDER_STATUS_TRANSITIONS.items() if target in targets}
+
+
 class DeliveryType(str, enum.Enum):
     DELIVERY = "delivery"
     PICKUP = "pickup"
@@ -47,12 +64,23 @@ class Order(Base):
     payment_type = Column(Enum(PaymentType), nullable=False)
     comment = Column(Text, nullable=True)
     
-    subtotal = Column(Float, nullable=False)  # products total
-    delivery_cost = Column(Float, nullable=False, default=0)
-    total_amount = Column(Float, nullable=False)
+    # Money columns hold kopecks (see money.py)
+    subtotal = Column(Kopecks, nullable=False)  # products total
+    discount = Column(Kopecks, nullable=False, default=0, server_default="0")  # promo code
+    delivery_cost = Column(Kopecks, nullable=False, default=0)
+    surcharge = Column(Kopecks, nullable=False, default=0, server_default="0")  # time-of-day surcharges
+    total_amount = Column(Kopecks, nullable=False)
+    promo_code = Column(String(64), nullable=True)
+    delivery_zone = Column(String(100), nullable=True)  # None: the default delivery fee
     
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING, nullable=False)
     payment_id = Column(String(255), nullable=True)  # external payment system ID
+    # Stock for the items is held by this order; cleared once when it is given back
+    stock_reserved = Column(Boolean, nullable=False, default=False, server_default="0")
+    # Paid after its reservation expired and the stock had sold out: staff must refund it
+    needs_refund = Column(Boolean, nullable=False, default=False, server_default="0")
+    # Start of the booked delivery/pickup slot (kitchen local time); held together with the stock
+    delivery_slot = Column(DateTime, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -60,15 +88,30 @@ class Order(Base):
     # Relationship to order items
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Admin order listing: filter by status, keyset-paginate by (created_at, id)
+        Index("ix_orders_status_created_at", "status", "created_at", "id"),
+        Index("ix_orders_created_at", "created_at", "id"),
+    )
+
+
+class DeliverySlot(Base):
+    """Bookings of one time slot; a row exists once the slot is booked or its capacity is set."""
+    __tablename__ = "delivery_slots"
+
+    starts_at = Column(DateTime, primary_key=True)  # kitchen local time
+    capacity = Column(Integer, nullable=True)  # NULL: SLOT_CAPACITY
+    booked = Column(Integer, nullable=False, default=0, server_default="0")
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     product_name = Column(String(255), nullable=False)  # snapshot at order time
-    product_price = Column(Float, nullable=False)  # snapshot at order time
+    product_price = Column(Kopecks, nullable=False)  # snapshot at order time
     quantity = Column(Integer, nullable=False)
     
     # Relationships
@@ -76,3 +119,84 @@ class OrderItem(Base):
     product = relationship("Product")
 
 
+class BroadcastStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+
+class RecipientStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    BLOCKED = "blocked"
+
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    text = Column(Text, nullable=False)  # HTML
+    status = Column(Enum(BroadcastStatus), default=BroadcastStatus.PENDING, nullable=False)
+
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)
+
+    # Lease: the process currently sending; another may take over after heartbeat goes stale
+    runner_id = Column(String(64), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class BroadcastRecipient(Base):
+    __tablename__ = "broadcast_recipients"
+
+    id = Column(Integer, primary_key=True)
+    broadcast_id = Column(Integer, ForeignKey("broadcasts.id"), nullable=False)
+    telegram_user_id = Column(BigInteger, nullable=False)
+    status = Column(Enum(RecipientStatus), default=RecipientStatus.PENDING, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        # Resume: pending recipients of one broadcast
+        Index("ix_broadcast_recipients_broadcast_status", "broadcast_id", "status"),
+    )
+
+
+class BlockedUser(Base):
+    """Chats that blocked the bot or no longer exist; skipped by future broadcasts."""
+    __tablename__ = "blocked_users"
+
+    telegram_user_id = Column(BigInteger, primary_key=True)
+    reason = Column(String(255), nullable=True)
+    blocked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class MaintenanceTask(Base):
+    """Schedule and lease of one database maintenance task, shared by all workers."""
+    __tablename__ = "maintenance_tasks"
+
+    name = Column(String(64), primary_key=True)
+    # Lease: the process running it now; another may take over once started_at is stale
+    runner_id = Column(String(64), nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)  # last run, successful or not
+    succeeded_at = Column(DateTime, nullable=True)
+    duration = Column(Float, nullable=True)  # seconds, last run
+    error = Column(Text, nullable=True)  # last run's failure; NULL if it succeeded
+
+
+class PricingRuleSet(Base):
+    """The admin-edited pricing rules (schemas.PricingRules as JSON); a single row."""
+    __tablename__ = "pricing_rules"
+
+    id = Column(Integer, primary_key=True)
+    rules = Column(Text, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -0,0 +1,61 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Annotated
+
+from pydantic import BeforeValidator, PlainSerializer
+from sqlalchemy import Integer
+from sqlalchemy.types import TypeDecorator
+
+# Money is an int number of kopecks (1 ₽ = 100) everywhere inside the app:
+# columns, schemas, pricing, sums. Rubles appear only at the edges (JSON
+# bodies, messages, YooKassa), converted with the functions below.
+KOPECKS_PER_RUBLE = 100
+
+
+def to_kopecks(rubles) -> int:
+    """Exact kopecks for a ruble amount (int, float, str or Decimal) with at most two decimals."""
+    if isinstance(rubles, bool):
+        raise ValueError("amount must be a number")
+    try:
+        # str() first: 0.1 is 0.1, not the binary fraction the float holds
+        value = Decimal(str(rubles)) * KOPECKS_PER_RUBLE
+    except InvalidOperation:
+        raise ValueError("amount must be a number")
+    if not value.is_finite() or value != value.to_integral_value():
+        raise ValueError("amount must have at most two decimal places")
+    return int(value)
+
+
+def to_rubles(kopecks: int) -> float:
+    """Rubles for JSON: the nearest float, which prints as the exact decimal (12345 -> 123.45)."""
+    return kopecks / KOPECKS_PER_RUBLE
+
+
+def format_rubles(kopecks: int) -> str:
+    """12345 -> "123.45", without going through a float (YooKassa, messages)."""
+    sign = "-" if kopecks < 0 else ""
+    rubles, rest = divmod(abs(kopecks), KOPECKS_PER_RUBLE)
+    return f"{sign}{rubles}.{rest:02d}"
+
+
+def percent_of(kopecks: int, percent: float) -> int:
+    """``percent`` % of an amount, rounded half up to the kopeck."""
+    share = Decimal(kopecks) * Decimal(str(percent)) / 100
+    return int(share.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class Kopecks(TypeDecorator):
+    """Column type for money: INTEGER kopecks, so SUM() in SQL is exact.
+
+    Plain Integer underneath; the distinct type lets the migration
+    (database.convert_money_columns) find the money columns.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+
+# Schema field types. Both hold kopecks and serialize to rubles in JSON.
+# Money is filled from the app's own kopeck values (ORM objects, quotes);
+# MoneyInput parses the ruble amounts clients and admins send.
+Money = Annotated[int, PlainSerializer(to_rubles, return_type=float)]
+MoneyInput = Annotated[int, BeforeValidator(to_kopecks), PlainSerializer(to_rubles, return_type=float)]
@@ -0,0 +1,173 @@
+import asyncio
+import html
+import logging
+import time
+from typing import Dict, List, Optional
+
+from . import models
+from .money import format_rubles
+from .settings import settings
+from .telegram import get_telegram_bot
+
+logger = logging.getLogger(__name__)
+
+
+MAX_MESSAGE_LENGTH = 4096
+MAX_ATTEMPTS = 5  # network/server errors; 429s are waited out without counting
+
+
+def _delivery_label(order: models.Order) -> str:
+    return "Доставка" if order.delivery_type == models.DeliveryType.DELIVERY else "Самовывоз"
+
+
+def format_order_notification(order: models.Order) -> str:
+    """Full admin message for one new cash order."""
+    text = f"<b>🔔 Новый заказ №{order.id} (Наличные)</b>\n\n" \
+           f"<b>Клиент:</b> {html.escape(order.customer_name)}\n" \
+           f"<b>Телефон:</b> {html.escape(order.customer_phone)}\n" \
+           f"<b>Тип доставки:</b> {_delivery_label(order)}\n"
+    if order.delivery_type == models.DeliveryType.DELIVERY:
+        text += f"<b>Адрес:</b> {html.escape(order.customer_address or '')}\n"
+        if order.delivery_zone:
+            text += f"<b>Зона:</b> {html.escape(order.delivery_zone)}\n"
+    if order.delivery_slot:
+        text += f"<b>Время:</b> {order.delivery_slot:%d.%m %H:%M}\n"
+    if order.comment:
+        text += f"<b>Комментарий:</b> {html.escape(order.comment)}\n"
+
+    text += "\n<b>Состав заказа:</b>\n"
+    for item in order.items:
+        text += f"- {html.escape(item.product_name)} x {item.quantity} ({format_rubles(item.product_price)} ₽/шт)\n"
+
+    text += f"\n<b>Подытог:</b> {format_rubles(order.subtotal)} ₽\n"
+    if order.discount:
+        text += f"<b>Скидка ({html.escape(order.promo_code or '')}):</b> −{format_rubles(order.discount)} ₽\n"
+    text += f"<b>Доставка:</b> {format_rubles(order.delivery_cost)} ₽\n"
+    if order.surcharge:
+        text += f"<b>Надбавка за время:</b> {format_rubles(order.surcharge)} ₽\n"
+    text += f"<b>Итого к оплате:</b> {format_rubles(order.total_amount)} ₽\n" \
+            f"<b>Статус:</b> {order.status.value}"
+    return text
+
+
+def format_order_summary(order: models.Order) -> str:
+    """One digest line for an order."""
+    return f"№{order.id} — {html.escape(order.customer_name)}, " \
+           f"{html.escape(order.customer_phone)}, {_delivery_label(order).lower()}, {format_rubles(order.total_amount)} ₽"
+
+
+def format_refund_notification(order: models.Order) -> str:
+    """Admin message for a paid order that could not be filled."""
+    return f"<b>⚠️ Заказ №{order.id} оплачен, но товара уже нет</b>\n\n" \
+           f"Оплата пришла после отмены заказа по таймауту, резерв восстановить не удалось.\n" \
+           f"<b>Клиент:</b> {html.escape(order.customer_name)}\n" \
+           f"<b>Телефон:</b> {html.escape(order.customer_phone)}\n" \
+           f"<b>Платёж:</b> {html.escape(order.payment_id or '')}\n" \
+           f"<b>Сумма к возврату:</b> {format_rubles(order.total_amount)} ₽"
+
+
+def format_refund_summary(order: models.Order) -> str:
+    """One digest line for a paid order that needs a refund."""
+    return f"⚠️ №{order.id} — оплачен, товара нет, нужен возврат {format_rubles(order.total_amount)} ₽"
+
+
+class Notification:
+    def __init__(self, text: str, summary: str):
+        self.text = text        # sent as is when it goes out alone
+        self.summary = summary  # its line in a digest
+
+
+def render_digest(batch: List[Notification], max_lines: int) -> str:
+    text = f"<b>🔔 Уведомления о заказах: {len(batch)}</b>\n\n"
+    shown = 0
+    for notification in batch[:max_lines]:
+        line = f"• {notification.summary}\n"
+        if len(text) + len(line) > MAX_MESSAGE_LENGTH - 64:
+            break
+        text += line
+        shown += 1
+    if shown < len(batch):
+        text += f"…и ещё {len(batch) - shown}\n"
+    return text + "\nПодробности — в админ-панели."
+
+
+class AdminNotifier:
+    """Coalesces admin notifications per chat.
+
+    The first notification goes out immediately. Anything arriving within
+    ``window`` seconds of a send is held back and delivered as one digest when
+    the window ends (or as the original message if it was the only one), so a
+    rush costs at most one message per chat per window instead of one per
+    order. Telegram 429s are waited out (retry_after) and the batch is retried,
+    rather than dropped.
+
+    notify() never blocks the caller: delivery runs in a per-chat task that
+    exits when the chat has nothing pending.
+    """
+
+    def __init__(self, window: float, max_lines: int):
+        self.window = window
+        self.max_lines = max_lines
+        self._pending: Dict[int, List[Notification]] = {}
+        self._next_send: Dict[int, float] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._flush_now: Optional[asyncio.Event] = None
+
+    def notify(self, chat_id: int, text: str, summary: str) -> None:
+        self._pending.setdefault(chat_id, []).append(Notification(text, summary))
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._run(chat_id))
+
+    async def _run(self, chat_id: int) -> None:
+        if self._flush_now is None:
+            self._flush_now = asyncio.Event()
+        try:
+            while True:
+                delay = self._next_send.get(chat_id, 0.0) - time.monotonic()
+                if delay > 0 and not self._flush_now.is_set():
+                    try:
+                        await asyncio.wait_for(self._flush_now.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                batch = self._pending.pop(chat_id, [])
+                if not batch:
+                    return
+                await self._deliver(chat_id, batch)
+                self._next_send[chat_id] = time.monotonic() + self.window
+        finally:
+            self._workers.pop(chat_id, None)
+
+    async def _deliver(self, chat_id: int, batch: List[Notification]) -> None:
+        from aiogram.exceptions import TelegramRetryAfter
+
+        bot = get_telegram_bot()
+        if bot is None:
+            return
+        text = batch[0].text if len(batch) == 1 else render_digest(batch, self.max_lines)
+        attempts = 0
+        while True:
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+                logger.info("Sent %d notification(s) to %s", len(batch), chat_id)
+                return
+            except TelegramRetryAfter as e:
+                logger.warning("Rate limited by Telegram, retrying in %s s", e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                attempts += 1
+                if attempts >= MAX_ATTEMPTS:
+                    logger.error("Dropped %d notification(s) to %s: %s", len(batch), chat_id, e)
+                    return
+                await asyncio.sleep(min(30.0, 2 ** attempts))
+
+    async def close(self) -> None:
+        """Send whatever is pending without waiting for the window (shutdown)."""
+        if not self._workers:
+            return
+        if self._flush_now is None:
+            self._flush_now = asyncio.Event()
+        self._flush_now.set()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+
+admin_notifier = AdminNotifier(settings.admin_notify_window, settings.admin_notify_digest_lines)
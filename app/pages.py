@@ -0,0 +1,71 @@
+import json
+import time
+from typing import Optional
+
+from fastapi.templating import Jinja2Templates
+from sqlalchemy.orm import Session
+
+from . import catalog, models, schemas
+from .assets import StaticAsset
+from .settings import settings
+from .singleflight import StaleWhileRevalidate
+
+
+def bootstrap_payload(db: Session) -> dict:
+    """Data the Mini App needs for its first paint: config and the first catalog page."""
+    limit = settings.index_inline_products
+    products = (
+        db.query(models.Product)
+        .order_by(models.Product.created_at.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    return {
+        "config": {"admin_id": settings.admin_id, "slots_required": settings.slots_required},
+        "products": [
+            schemas.ProductOut.model_validate(p).model_dump(mode="json") for p in products[:limit]
+        ],
+        "products_complete": len(products) <= limit,
+    }
+
+
+def inline_json(data: dict) -> str:
+    """Serialize data for embedding inside a <script> element."""
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return text.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+
+
+class RenderedPage:
+    """A template rendered once per catalog/config version and kept as bytes.
+
+    The cached StaticAsset carries the ETag and the precompressed bodies, so a
+    hit costs a version comparison. After a catalog change (or every
+    CATALOG_CACHE_MAX_AGE seconds, for the stock shown) the page is rendered
+    again in the background while readers keep getting the previous one.
+    """
+
+    def __init__(self, templates: Jinja2Templates, template_name: str):
+        self.templates = templates
+        self.template_name = template_name
+        self._page: Optional[StaticAsset] = None
+        self._cache = StaleWhileRevalidate(
+            template_name, self._render, max_age=settings.catalog_cache_max_age, key=self._cache_key
+        )
+
+    def _cache_key(self):
+        return (catalog.current_version(), settings.admin_id)
+
+    def _render(self, db: Session) -> StaticAsset:
+        html = self.templates.get_template(self.template_name).render(
+            bootstrap_json=inline_json(bootstrap_payload(db)),
+        )
+        page = StaticAsset(self.template_name, html.encode("utf-8"), time.time())
+        previous = self._page
+        if previous is not None and previous.digest == page.digest:
+            # Unchanged: keep Last-Modified (and the compressed bodies) as they were
+            return previous
+        self._page = page
+        return page
+
+    def get(self, db: Session) -> StaticAsset:
+        return self._cache.get(db)
@@ -0,0 +1,241 @@
+import threading
+from datetime import datetime, time
+from time import monotonic
+from typing import Callable, Dict, Generic, Iterable, List, NamedTuple, Optional, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import catalog, models, schemas
+from .money import format_rubles, percent_of
+from .settings import settings
+from .slots import slot_schedule
+
+T = TypeVar("T")
+
+RULES_ID = 1  # pricing_rules holds a single row
+MINUTES_PER_DAY = 24 * 60
+
+
+class PricedProduct(NamedTuple):
+    title: str
+    price: int
+
+
+class UnknownProduct(LookupError):
+    def __init__(self, product_id: int):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+
+class QuoteLine(NamedTuple):
+    product_id: int
+    title: str
+    price: int
+    quantity: int
+    line_total: int
+
+
+class Quote(NamedTuple):
+    lines: List[QuoteLine]
+    subtotal: int
+    discount: int
+    delivery_cost: int
+    surcharge: int
+    total_amount: int
+    free_delivery_threshold: Optional[int]
+    promo_code: Optional[str]  # as configured, whatever case the customer typed
+    delivery_zone: Optional[str]
+
+
+class PricingError(ValueError):
+    """A delivery zone or promo code the pricing rules do not accept."""
+
+
+class Adjustments(NamedTuple):
+    discount: int
+    delivery_cost: int
+    surcharge: int
+    free_delivery_threshold: Optional[int]
+    promo_code: Optional[str]
+
+
+def _minutes(starts: time, ends: time) -> range:
+    start = starts.hour * 60 + starts.minute
+    end = ends.hour * 60 + ends.minute
+    return range(start, end if end > start else end + MINUTES_PER_DAY)
+
+
+class PricingEngine:
+    """schemas.PricingRules compiled for checkout.
+
+    Zones and promo codes become dicts keyed by name and upper-cased code,
+    the surcharges two tables with the total for every minute of the day
+    (pickup, delivery). Evaluating an order is then a few lookups, however
+    many rules there are, and never touches the database.
+    """
+
+    def __init__(self, rules: schemas.PricingRules):
+        self.rules = rules
+        self._default_zone = (rules.delivery_fee, rules.free_delivery_from)
+        self._zones = {zone.name: (zone.fee, zone.free_from) for zone in rules.zones}
+        self._promos = {promo.code.upper(): promo for promo in rules.promo_codes}
+        pickup = [0] * MINUTES_PER_DAY
+        delivery = [0] * MINUTES_PER_DAY
+        for surcharge in rules.surcharges:
+            for minute in _minutes(surcharge.starts, surcharge.ends):
+                delivery[minute % MINUTES_PER_DAY] += surcharge.amount
+                if not surcharge.delivery_only:
+                    pickup[minute % MINUTES_PER_DAY] += surcharge.amount
+        self._surcharges = {"pickup": pickup, "delivery": delivery}
+
+    def zones(self) -> List[dict]:
+        """DeliveryZoneOut fields of the configured zones."""
+        return [{"name": zone.name, "fee": zone.fee, "free_from": zone.free_from} for zone in self.rules.zones]
+
+    def adjust(self, delivery_type: str, subtotal: int, zone: Optional[str] = None,
+               promo_code: Optional[str] = None, at: Optional[datetime] = None,
+               now: Optional[datetime] = None) -> Adjustments:
+        """Discount, delivery cost and surcharge for a cart worth ``subtotal``.
+
+        ``at`` is when the order is delivered or picked up (kitchen local
+        time; None: ``now``), which picks the time-of-day surcharges. The
+        free-delivery threshold applies to the subtotal after the discount.
+        Raises PricingError for an unknown zone or a promo code that is
+        unknown, expired or needs a bigger cart.
+        """
+        now = now or slot_schedule.now()
+        at = at or now
+        discount = 0
+        free_delivery = False
+        code = None
+        if promo_code:
+            promo = self._promos.get(promo_code.strip().upper())
+            if promo is None:
+                raise PricingError("Unknown promo code")
+            if promo.valid_until is not None and now > promo.valid_until:
+                raise PricingError("Promo code has expired")
+            if subtotal < promo.min_subtotal:
+                raise PricingError(f"Promo code needs an order of at least {format_rubles(promo.min_subtotal)} ₽")
+            discount = min(subtotal, percent_of(subtotal, promo.percent_off) + promo.amount_off)
+            free_delivery = promo.free_delivery
+            code = promo.code
+
+        if delivery_type == "pickup":
+            delivery_cost, free_from = 0, None
+        else:
+            if zone is None:
+                fee, free_from = self._default_zone
+            elif zone in self._zones:
+                fee, free_from = self._zones[zone]
+            else:
+                raise PricingError("Unknown delivery zone")
+            free = free_delivery or (free_from is not None and subtotal - discount >= free_from)
+            delivery_cost = 0 if free else fee
+
+        surcharge = self._surcharges[delivery_type][at.hour * 60 + at.minute]
+        return Adjustments(discount, delivery_cost, surcharge, free_from, code)
+
+
+def price_cart(items: Iterable, delivery_type: str, prices: Dict[int, PricedProduct], engine: PricingEngine,
+               zone: Optional[str] = None, promo_code: Optional[str] = None,
+               at: Optional[datetime] = None) -> Quote:
+    """Price cart lines (objects with product_id and quantity) with ``prices``
+    and the compiled pricing rules.
+
+    The one pricing function behind both the quote endpoint and create_order;
+    raises UnknownProduct for an id missing from ``prices`` and PricingError
+    for a zone or promo code the rules reject.
+    """
+    lines = []
+    subtotal = 0
+    for item in items:
+        product = prices.get(item.product_id)
+        if product is None:
+            raise UnknownProduct(item.product_id)
+        line_total = product.price * item.quantity
+        subtotal += line_total
+        lines.append(QuoteLine(item.product_id, product.title, product.price, item.quantity, line_total))
+    adjustments = engine.adjust(delivery_type, subtotal, zone, promo_code, at)
+    total_amount = subtotal - adjustments.discount + adjustments.delivery_cost + adjustments.surcharge
+    return Quote(
+        lines, subtotal, adjustments.discount, adjustments.delivery_cost, adjustments.surcharge, total_amount,
+        adjustments.free_delivery_threshold, adjustments.promo_code,
+        zone if delivery_type == "delivery" else None,
+    )
+
+
+def load_prices(db: Session, product_ids=None) -> Dict[int, PricedProduct]:
+    """id -> (title, price) from the database, for all products or the given ids."""
+    statement = select(models.Product.id, models.Product.title, models.Product.price)
+    if product_ids is not None:
+        statement = statement.where(models.Product.id.in_(product_ids))
+    return {row.id: PricedProduct(row.title, row.price) for row in db.execute(statement)}
+
+
+def load_rules(db: Session) -> schemas.PricingRules:
+    """The stored pricing rules; the defaults (flat fee, free from a subtotal) until an admin saves some."""
+    stored = db.execute(
+        select(models.PricingRuleSet.rules).where(models.PricingRuleSet.id == RULES_ID)
+    ).scalar_one_or_none()
+    if stored is None:
+        return schemas.PricingRules()
+    return schemas.PricingRules.model_validate_json(stored)
+
+
+def save_rules(db: Session, rules: schemas.PricingRules) -> None:
+    """Replace the stored rules. The caller commits, then bumps the catalog
+    version (cache.catalog_sync.bump()) so that every worker recompiles them.
+    """
+    document = rules.model_dump_json()
+    db.execute(
+        insert(models.PricingRuleSet)
+        .values(id=RULES_ID, rules=document)
+        .on_conflict_do_update(index_elements=["id"], set_={"rules": document, "updated_at": datetime.utcnow()})
+    )
+
+
+class CatalogSnapshot(Generic[T]):
+    """A value loaded from the database, kept in memory and rebuilt once per
+    catalog version, or once older than ``max_age`` seconds (0: never by age).
+
+    Readers do not touch the database; the first one after an admin write
+    (products or pricing rules) pays for the reload. The age bound covers
+    writes this process does not hear about: with CACHE_BACKEND=memory the
+    version only moves in the worker that handled the write.
+    """
+
+    def __init__(self, load: Callable[[Session], T], max_age: float = 0):
+        self._load = load
+        self.max_age = max_age
+        self._value: Optional[T] = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self, version: int) -> bool:
+        return self._version == version and (not self.max_age or monotonic() - self._loaded_at < self.max_age)
+
+    def get(self, db: Session) -> T:
+        version = catalog.current_version()
+        if self._current(version):
+            return self._value
+        with self._lock:
+            if not self._current(version):
+                self._value = self._load(db)
+                self._version = version
+                self._loaded_at = monotonic()
+            return self._value
+
+
+# All product prices for quotes: one SELECT of (id, title, price) per version.
+# Aged out like the rules: create_order reads prices from the database, and a
+# quote on a worker that missed a price change must not contradict it for long
+price_snapshot: CatalogSnapshot[Dict[int, PricedProduct]] = CatalogSnapshot(
+    load_prices, max_age=settings.pricing_cache_max_age,
+)
+# The pricing rules, compiled once per version, for quotes and checkouts
+pricing_rules: CatalogSnapshot[PricingEngine] = CatalogSnapshot(
+    lambda db: PricingEngine(load_rules(db)), max_age=settings.pricing_cache_max_age,
+)
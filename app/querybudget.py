@@ -0,0 +1,148 @@
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Collapse what differs between executions of "the same" statement
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")  # IN (?, ?, ?) -> IN (?)
+_SPACE_RE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def fingerprint(statement: str) -> str:
+    """Statement with literals and IN-list lengths normalized away."""
+    statement = _STRING_RE.sub("?", statement)
+    statement = _NUMBER_RE.sub("?", statement)
+    statement = _PARAM_LIST_RE.sub("(?)", statement)
+    return _SPACE_RE.sub(" ", statement).strip()
+
+
+class QueryLog:
+    """Statements executed while handling one request, by fingerprint."""
+
+    def __init__(self):
+        self.total = 0
+        self.counts: Counter = Counter()
+
+    def record(self, statement: str) -> None:
+        self.total += 1
+        self.counts[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Fingerprints executed at least ``threshold`` times: likely N+1 loads."""
+        return [(sql, count) for sql, count in self.counts.most_common() if count >= threshold]
+
+
+_query_log: ContextVar[Optional[QueryLog]] = ContextVar("query_log", default=None)
+
+
+def track_queries(engine) -> None:
+    """Record every statement on ``engine`` into the current QueryLog, if any."""
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        log = _query_log.get()
+        if log is not None:
+            log.record(statement)
+
+
+@contextmanager
+def capture_queries():
+    """Collect statements outside of an HTTP request (scripts, checks)."""
+    log = QueryLog()
+    token = _query_log.set(log)
+    try:
+        yield log
+    finally:
+        _query_log.reset(token)
+
+
+def query_budget(max_queries: int):
+    """Declare how many SQL statements a route may execute per request."""
+
+    def decorator(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+
+    return decorator
+
+
+def check_budget(route: str, budget: Optional[int], log: QueryLog, threshold: int) -> List[str]:
+    """Problems with one request's queries, as human-readable lines."""
+    problems = []
+    if budget is not None and log.total > budget:
+        problems.append(f"{route}: {log.total} SQL statements, budget is {budget}")
+    for sql, count in log.repeated(threshold):
+        problems.append(f"{route}: possible N+1, {count}x {sql[:200]}")
+    return problems
+
+
+def _route_budget(scope) -> Optional[int]:
+    return getattr(getattr(scope.get("route"), "endpoint", None), "query_budget", None)
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware counting SQL per request (development and checks only).
+
+    SQL_DEBUG_HEADER adds X-SQL-Queries, X-SQL-Repeated (the highest repeat
+    count of a single statement) and X-SQL-Budget to every response. SQL_BUDGET_MODE
+    "warn" logs routes over their @query_budget or with repeated statements;
+    "raise" raises QueryBudgetExceeded after the response, which fails the
+    request under TestClient.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.mode = settings.sql_budget_mode
+        self.header = settings.sql_debug_header
+        self.threshold = settings.sql_n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = _query_log.set(log)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.header:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-sql-queries", str(log.total).encode()))
+                if log.counts:
+                    headers.append((b"x-sql-repeated", str(max(log.counts.values())).encode()))
+                budget = _route_budget(scope)
+                if budget is not None:
+                    headers.append((b"x-sql-budget", str(budget).encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _query_log.reset(token)
+
+        if self.mode not in ("warn", "raise"):
+            return
+        route = scope.get("route")
+        name = f"{scope['method']} {route.path if route is not None else scope['path']}"
+        problems = check_budget(name, _route_budget(scope), log, self.threshold)
+        if not problems:
+            return
+        if self.mode == "raise":
+            raise QueryBudgetExceeded("; ".join(problems))
+        for problem in problems:
+            logger.warning(problem)
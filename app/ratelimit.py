@@ -0,0 +1,217 @@
+import json
+import logging
+import math
+import re
+import time
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from fastapi import HTTPException
+
+from .auth import authenticate
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def parse_limit(value: str) -> Optional[Tuple[int, int]]:
+    """"5/60" -> (5 requests, 60 seconds); empty or "0" disables the limit."""
+    value = value.strip()
+    if not value or value == "0":
+        return None
+    count, _, seconds = value.partition("/")
+    return int(count), int(seconds or 60)
+
+
+def _sliding_window(prev: int, curr: int, start: float, window: int, limit: int, now: float):
+    """Sliding-window counter: the previous fixed window counts by the share of it
+    still covered. Returns (allowed, retry_after seconds)."""
+    weight = 1.0 - (now - start) / window
+    if prev * weight + curr + 1 <= limit:
+        return True, 0
+    if curr + 1 > limit or not prev:
+        retry_after = start + window - now
+    else:
+        # Wait until enough of the previous window has slid out
+        retry_after = start + window * (1.0 - (limit - curr - 1) / prev) - now
+    return False, max(1, math.ceil(retry_after))
+
+
+class MemoryBackend:
+    """Per-process counters: exact for a single worker, per-worker otherwise."""
+
+    CLEANUP_EVERY = 1024
+
+    def __init__(self):
+        self._counters: Dict[str, list] = {}  # key -> [window start, previous, current, window]
+        self._hits = 0
+
+    async def hit(self, key: str, limit: int, window: int, now: float):
+        start = now - now % window
+        entry = self._counters.get(key)
+        if entry is None or entry[0] < start - window:
+            entry = [start, 0, 0, window]
+        elif entry[0] < start:
+            entry = [start, entry[2], 0, window]
+        self._counters[key] = entry
+        allowed, retry_after = _sliding_window(entry[1], entry[2], start, window, limit, now)
+        if allowed:
+            entry[2] += 1
+
+        self._hits += 1
+        if self._hits % self.CLEANUP_EVERY == 0:
+            self._cleanup(now)
+        return allowed, retry_after
+
+    def _cleanup(self, now: float) -> None:
+        # Entries idle for two windows no longer affect any decision
+        self._counters = {
+            key: entry for key, entry in self._counters.items() if entry[0] >= now - 2 * entry[3]
+        }
+
+
+class RedisBackend:
+    """Counters shared by all workers through Redis (needs the optional ``redis`` package).
+
+    Two workers checking at the same instant can both be admitted, so a limit
+    may be overshot by at most one request per worker.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio
+
+        self._redis = redis.asyncio.from_url(url)
+
+    async def hit(self, key: str, limit: int, window: int, now: float):
+        start = now - now % window
+        current_key = f"ratelimit:{key}:{int(start)}"
+        previous_key = f"ratelimit:{key}:{int(start - window)}"
+        prev, curr = await self._redis.mget(previous_key, current_key)
+        allowed, retry_after = _sliding_window(int(prev or 0), int(curr or 0), start, window, limit, now)
+        if allowed:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.incr(current_key)
+                pipe.expire(current_key, 2 * window)
+                await pipe.execute()
+        return allowed, retry_after
+
+
+def create_backend():
+    if settings.rate_limit_backend == "redis":
+        try:
+            return RedisBackend(settings.rate_limit_redis_url)
+        except ImportError:
+            logger.warning("RATE_LIMIT_BACKEND=redis but the redis package is not installed; "
+                           "rate limits are per worker")
+    return MemoryBackend()
+
+
+class RateLimitRule:
+    """Limits for one endpoint: per Telegram user, per client IP, and in-flight requests."""
+
+    def __init__(self, method: str, path: str, per_user: Optional[Tuple[int, int]] = None,
+                 per_ip: Optional[Tuple[int, int]] = None, max_concurrency: int = 0):
+        self.method = method
+        self.path: Pattern = re.compile(path)
+        self.per_user = per_user
+        self.per_ip = per_ip
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.name = f"{method} {path}"
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.path.fullmatch(path) is not None
+
+
+def default_rules() -> List[RateLimitRule]:
+    """Expensive endpoints: each call writes to SQLite, payments also call YooKassa."""
+    return [
+        RateLimitRule(
+            "POST", r"/api/orders/?",
+            per_user=parse_limit(settings.rate_limit_orders_user),
+            per_ip=parse_limit(settings.rate_limit_orders_ip),
+            max_concurrency=settings.orders_max_concurrency,
+        ),
+        RateLimitRule(
+            "POST", r"/api/orders/\d+/payment",
+            per_user=parse_limit(settings.rate_limit_payments_user),
+            per_ip=parse_limit(settings.rate_limit_payments_ip),
+            max_concurrency=settings.payments_max_concurrency,
+        ),
+    ]
+
+
+async def _reject(send, status_code: int, detail: str, retry_after: int) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying RateLimitRule limits before the route runs.
+
+    Over a per-user/per-IP limit: 429. Over the concurrency cap (counted per
+    worker process): 503, so the SQLite writer is never queued behind a burst.
+    Both carry Retry-After. Requests matching no rule pass straight through.
+    """
+
+    def __init__(self, app, rules: Optional[List[RateLimitRule]] = None, backend=None):
+        self.app = app
+        self.rules = rules if rules is not None else default_rules()
+        self.backend = backend or create_backend()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.rate_limit_enabled:
+            await self.app(scope, receive, send)
+            return
+        rule = next((r for r in self.rules if r.matches(scope["method"], scope["path"])), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        now = time.time()
+        for key, limit in self._keys(rule, scope):
+            allowed, retry_after = await self.backend.hit(key, limit[0], limit[1], now)
+            if not allowed:
+                logger.info("Rate limited %s (%d/%ds)", key, limit[0], limit[1])
+                await _reject(send, 429, "Too many requests", retry_after)
+                return
+
+        if rule.max_concurrency and rule.in_flight >= rule.max_concurrency:
+            await _reject(send, 503, "Server is busy, try again shortly", 1)
+            return
+        rule.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            rule.in_flight -= 1
+
+    @staticmethod
+    def _keys(rule: RateLimitRule, scope):
+        if rule.per_user:
+            user_id = _telegram_user_id(scope)
+            if user_id is not None:
+                yield f"user:{user_id}:{rule.name}:{rule.per_user[1]}", rule.per_user
+        if rule.per_ip and scope.get("client"):
+            yield f"ip:{scope['client'][0]}:{rule.name}:{rule.per_ip[1]}", rule.per_ip
+
+
+def _telegram_user_id(scope) -> Optional[int]:
+    """Caller's Telegram id, or None if unauthenticated (the route will reject it)."""
+    headers = dict(scope["headers"])
+    init_data = headers.get(b"x-telegram-init-data")
+    telegram_id = headers.get(b"x-telegram-id")
+    try:
+        return authenticate(
+            init_data.decode("latin-1") if init_data else None,
+            telegram_id.decode("latin-1") if telegram_id else None,
+        )
+    except HTTPException:
+        return None
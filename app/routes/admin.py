@@ -1,27 +1,30 @@
-from typing import Optional
+import asyncio
+import base64
+import logging
+from datetime import datetime
+from typing import List, Optional
 from uuid import uuid4
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, Header, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, WebSocket, WebSocketDisconnect
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session, selectinload
 
+from ..auth import authenticate, require_admin
 from ..database import get_db
-from .. import models, schemas
+from .. import broadcast as broadcast_engine, models, schemas
+from ..cache import catalog_sync
+from ..events import DROPPED, order_event_data, order_events
+from ..inventory import release_stock
+from ..pricing import load_rules, save_rules
+from ..querybudget import query_budget
+from ..serialization import ADMIN_ORDER_PAGE, PydanticJSONResponse, model_json
 from ..settings import settings
+from ..slots import set_capacity, slot_index, slot_out, slot_schedule
 
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
-
-
-def require_admin(x_telegram_id: Optional[str] = Header(None, alias="X-Telegram-Id")) -> None:
-    if x_telegram_id is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="X-Telegram-Id header missing")
-    try:
-        telegram_id = int(x_telegram_id)
-    except ValueError:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid X-Telegram-Id header")
-    if telegram_id != settings.admin_id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+logger = logging.getLogger(__name__)
 
 
 @router.post("/products", response_model=schemas.ProductOut, dependencies=[Depends(require_admin)])
@@ -31,9 +34,11 @@ def create_product(payload: schemas.ProductCreate, db: Session = Depends(get_db)
         description=payload.description,
         price=payload.price,
         image=payload.image,
+        stock=payload.stock,
     )
     db.add(product)
     db.commit()
+    catalog_sync.bump()
     db.refresh(product)
     return product
 
@@ -52,8 +57,11 @@ def update_product(product_id: int, payload: schemas.ProductUpdate, db: Session
         product.price = payload.price
     if payload.image is not None:
         product.image = payload.image
+    if "stock" in payload.model_fields_set:
+        product.stock = payload.stock
 
     db.commit()
+    catalog_sync.bump()
     db.refresh(product)
     return product
 
@@ -65,9 +73,37 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     db.delete(product)
     db.commit()
+    catalog_sync.bump()
     return None
 
 
+@router.put("/slots/{starts_at}", response_model=schemas.SlotOut, dependencies=[Depends(require_admin)])
+def update_slot_capacity(starts_at: datetime, payload: schemas.SlotCapacityUpdate, db: Session = Depends(get_db)):
+    """Set how many orders one slot takes (0 closes it, null restores SLOT_CAPACITY)."""
+    starts_at = slot_schedule.local(starts_at)
+    if not slot_schedule.on_grid(starts_at):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown delivery slot")
+    bookings = set_capacity(db, starts_at, payload.capacity)
+    db.commit()
+    slot_index.record({starts_at: bookings})
+    return slot_out(starts_at, bookings)
+
+
+@router.get("/pricing-rules", response_model=schemas.PricingRules, dependencies=[Depends(require_admin)])
+def get_pricing_rules(db: Session = Depends(get_db)):
+    return load_rules(db)
+
+
+@router.put("/pricing-rules", response_model=schemas.PricingRules, dependencies=[Depends(require_admin)])
+def update_pricing_rules(payload: schemas.PricingRules, db: Session = Depends(get_db)):
+    """Replace the delivery zones, surcharges and promo codes as one document."""
+    save_rules(db, payload)
+    db.commit()
+    # Every worker recompiles its rules on the next quote or checkout
+    catalog_sync.bump()
+    return payload
+
+
 @router.post("/upload-image")
 def upload_image(file: UploadFile = File(...), _: None = Depends(require_admin)):
     if not file.content_type or not file.content_type.startswith("image/"):
@@ -88,3 +124,226 @@ def upload_image(file: UploadFile = File(...), _: None = Depends(require_admin))
     return {"url": url_path}
 
 
+def _encode_cursor(order: models.Order) -> str:
+    raw = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, order_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@router.get("/orders", response_model=schemas.AdminOrderPage, dependencies=[Depends(require_admin)])
+@query_budget(2)
+def list_orders(
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    delivery_type: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    """List all orders, newest first, with keyset pagination on (created_at, id)."""
+    query = db.query(models.Order)
+
+    if status_filter:
+        try:
+            statuses = [models.OrderStatus(s) for s in status_filter]
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status filter")
+        query = query.filter(models.Order.status.in_(statuses))
+    if delivery_type:
+        try:
+            query = query.filter(models.Order.delivery_type == models.DeliveryType(delivery_type))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid delivery_type filter")
+    if created_from:
+        query = query.filter(models.Order.created_at >= created_from)
+    if created_to:
+        query = query.filter(models.Order.created_at < created_to)
+    if cursor:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            models.Order.created_at < cursor_created_at,
+            and_(models.Order.created_at == cursor_created_at, models.Order.id < cursor_id),
+        ))
+
+    # Fetch one extra row to know whether there is a next page; load items in one query
+    orders = (
+        query.options(selectinload(models.Order.items))
+        .order_by(models.Order.created_at.desc(), models.Order.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = _encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    page = {"items": orders[:limit], "next_cursor": next_cursor}
+    return PydanticJSONResponse(model_json(ADMIN_ORDER_PAGE, page))
+
+
+@router.get("/orders/summary", response_model=List[schemas.OrderTotals], dependencies=[Depends(require_admin)])
+@query_budget(1)
+def order_summary(
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """Orders and money per status, summed in SQL over integer kopecks (exact)."""
+    order = models.Order
+    money = [order.subtotal, order.discount, order.delivery_cost, order.surcharge, order.total_amount]
+    statement = select(
+        order.status, func.count().label("orders"), *(func.sum(column).label(column.key) for column in money)
+    ).group_by(order.status).order_by(order.status)
+    if created_from:
+        statement = statement.where(order.created_at >= created_from)
+    if created_to:
+        statement = statement.where(order.created_at < created_to)
+    return [{**row._asdict(), "status": row.status.value} for row in db.execute(statement)]
+
+
+@router.post("/orders/status", response_model=schemas.OrderStatusBulkResult, dependencies=[Depends(require_admin)])
+def bulk_update_order_status(payload: schemas.OrderStatusBulkUpdate, db: Session = Depends(get_db)):
+    """Move many orders to a new status in one UPDATE, skipping disallowed transitions."""
+    target = models.OrderStatus(payload.status)
+    sources = models.allowed_source_statuses(target)
+
+    updated_ids = []
+    if sources:
+        result = db.execute(
+            update(models.Order)
+            .where(models.Order.id.in_(payload.order_ids), models.Order.status.in_(sources))
+            .values(status=target, updated_at=datetime.utcnow())
+            .returning(models.Order.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated_ids = sorted(row[0] for row in result)
+        slots = {}
+        if target == models.OrderStatus.CANCELLED:
+            slots = release_stock(db, updated_ids).slots
+        db.commit()
+        slot_index.record(slots)
+
+    if updated_ids:
+        for order in db.query(models.Order).filter(models.Order.id.in_(updated_ids)).all():
+            order_events.publish("order.status_changed", order_event_data(order))
+
+    updated = set(updated_ids)
+    return schemas.OrderStatusBulkResult(
+        status=target.value,
+        updated=updated_ids,
+        skipped=[order_id for order_id in payload.order_ids if order_id not in updated],
+    )
+
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    # Client messages are ignored; reading is how we notice the client going away
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.websocket("/orders/ws")
+async def order_feed(websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+    """Live feed of order events for the admin.
+
+    Reconnect with ?since=<last seq>&epoch=<epoch> to receive what was missed.
+    A "hello" message with resumed=false means the gap could not be filled and
+    the client should reload the list from GET /orders.
+    """
+    # Browsers cannot set headers on WebSocket requests: accept query params too
+    try:
+        telegram_user_id = authenticate(
+            websocket.headers.get("x-telegram-init-data") or websocket.query_params.get("init_data"),
+            websocket.headers.get("x-telegram-id") or websocket.query_params.get("telegram_id"),
+        )
+    except HTTPException:
+        telegram_user_id = None
+    if telegram_user_id != settings.admin_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription, backlog, complete, seq = order_events.subscribe(since, epoch)
+    receiver = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        await websocket.send_json({
+            "type": "hello",
+            "epoch": order_events.epoch,
+            "seq": seq,
+            "resumed": complete,
+        })
+        # The client's since counts only if it resumed: after a restart (new
+        # epoch) or with a since ahead of ours, new events start above seq
+        last_sent = (since or 0) if complete else seq
+        for event in backlog:
+            await websocket.send_json(event)
+            last_sent = event["seq"]
+
+        while True:
+            getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            event = getter.result()
+            if event is DROPPED:
+                # Too slow to keep up: the client should reconnect with ?since=last_sent
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                break
+            if event["seq"] <= last_sent:
+                continue
+            await websocket.send_json(event)
+            last_sent = event["seq"]
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        order_events.unsubscribe(subscription)
+
+
+@router.post("/broadcasts", response_model=schemas.BroadcastOut, status_code=status.HTTP_202_ACCEPTED,
+             dependencies=[Depends(require_admin)])
+async def create_broadcast(payload: schemas.BroadcastCreate, db: Session = Depends(get_db)):
+    """Queue an announcement to every customer; sending continues in the background."""
+    if not settings.bot_token:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Telegram bot is not configured")
+    broadcast = await asyncio.to_thread(broadcast_engine.create_broadcast, db, payload.text)
+    logger.info("Broadcast %s created for %d recipients", broadcast.id, broadcast.total)
+    await broadcast_engine.broadcast_manager.start(broadcast.id)
+    db.refresh(broadcast)
+    return broadcast
+
+
+@router.get("/broadcasts/{broadcast_id}", response_model=schemas.BroadcastOut, dependencies=[Depends(require_admin)])
+def get_broadcast(broadcast_id: int, db: Session = Depends(get_db)):
+    broadcast = db.get(models.Broadcast, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast not found")
+    return broadcast
+
+
+@router.post("/broadcasts/{broadcast_id}/cancel", response_model=schemas.BroadcastOut,
+             dependencies=[Depends(require_admin)])
+def cancel_broadcast(broadcast_id: int, db: Session = Depends(get_db)):
+    """Stop a broadcast; the sending process notices at its next progress flush."""
+    broadcast = db.get(models.Broadcast, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast not found")
+    db.execute(
+        update(models.Broadcast)
+        .where(
+            models.Broadcast.id == broadcast_id,
+            models.Broadcast.status.in_([models.BroadcastStatus.PENDING, models.BroadcastStatus.RUNNING]),
+        )
+        .values(status=models.BroadcastStatus.CANCELLED, finished_at=datetime.utcnow())
+    )
+    db.commit()
+    db.refresh(broadcast)
+    return broadcast
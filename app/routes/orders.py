@@ -1,96 +1,110 @@
-from typing import Optional
+import asyncio
+import logging
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, Header, HTTPException, status
-from sqlalchemy.orm import Session # Removed joinedload as it's not strictly needed for this change
-from aiogram import Bot # Import Bot for Telegram notifications
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
 
+from ..auth import get_telegram_user_id
 from ..database import get_db
 from .. import models, schemas
+from ..events import order_event_data, order_events
+from ..inventory import cart_quantities, release_stock, reserve_stock, restore_reservation
+from ..metrics import ORDERS_CREATED, ORDERS_PAID, PAYMENTS_CREATED
+from ..money import format_rubles
+from ..querybudget import query_budget
+from ..serialization import ORDER_OUT, FastJSONResponse, PydanticJSONResponse, model_json, orders_with_items, select_orders
+from ..notifications import admin_notifier, format_order_notification, format_order_summary, format_refund_notification, format_refund_summary
+from ..pricing import PricingError, UnknownProduct, load_prices, price_cart, price_snapshot, pricing_rules
 from ..settings import settings
+from ..slots import SlotUnavailable, reserve_slot, slot_index, slot_schedule
 from ..yookassa import get_yookassa_client
 
 
-telegram_bot = None
-if settings.bot_token:
-    telegram_bot = Bot(token=settings.bot_token)
-    print("[DEBUG] Telegram Bot client initialized in orders.py")
-else:
-    print("[WARNING] BOT_TOKEN is not configured in settings. Telegram notifications will not work from orders.py.")
-
-
 router = APIRouter(prefix="/api/orders", tags=["orders"])
+logger = logging.getLogger(__name__)
 
 
-def get_telegram_user_id(x_telegram_id: Optional[str] = Header(None, alias="X-Telegram-Id")) -> int:
-    """Extract Telegram user ID from header."""
-    if x_telegram_id is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="X-Telegram-Id header missing")
+def _price_or_error(items, delivery_type: str, prices, db: Session, zone, promo_code, at=None):
     try:
-        return int(x_telegram_id)
-    except ValueError:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid X-Telegram-Id header")
+        return price_cart(items, delivery_type, prices, pricing_rules.get(db), zone, promo_code, at)
+    except UnknownProduct as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product with id {e.product_id} not found"
+        )
+    except PricingError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
-def calculate_delivery_cost(delivery_type: str, subtotal: float) -> float:
-    """Calculate delivery cost based on type and order amount."""
-    if delivery_type == "pickup":
-        return 0.0
-    
-    # Free delivery for orders over 1500 rubles
-    FREE_DELIVERY_THRESHOLD = 1500.0
-    DELIVERY_COST = 500.0
-    
-    if subtotal >= FREE_DELIVERY_THRESHOLD:
-        return 0.0
-    
-    return DELIVERY_COST
+@router.post("/quote", response_model=schemas.QuoteOut)
+@query_budget(2)
+def quote_cart(quote_data: schemas.QuoteRequest, db: Session = Depends(get_db)):
+    """Price a cart, delivery, surcharges and promo code included, from the
+    in-memory price snapshot and compiled pricing rules.
 
+    Cheap enough for every cart change: no writes, no per-item queries (only
+    reloads after a catalog or pricing rules change). create_order prices the
+    same way from the database, so the quoted total is what the order will cost.
+    """
+    at = slot_schedule.local(quote_data.delivery_slot) if quote_data.delivery_slot else None
+    quote = _price_or_error(
+        quote_data.items, quote_data.delivery_type, price_snapshot.get(db), db,
+        quote_data.delivery_zone, quote_data.promo_code, at,
+    )
+    return schemas.QuoteOut(
+        items=[schemas.QuoteLineOut(**line._asdict()) for line in quote.lines],
+        subtotal=quote.subtotal,
+        discount=quote.discount,
+        delivery_cost=quote.delivery_cost,
+        surcharge=quote.surcharge,
+        total_amount=quote.total_amount,
+        free_delivery_threshold=quote.free_delivery_threshold,
+    )
 
-@router.post("/", response_model=schemas.OrderOut)
-async def create_order( # Changed to async
-    order_data: schemas.OrderCreate,
-    db: Session = Depends(get_db),
-    telegram_user_id: int = Depends(get_telegram_user_id)
-):
-    print(f"[ORDER] Creating order for user {telegram_user_id}")
-    print(f"[ORDER] Order data: {order_data.dict()}")
-    """Create a new order with delivery calculation."""
-    
-    # Validate delivery address requirement
-    if order_data.delivery_type == "delivery" and not order_data.customer_address:
+
+def _place_order(db: Session, order_data: schemas.OrderCreate, telegram_user_id: int):
+    """Reserve stock and the slot, price and insert the order; returns it with its JSON body."""
+    # Reserve stock first: opening the transaction with the write makes
+    # concurrent checkouts queue on SQLite's write lock instead of racing
+    quantities = cart_quantities(order_data.items)
+    sold_out = reserve_stock(db, quantities)
+    if sold_out:
+        db.rollback()
+        known = load_prices(db, sold_out)
+        missing = [product_id for product_id in sold_out if product_id not in known]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with id {missing[0]} not found"
+            )
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Address is required for delivery"
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Not enough stock for products: {', '.join(map(str, sold_out))}"
         )
-    
-    # Calculate subtotal
-    subtotal = 0.0
-    order_items = []
-    
-    for item_data in order_data.items:
-        # Get product details
-        product = db.query(models.Product).filter(models.Product.id == item_data.product_id).first()
-        if not product:
+    slots = {}
+    if order_data.delivery_slot is not None:
+        bookings = reserve_slot(db, order_data.delivery_slot)
+        if bookings is None:
+            db.rollback()
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product with id {item_data.product_id} not found"
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Delivery slot is full"
             )
-        
-        item_total = product.price * item_data.quantity
-        subtotal += item_total
-        
-        # Prepare order item data
-        order_items.append({
-            "product_id": product.id,
-            "product_name": product.title,
-            "product_price": product.price,
-            "quantity": item_data.quantity
-        })
+        slots[order_data.delivery_slot] = bookings
     
-    # Calculate delivery cost
-    delivery_cost = calculate_delivery_cost(order_data.delivery_type, subtotal)
-    total_amount = subtotal + delivery_cost
+    # Price the cart with current database prices (all products in one query)
+    # and the compiled pricing rules (in memory)
+    prices = load_prices(db, quantities)
+    try:
+        quote = _price_or_error(
+            order_data.items, order_data.delivery_type, prices, db,
+            order_data.delivery_zone, order_data.promo_code, order_data.delivery_slot,
+        )
+    except HTTPException:
+        db.rollback()  # a rejected zone or promo code: give the stock and slot back
+        raise
     
     # Create order
     order = models.Order(
@@ -101,78 +115,99 @@ async def create_order( # Changed to async
         delivery_type=order_data.delivery_type,
         payment_type=order_data.payment_type,
         comment=order_data.comment,
-        subtotal=subtotal,
-        delivery_cost=delivery_cost,
-        total_amount=total_amount,
-        status=models.OrderStatus.PENDING
+        subtotal=quote.subtotal,
+        discount=quote.discount,
+        delivery_cost=quote.delivery_cost,
+        surcharge=quote.surcharge,
+        total_amount=quote.total_amount,
+        promo_code=quote.promo_code,
+        delivery_zone=quote.delivery_zone,
+        status=models.OrderStatus.PENDING,
+        stock_reserved=True,
+        delivery_slot=order_data.delivery_slot
     )
     
     db.add(order)
     db.flush()  # Get the order ID
     
-    # Create order items
-    for item_data in order_items:
-        order_item = models.OrderItem(
-            order_id=order.id,
-            product_id=item_data["product_id"],
-            product_name=item_data["product_name"],
-            product_price=item_data["product_price"],
-            quantity=item_data["quantity"]
-        )
-        db.add(order_item)
+    # Create order items: one executemany instead of an INSERT ... RETURNING per row
+    db.execute(insert(models.OrderItem), [
+        {
+            "order_id": order.id,
+            "product_id": line.product_id,
+            "product_name": line.title,
+            "product_price": line.price,
+            "quantity": line.quantity,
+        }
+        for line in quote.lines
+    ])
     
     db.commit()
+    slot_index.record(slots)  # only now: the rollbacks above must not show in the index
     db.refresh(order)
+    return order, model_json(ORDER_OUT, order)
 
-    print(f"[ORDER] Order created successfully with ID: {order.id}")
 
-    # Send Telegram notification for cash orders to admin
-    if order.payment_type == models.PaymentType.CASH and telegram_bot and settings.admin_id:
+@router.post("/", response_model=schemas.OrderOut)
+@query_budget(8)
+async def create_order( # Changed to async
+    order_data: schemas.OrderCreate,
+    db: Session = Depends(get_db),
+    telegram_user_id: int = Depends(get_telegram_user_id)
+):
+    """Create a new order with delivery calculation."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Order data", extra={"telegram_user_id": telegram_user_id, "order": order_data.model_dump()})
+    
+    # Validate delivery address requirement
+    if order_data.delivery_type == "delivery" and not order_data.customer_address:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Address is required for delivery"
+        )
+
+    if order_data.delivery_slot is not None:
         try:
-            order_details = f"<b>🔔 Новый заказ №{order.id} (Наличные)</b>\n\n" \
-                            f"<b>Клиент:</b> {order.customer_name}\n" \
-                            f"<b>Телефон:</b> {order.customer_phone}\n" \
-                            f"<b>Тип доставки:</b> {'Доставка' if order.delivery_type == 'delivery' else 'Самовывоз'}\n"
-            if order.delivery_type == 'delivery':
-                order_details += f"<b>Адрес:</b> {order.customer_address}\n"
-            if order.comment:
-                order_details += f"<b>Комментарий:</b> {order.comment}\n"
-            
-            order_details += "\n<b>Состав заказа:</b>\n"
-            for item_data in order_items: # Use the list constructed earlier
-                order_details += f"- {item_data['product_name']} x {item_data['quantity']} ({item_data['product_price']:.2f} ₽/шт)\n"
-            
-            order_details += f"\n<b>Подытог:</b> {order.subtotal:.2f} ₽\n" \
-                             f"<b>Доставка:</b> {order.delivery_cost:.2f} ₽\n" \
-                             f"<b>Итого к оплате:</b> {order.total_amount:.2f} ₽\n" \
-                             f"<b>Статус:</b> {order.status.value}"
+            order_data.delivery_slot = slot_schedule.check(order_data.delivery_slot)
+        except SlotUnavailable as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    elif settings.slots_required:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Delivery slot is required"
+        )
+    
+    # The database work blocks (a checkout may wait for another one's write
+    # lock), so it runs in a worker thread and the event loop keeps serving
+    order, body = await asyncio.to_thread(_place_order, db, order_data, telegram_user_id)
 
-            await telegram_bot.send_message(
-                chat_id=settings.admin_id,
-                text=order_details,
-                parse_mode="HTML"
-            )
-            print(f"[ORDER] Telegram notification sent for order {order.id} to admin {settings.admin_id}")
-        except Exception as e:
-            print(f"[ERROR] Failed to send Telegram notification for order {order.id}: {e}")
+    logger.info("Order %s created", order.id, extra={"telegram_user_id": telegram_user_id})
+    order_events.publish("order.created", order_event_data(order))
+    ORDERS_CREATED.labels(order.payment_type.value).inc()
+
+    # Notify the admin about cash orders; coalesced into digests during a rush
+    if order.payment_type == models.PaymentType.CASH and settings.bot_token and settings.admin_id:
+        admin_notifier.notify(settings.admin_id, format_order_notification(order), format_order_summary(order))
 
-    return order
+    return PydanticJSONResponse(body)
 
 
 @router.get("/", response_model=list[schemas.OrderOut])
+@query_budget(2)
 def get_user_orders(
     db: Session = Depends(get_db),
     telegram_user_id: int = Depends(get_telegram_user_id)
 ):
     """Get orders for the current user."""
-    orders = db.query(models.Order).filter(
+    orders = orders_with_items(db, select_orders().where(
         models.Order.telegram_user_id == telegram_user_id
-    ).order_by(models.Order.created_at.desc()).all()
+    ).order_by(models.Order.created_at.desc()))
     
-    return orders
+    return FastJSONResponse(orders)
 
 
 @router.get("/{order_id}", response_model=schemas.OrderOut)
+@query_budget(2)
 def get_order(
     order_id: int,
     db: Session = Depends(get_db),
@@ -190,10 +225,11 @@ def get_order(
             detail="Order not found"
         )
     
-    return order
+    return PydanticJSONResponse(model_json(ORDER_OUT, order))
 
 
-@router.post("/{order_id}/payment", response_model=schemas.PaymentOut)
+@router.post("/{order_id:int}/payment", response_model=schemas.PaymentOut)
+@query_budget(3)
 async def create_payment(
     order_id: int,
     payment_data: schemas.PaymentCreate,
@@ -227,12 +263,10 @@ async def create_payment(
         )
     
     try:
-        print(f"[DEBUG] Creating payment for order {order.id}, amount: {order.total_amount}")
-        print(f"[DEBUG] Payment success URL: {settings.payment_success_url}")
+        logger.debug("Creating payment for order %s, amount %s", order.id, format_rubles(order.total_amount))
 
         # Create payment with YooKassa
         yookassa = get_yookassa_client()
-        print(f"[DEBUG] YooKassa client obtained: {yookassa}")
 
         payment_response = await yookassa.create_payment(
             amount=order.total_amount,
@@ -244,11 +278,10 @@ async def create_payment(
             }
         )
 
-        print(f"[DEBUG] Payment response: {payment_response}")
-        print(f"[DEBUG] Payment URL: {payment_response.get('confirmation', {}).get('confirmation_url')}")
+        logger.debug("Payment %s created with status %s", payment_response.get("id"), payment_response.get("status"))
 
         if not payment_response.get('confirmation', {}).get('confirmation_url'):
-            print("[ERROR] No confirmation URL in payment response!")
+            logger.error("No confirmation URL in payment response for order %s", order.id)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Payment URL not received from YooKassa"
@@ -257,6 +290,7 @@ async def create_payment(
         # Update order with payment ID
         order.payment_id = payment_response["id"]
         db.commit()
+        PAYMENTS_CREATED.inc()
         
         return schemas.PaymentOut(
             payment_id=payment_response["id"],
@@ -280,6 +314,7 @@ async def create_payment(
 
 
 @router.post("/webhook/payment")
+@query_budget(6)
 async def payment_webhook(
     webhook_data: dict,
     db: Session = Depends(get_db)
@@ -309,14 +344,38 @@ async def payment_webhook(
             )
         
         # Update order status based on payment status
+        slots = {}  # slot bookings for slot_index, once committed
+        refund_flagged = False
         if payment_status == "succeeded":
-            order.status = models.OrderStatus.PAID
+            if order.status == models.OrderStatus.CANCELLED and not order.stock_reserved:
+                # Paid after the reservation timed out: take the stock back if it is still there.
+                # Once flagged for a refund it is left to staff, even if the webhook is redelivered
+                restored = None if order.needs_refund else restore_reservation(db, order)
+                if restored is not None:
+                    slots = restored
+                    order.status = models.OrderStatus.PAID
+                elif not order.needs_refund:
+                    # Stays cancelled: nothing to deliver, the money has to go back
+                    logger.error("Order %s was paid after its reservation expired and is out of stock", order.id)
+                    order.needs_refund = True
+                    refund_flagged = True
+            else:
+                order.status = models.OrderStatus.PAID
         elif payment_status == "canceled":
             order.status = models.OrderStatus.CANCELLED
+            slots = release_stock(db, [order.id]).slots
         elif payment_status in ["waiting_for_capture", "processing"]:
             order.status = models.OrderStatus.PROCESSING
         
+        status_changed = db.is_modified(order)
         db.commit()
+        slot_index.record(slots)
+        if status_changed:
+            order_events.publish("order.status_changed", order_event_data(order))
+            if order.status == models.OrderStatus.PAID:
+                ORDERS_PAID.inc()
+        if refund_flagged and settings.bot_token and settings.admin_id:
+            admin_notifier.notify(settings.admin_id, format_refund_notification(order), format_refund_summary(order))
         
         return {
             "status": "ok", 
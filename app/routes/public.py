@@ -1,23 +1,57 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 
+from ..auth import authenticate, get_telegram_user_id
 from ..database import get_db
+from ..pricing import pricing_rules
+from ..querybudget import query_budget
+from ..serialization import PydanticJSONResponse, dumps, rows, select_products
 from .. import models, schemas
 from ..settings import settings
+from ..singleflight import StaleWhileRevalidate
+from ..slots import slot_index
 
 
 router = APIRouter(prefix="/api", tags=["public"])
 
 
+def _render_products(db: Session) -> bytes:
+    # Rows straight to JSON, no ORM objects or response_model pass
+    return dumps(rows(db, select_products().order_by(models.Product.created_at.desc())))
+
+
+# Every Mini App open asks for the list: serve one rendered copy per catalog
+# version, refreshed in the background so a cold or stale list never makes
+# hundreds of concurrent opens run the query at once
+product_list = StaleWhileRevalidate("products", _render_products, max_age=settings.catalog_cache_max_age)
+
+
+def _admin_wants_fresh(request: Request) -> bool:
+    """"Cache-Control: no-cache" from the admin (the admin UI right after an edit).
+
+    Browsers and WebViews send the header on every reload; from anyone else
+    it is ignored, or a stream of reloads would run the query every time.
+    """
+    if "no-cache" not in request.headers.get("cache-control", ""):
+        return False
+    try:
+        user_id = authenticate(request.headers.get("x-telegram-init-data"), request.headers.get("x-telegram-id"))
+    except HTTPException:
+        return False
+    return user_id == settings.admin_id
+
+
 @router.get("/products", response_model=List[schemas.ProductOut])
-def list_products(db: Session = Depends(get_db)):
-    products = db.query(models.Product).order_by(models.Product.created_at.desc()).all()
-    return products
+@query_budget(1)
+def list_products(request: Request, db: Session = Depends(get_db)):
+    # The admin waits for a current list; everyone else gets the cached copy
+    return PydanticJSONResponse(product_list.get(db, fresh=_admin_wants_fresh(request)))
 
 
 @router.get("/products/{product_id}", response_model=schemas.ProductOut)
+@query_budget(1)
 def get_product(product_id: int, db: Session = Depends(get_db)):
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if not product:
@@ -25,8 +59,25 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
     return product
 
 
+@router.get("/slots", response_model=List[schemas.SlotOut])
+@query_budget(1)
+def list_slots(db: Session = Depends(get_db)):
+    """Bookable delivery/pickup slots with their free capacity, soonest first."""
+    return slot_index.availability(db)
+
+
+@router.get("/delivery-zones", response_model=List[schemas.DeliveryZoneOut])
+@query_budget(1)
+def list_delivery_zones(db: Session = Depends(get_db)):
+    """Delivery zones to choose from at checkout (empty: one fee everywhere)."""
+    return pricing_rules.get(db).zones()
+
+
 @router.get("/config")
 def get_config():
-    return {"admin_id": settings.admin_id}
+    return {"admin_id": settings.admin_id, "slots_required": settings.slots_required}
 
 
+@router.get("/me")
+def get_me(telegram_user_id: int = Depends(get_telegram_user_id)):
+    return {"telegram_user_id": telegram_user_id, "is_admin": telegram_user_id == settings.admin_id}
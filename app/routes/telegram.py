@@ -0,0 +1,33 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request, status
+
+from ..telegram import (
+    WEBHOOK_PATH,
+    check_webhook_secret,
+    get_telegram_bot,
+    update_processor,
+    webhook_enabled,
+)
+
+
+router = APIRouter(tags=["telegram"])
+
+
+@router.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(
+    request: Request,
+    secret_token: Optional[str] = Header(None, alias="X-Telegram-Bot-Api-Secret-Token"),
+):
+    """Receive bot updates from Telegram (BOT_MODE=webhook)."""
+    if not webhook_enabled():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Webhook mode is disabled")
+    if not check_webhook_secret(secret_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid secret token")
+
+    from aiogram.types import Update
+
+    bot = get_telegram_bot()
+    update = Update.model_validate(await request.json(), context={"bot": bot})
+    await update_processor.submit(bot, update)
+    return {"ok": True}
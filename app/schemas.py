@@ -1,14 +1,17 @@
-from datetime import datetime
+from datetime import datetime, time
 from typing import Optional, List
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ValidationInfo, field_validator, model_validator
+
+from .money import Money, MoneyInput
 
 
 class ProductBase(BaseModel):
     title: str
     description: Optional[str] = None
-    price: float
+    price: MoneyInput
     image: Optional[str] = None
+    stock: Optional[int] = None  # None: not tracked
 
     @field_validator("title")
     @classmethod
@@ -18,6 +21,13 @@ class ProductBase(BaseModel):
             raise ValueError("title must not be empty")
         return v
 
+    @field_validator("stock")
+    @classmethod
+    def validate_stock(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 0:
+            raise ValueError("stock must not be negative")
+        return v
+
 
 class ProductCreate(ProductBase):
     pass
@@ -26,16 +36,25 @@ class ProductCreate(ProductBase):
 class ProductUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
-    price: Optional[float] = None
+    price: Optional[MoneyInput] = None
     image: Optional[str] = None
+    stock: Optional[int] = None  # units left; an explicit null stops tracking
+
+    @field_validator("stock")
+    @classmethod
+    def validate_stock(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 0:
+            raise ValueError("stock must not be negative")
+        return v
 
 
 class ProductOut(BaseModel):
     id: int
     title: str
     description: Optional[str] = None
-    price: float
+    price: Money
     image: Optional[str] = None
+    stock: Optional[int] = None
     created_at: datetime
 
     class Config:
@@ -47,6 +66,13 @@ class OrderItemCreate(BaseModel):
     product_id: int
     quantity: int
 
+    @field_validator("quantity")
+    @classmethod
+    def validate_quantity(cls, v: int) -> int:
+        if v < 1:
+            raise ValueError("quantity must be at least 1")
+        return v
+
 
 class OrderCreate(BaseModel):
     customer_name: str
@@ -55,6 +81,9 @@ class OrderCreate(BaseModel):
     delivery_type: str  # "delivery" or "pickup"
     payment_type: str  # "cash" or "online"
     comment: Optional[str] = None
+    delivery_slot: Optional[datetime] = None  # start of a slot from GET /api/slots
+    delivery_zone: Optional[str] = None  # name from GET /api/delivery-zones; None: the default fee
+    promo_code: Optional[str] = None
     items: List[OrderItemCreate]
 
     @field_validator("delivery_type")
@@ -72,11 +101,159 @@ class OrderCreate(BaseModel):
         return v
 
 
+class QuoteRequest(BaseModel):
+    delivery_type: str = "delivery"  # "delivery" or "pickup"
+    delivery_slot: Optional[datetime] = None  # time-of-day surcharges; None: now
+    delivery_zone: Optional[str] = None
+    promo_code: Optional[str] = None
+    items: List[OrderItemCreate]
+
+    @field_validator("delivery_type")
+    @classmethod
+    def validate_delivery_type(cls, v: str) -> str:
+        if v not in ["delivery", "pickup"]:
+            raise ValueError("delivery_type must be 'delivery' or 'pickup'")
+        return v
+
+
+class QuoteLineOut(BaseModel):
+    product_id: int
+    title: str
+    price: Money
+    quantity: int
+    line_total: Money
+
+
+class QuoteOut(BaseModel):
+    items: List[QuoteLineOut]
+    subtotal: Money
+    discount: Money  # promo code
+    delivery_cost: Money
+    surcharge: Money  # time-of-day surcharges
+    total_amount: Money
+    free_delivery_threshold: Optional[Money] = None  # delivery in the zone is free from this subtotal on
+
+
+def _not_negative(name: str, v: Optional[int]) -> Optional[int]:
+    if v is not None and v < 0:
+        raise ValueError(f"{name} must not be negative")
+    return v
+
+
+class DeliveryZoneRule(BaseModel):
+    name: str
+    fee: MoneyInput
+    free_from: Optional[MoneyInput] = None  # subtotal (after discount) from which delivery is free
+
+    @field_validator("fee", "free_from")
+    @classmethod
+    def validate_amount(cls, v: Optional[int], info: ValidationInfo) -> Optional[int]:
+        return _not_negative(info.field_name, v)
+
+
+class SurchargeRule(BaseModel):
+    name: str  # shown to admins only
+    starts: time  # kitchen local time of the slot (or of the order, without one)
+    ends: time  # exclusive; before starts means past midnight
+    amount: MoneyInput
+    delivery_only: bool = True
+
+    @field_validator("amount")
+    @classmethod
+    def validate_amount(cls, v: int) -> int:
+        return _not_negative("amount", v)
+
+
+class PromoCodeRule(BaseModel):
+    code: str  # matched case-insensitively
+    percent_off: float = 0  # of the subtotal
+    amount_off: MoneyInput = 0
+    free_delivery: bool = False
+    min_subtotal: MoneyInput = 0
+    valid_until: Optional[datetime] = None  # kitchen local time
+
+    @field_validator("code")
+    @classmethod
+    def validate_code(cls, v: str) -> str:
+        v = v.strip()
+        if not v:
+            raise ValueError("code must not be empty")
+        return v
+
+    @field_validator("percent_off")
+    @classmethod
+    def validate_percent_off(cls, v: float) -> float:
+        if not 0 <= v <= 100:
+            raise ValueError("percent_off must be between 0 and 100")
+        return v
+
+    @field_validator("amount_off", "min_subtotal")
+    @classmethod
+    def validate_amount(cls, v: Optional[int], info: ValidationInfo) -> Optional[int]:
+        return _not_negative(info.field_name, v)
+
+    @field_validator("valid_until")
+    @classmethod
+    def validate_valid_until(cls, v: Optional[datetime]) -> Optional[datetime]:
+        from .slots import slot_schedule  # the kitchen's UTC offset
+
+        # Stored naive, as the promo is compared with slot_schedule.now()
+        return slot_schedule.local(v) if v is not None else v
+
+
+class PricingRules(BaseModel):
+    """Delivery fees, surcharges and promo codes; edited by admins as one document."""
+    delivery_fee: MoneyInput = 50000  # kopecks; delivery without a zone, or with zones not configured
+    free_delivery_from: Optional[MoneyInput] = 150000
+    zones: List[DeliveryZoneRule] = []
+    surcharges: List[SurchargeRule] = []
+    promo_codes: List[PromoCodeRule] = []
+
+    @field_validator("delivery_fee", "free_delivery_from")
+    @classmethod
+    def validate_amount(cls, v: Optional[int], info: ValidationInfo) -> Optional[int]:
+        return _not_negative(info.field_name, v)
+
+    @model_validator(mode="after")
+    def validate_unique_names(self):
+        zones = [zone.name for zone in self.zones]
+        if len(set(zones)) != len(zones):
+            raise ValueError("zone names must be unique")
+        codes = [promo.code.upper() for promo in self.promo_codes]
+        if len(set(codes)) != len(codes):
+            raise ValueError("promo codes must be unique")
+        return self
+
+
+class DeliveryZoneOut(BaseModel):
+    name: str
+    fee: Money
+    free_from: Optional[Money] = None
+
+
+class SlotOut(BaseModel):
+    starts_at: datetime  # kitchen local time; send back as delivery_slot
+    ends_at: datetime
+    capacity: int
+    available: int
+
+
+class SlotCapacityUpdate(BaseModel):
+    capacity: Optional[int] = None  # None: back to SLOT_CAPACITY; 0 closes the slot
+
+    @field_validator("capacity")
+    @classmethod
+    def validate_capacity(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 0:
+            raise ValueError("capacity must not be negative")
+        return v
+
+
 class OrderItemOut(BaseModel):
     id: int
     product_id: int
     product_name: str
-    product_price: float
+    product_price: Money
     quantity: int
 
     class Config:
@@ -92,11 +269,17 @@ class OrderOut(BaseModel):
     delivery_type: str
     payment_type: str
     comment: Optional[str] = None
-    subtotal: float
-    delivery_cost: float
-    total_amount: float
+    subtotal: Money
+    discount: Money = 0
+    delivery_cost: Money
+    surcharge: Money = 0
+    total_amount: Money
+    promo_code: Optional[str] = None
+    delivery_zone: Optional[str] = None
     status: str
+    needs_refund: bool = False
     payment_id: Optional[str] = None
+    delivery_slot: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
     items: List[OrderItemOut]
@@ -105,6 +288,81 @@ class OrderOut(BaseModel):
         from_attributes = True
 
 
+class AdminOrderPage(BaseModel):
+    items: List[OrderOut]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= to get the next page
+
+
+class OrderTotals(BaseModel):
+    status: str
+    orders: int
+    subtotal: Money
+    discount: Money
+    delivery_cost: Money
+    surcharge: Money
+    total_amount: Money
+
+
+ORDER_STATUSES = ["pending", "paid", "processing", "completed", "cancelled"]
+
+
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: List[int]
+    status: str
+
+    @field_validator("order_ids")
+    @classmethod
+    def validate_order_ids(cls, v: List[int]) -> List[int]:
+        if not v:
+            raise ValueError("order_ids must not be empty")
+        if len(v) > 500:
+            raise ValueError("at most 500 orders can be updated at once")
+        return list(dict.fromkeys(v))
+
+    @field_validator("status")
+    @classmethod
+    def validate_status(cls, v: str) -> str:
+        if v not in ORDER_STATUSES:
+            raise ValueError(f"status must be one of {ORDER_STATUSES}")
+        return v
+
+
+class OrderStatusBulkResult(BaseModel):
+    status: str
+    updated: List[int]  # orders moved to the new status
+    skipped: List[int]  # missing orders or transition not allowed from their current status
+
+
+class BroadcastCreate(BaseModel):
+    text: str  # HTML, sent with parse_mode="HTML"
+
+    @field_validator("text")
+    @classmethod
+    def validate_text(cls, v: str) -> str:
+        v = v.strip()
+        if not v:
+            raise ValueError("text must not be empty")
+        if len(v) > 4096:
+            raise ValueError("text must be at most 4096 characters")
+        return v
+
+
+class BroadcastOut(BaseModel):
+    id: int
+    text: str
+    status: str
+    total: int
+    sent: int
+    failed: int
+    blocked: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class PaymentCreate(BaseModel):
     order_id: int
     payment_method: str = "card"  # for future expansion
@@ -114,6 +372,6 @@ class PaymentOut(BaseModel):
     payment_id: str
     payment_url: Optional[str] = None
     status: str
-    amount: float
+    amount: Money
 
 
@@ -0,0 +1,106 @@
+import json
+from collections import defaultdict
+from datetime import date, datetime
+from typing import List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import Float, select, type_coerce
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .money import KOPECKS_PER_RUBLE, Kopecks
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data) -> bytes:
+    """JSON bytes for plain dicts/lists (datetimes and str enums included)."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed.
+
+    Returning it from a route bypasses response_model validation, so the
+    content must already have the response schema's shape.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class PydanticJSONResponse(JSONResponse):
+    """Content already serialized to JSON bytes (model_json, cached bodies)."""
+
+    def render(self, content: bytes) -> bytes:
+        return content
+
+
+# Precompiled validators/serializers for the hot response schemas. FastAPI's
+# default path validates into the model, dumps it to Python objects and then
+# runs json.dumps; dump_json goes from the model to bytes in one step.
+ORDER_OUT = TypeAdapter(schemas.OrderOut)
+ADMIN_ORDER_PAGE = TypeAdapter(schemas.AdminOrderPage)
+
+
+def model_json(adapter: TypeAdapter, value) -> bytes:
+    """Validate ``value`` (ORM objects allowed) and serialize it straight to JSON bytes."""
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+
+def _json_column(column):
+    """Money columns converted to rubles by SQLite, the way the schemas serialize them."""
+    if isinstance(column.type, Kopecks):
+        return type_coerce(column / float(KOPECKS_PER_RUBLE), Float).label(column.key)
+    return column
+
+
+# Read-only queries select exactly the response schema's columns and skip
+# ORM objects entirely: rows become dicts that match the JSON of
+# ProductOut/OrderOut (money in rubles), ready for FastJSONResponse.
+PRODUCT_COLUMNS = [_json_column(getattr(models.Product, name)) for name in schemas.ProductOut.model_fields]
+ORDER_COLUMNS = [_json_column(getattr(models.Order, name)) for name in schemas.OrderOut.model_fields if name != "items"]
+ORDER_ITEM_COLUMNS = [_json_column(getattr(models.OrderItem, name)) for name in schemas.OrderItemOut.model_fields]
+
+
+def select_products():
+    return select(*PRODUCT_COLUMNS)
+
+
+def select_orders():
+    return select(*ORDER_COLUMNS)
+
+
+def rows(db: Session, statement) -> List[dict]:
+    return [dict(row) for row in db.execute(statement).mappings()]
+
+
+def orders_with_items(db: Session, statement) -> List[dict]:
+    """Orders selected by ``statement`` (built on select_orders()) with their items, in two queries."""
+    orders = rows(db, statement)
+    if not orders:
+        return orders
+    items = defaultdict(list)
+    item_rows = db.execute(
+        select(models.OrderItem.order_id, *ORDER_ITEM_COLUMNS)
+        .where(models.OrderItem.order_id.in_([order["id"] for order in orders]))
+        .order_by(models.OrderItem.id)
+    ).mappings()
+    for row in item_rows:
+        item = dict(row)
+        items[item.pop("order_id")].append(item)
+    for order in orders:
+        order["items"] = items[order["id"]]
+    return orders
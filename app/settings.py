@@ -41,10 +41,136 @@ class AppSettings(BaseModel):
     yookassa_shop_id: str = os.getenv("YOOKASSA_SHOP_ID", "")
     yookassa_secret_key: str = os.getenv("YOOKASSA_SECRET_KEY", "")
     yookassa_webhook_url: str = os.getenv("YOOKASSA_WEBHOOK_URL", "")
+    yookassa_api_url: str = os.getenv("YOOKASSA_API_URL", "")  # custom/fake API server
     
+    # Mini App auth: signed initData older than AUTH_MAX_AGE seconds is rejected.
+    # The raw X-Telegram-Id header is only trusted when explicitly allowed (or
+    # without BOT_TOKEN, where nothing can be verified).
+    auth_max_age: int = int(os.getenv("AUTH_MAX_AGE", "86400"))
+    auth_cache_size: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    auth_cache_ttl: float = float(os.getenv("AUTH_CACHE_TTL", "3600"))
+    auth_allow_telegram_id_header: bool = os.getenv("AUTH_ALLOW_TELEGRAM_ID_HEADER", "0").lower() in ("1", "true", "yes")
+
+    # Mini App URL opened by the bot's buttons
+    web_app_url: str = os.getenv("WEB_APP_URL", "http://localhost:8000")
+
+    # Telegram bot: "polling" runs bot.py as a separate process, "webhook" serves
+    # updates from the API process at /telegram/webhook
+    bot_mode: str = os.getenv("BOT_MODE", "polling").strip().lower()
+    bot_webhook_url: str = os.getenv("BOT_WEBHOOK_URL", "")  # defaults to WEB_APP_URL + /telegram/webhook
+    bot_webhook_secret: str = os.getenv("BOT_WEBHOOK_SECRET", "")
+    bot_webhook_concurrency: int = int(os.getenv("BOT_WEBHOOK_CONCURRENCY", "16"))
+    telegram_api_url: str = os.getenv("TELEGRAM_API_URL", "")  # custom/fake Bot API server
+
+    # /menu command: products per page and how long a rendered menu may be reused
+    menu_page_size: int = int(os.getenv("MENU_PAGE_SIZE", "8"))
+    menu_cache_ttl: float = float(os.getenv("MENU_CACHE_TTL", "60"))
+
+    # Rate limiting of expensive endpoints: "requests/seconds" per Telegram user
+    # and per client IP, plus in-flight caps per worker (0 disables a limit).
+    # RATE_LIMIT_BACKEND=redis shares the counters between workers.
+    rate_limit_enabled: bool = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+    rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+    rate_limit_redis_url: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    rate_limit_orders_user: str = os.getenv("RATE_LIMIT_ORDERS_USER", "5/60")
+    rate_limit_orders_ip: str = os.getenv("RATE_LIMIT_ORDERS_IP", "30/60")
+    rate_limit_payments_user: str = os.getenv("RATE_LIMIT_PAYMENTS_USER", "10/60")
+    rate_limit_payments_ip: str = os.getenv("RATE_LIMIT_PAYMENTS_IP", "60/60")
+    orders_max_concurrency: int = int(os.getenv("ORDERS_MAX_CONCURRENCY", "8"))
+    payments_max_concurrency: int = int(os.getenv("PAYMENTS_MAX_CONCURRENCY", "8"))
+
+    # Shared cache and pub/sub: "memory" (per process) or "redis" (any server
+    # speaking the Redis protocol). With "redis", admin catalog changes reach
+    # every worker and bot.py within milliseconds instead of only the one
+    # that handled the write.
+    cache_backend: str = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+    cache_redis_url: str = os.getenv("CACHE_REDIS_URL", os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    cache_timeout: float = float(os.getenv("CACHE_TIMEOUT", "1.0"))
+
+    # Logging: JSON lines (or "text") on stdout, written by a background thread.
+    # DEBUG output is kept for this fraction of requests only.
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_format: str = os.getenv("LOG_FORMAT", "json").strip().lower()
+    log_debug_sample_rate: float = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+    # SQL per request (development and checks): SQL_BUDGET_MODE "warn" logs and
+    # "raise" fails requests over their @query_budget or repeating one statement
+    # SQL_N_PLUS_ONE_THRESHOLD times; SQL_DEBUG_HEADER adds X-SQL-Queries.
+    sql_budget_mode: str = os.getenv("SQL_BUDGET_MODE", "off").strip().lower()
+    sql_n_plus_one_threshold: int = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "3"))
+    sql_debug_header: bool = os.getenv("SQL_DEBUG_HEADER", "0").lower() in ("1", "true", "yes")
+
+    # /metrics: when set, scrapers must send "Authorization: Bearer <token>"
+    metrics_token: str = os.getenv("METRICS_TOKEN", "")
+
+    # Admin order notifications: orders arriving within this many seconds of the
+    # last message are sent together as one digest
+    admin_notify_window: float = float(os.getenv("ADMIN_NOTIFY_WINDOW", "10"))
+    admin_notify_digest_lines: int = int(os.getenv("ADMIN_NOTIFY_DIGEST_LINES", "30"))
+
+    # Broadcasts: Telegram allows ~30 messages/s per bot, stay a bit below it
+    broadcast_rate: float = float(os.getenv("BROADCAST_RATE", "25"))
+    broadcast_concurrency: int = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+    broadcast_max_attempts: int = int(os.getenv("BROADCAST_MAX_ATTEMPTS", "3"))
+
+    # Stock: unpaid online orders give their reserved stock back after this many
+    # seconds; the sweeper checks every STOCK_SWEEP_INTERVAL seconds (0 disables)
+    stock_reservation_timeout: float = float(os.getenv("STOCK_RESERVATION_TIMEOUT", "3600"))
+    stock_sweep_interval: float = float(os.getenv("STOCK_SWEEP_INTERVAL", "60"))
+
+    # Delivery/pickup time slots in the kitchen's local time (UTC+SLOT_UTC_OFFSET
+    # hours): SLOT_HOURS cut into SLOT_MINUTES slots of SLOT_CAPACITY orders each
+    # (admins can override single slots), bookable SLOT_DAYS_AHEAD days ahead and
+    # at least SLOT_LEAD_MINUTES in advance. SLOTS_REQUIRED makes choosing one
+    # mandatory. Bookings made by other workers show up in the availability
+    # index within SLOT_INDEX_MAX_AGE seconds (reservation itself is exact).
+    slot_hours: str = os.getenv("SLOT_HOURS", "10:00-22:00")
+    slot_minutes: int = int(os.getenv("SLOT_MINUTES", "60"))
+    slot_capacity: int = int(os.getenv("SLOT_CAPACITY", "10"))
+    slot_days_ahead: int = int(os.getenv("SLOT_DAYS_AHEAD", "14"))
+    slot_lead_minutes: int = int(os.getenv("SLOT_LEAD_MINUTES", "60"))
+    slot_utc_offset: float = float(os.getenv("SLOT_UTC_OFFSET", "3"))
+    slots_required: bool = os.getenv("SLOTS_REQUIRED", "0").lower() in ("1", "true", "yes")
+    slot_index_max_age: float = float(os.getenv("SLOT_INDEX_MAX_AGE", "10"))
+
+    # SQLite maintenance, run by one worker at a time. Online backups (SQLite
+    # backup API, BACKUP_PAGES_PER_STEP pages per step with BACKUP_STEP_PAUSE
+    # seconds in between) go to BACKUP_DIR (default: backups/ next to the
+    # database) every BACKUP_INTERVAL seconds, the newest BACKUP_KEEP are kept.
+    # ANALYZE/optimize, incremental vacuum and the integrity check run once a day
+    # inside MAINTENANCE_WINDOW (UTC, "HH:MM-HH:MM"). A task waits while this
+    # worker handles more than MAINTENANCE_MAX_IN_FLIGHT requests.
+    maintenance_enabled: bool = os.getenv("MAINTENANCE_ENABLED", "1").lower() in ("1", "true", "yes")
+    maintenance_check_interval: float = float(os.getenv("MAINTENANCE_CHECK_INTERVAL", "60"))
+    maintenance_window: str = os.getenv("MAINTENANCE_WINDOW", "00:00-03:00")
+    maintenance_max_in_flight: int = int(os.getenv("MAINTENANCE_MAX_IN_FLIGHT", "4"))
+    backup_dir: str = os.getenv("BACKUP_DIR", "")
+    backup_interval: float = float(os.getenv("BACKUP_INTERVAL", "21600"))
+    backup_keep: int = int(os.getenv("BACKUP_KEEP", "8"))
+    backup_pages_per_step: int = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+    backup_step_pause: float = float(os.getenv("BACKUP_STEP_PAUSE", "0.01"))
+    vacuum_pages_per_run: int = int(os.getenv("VACUUM_PAGES_PER_RUN", "2000"))
+
     # Payment settings
     payment_success_url: str = os.getenv("PAYMENT_SUCCESS_URL", "https://t.me/your_bot")
     payment_cancel_url: str = os.getenv("PAYMENT_CANCEL_URL", "https://t.me/your_bot")
 
+    # Index page: how many products to inline into the pre-rendered HTML
+    index_inline_products: int = int(os.getenv("INDEX_INLINE_PRODUCTS", "100"))
+
+    # Cached catalog reads (product list, index page) are rebuilt in the
+    # background after a catalog change or once older than this many seconds;
+    # readers get the previous copy meanwhile. Bounds how stale shown stock is.
+    catalog_cache_max_age: float = float(os.getenv("CATALOG_CACHE_MAX_AGE", "5"))
+    # Pricing rules and quote prices kept in memory per worker are reloaded
+    # after a catalog change or once older than this many seconds. With
+    # CACHE_BACKEND=memory, the bound on how long another worker keeps charging
+    # old fees, accepting a deleted promo code or quoting an old price.
+    pricing_cache_max_age: float = float(os.getenv("PRICING_CACHE_MAX_AGE", "5"))
+
+    # Live admin order feed: events kept for resume, and per-subscriber queue bound
+    order_events_history: int = int(os.getenv("ORDER_EVENTS_HISTORY", "1000"))
+    order_events_queue_size: int = int(os.getenv("ORDER_EVENTS_QUEUE_SIZE", "256"))
+
 
 settings = AppSettings()
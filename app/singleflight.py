@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from sqlalchemy.orm import Session
+
+from . import catalog
+from .database import SessionLocal
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Concurrent callers asking for the same key share one computation.
+
+    For sync code (routes in the threadpool, worker threads): the first caller
+    runs the function, the others block until it finishes and get its result
+    or its exception. Nothing is kept once the call has completed.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """Returns (value, shared); shared is True if another caller computed it."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+
+class StaleWhileRevalidate(Generic[T]):
+    """A value derived from the database (a listing, a rendered page), rebuilt
+    when ``key()`` changes (by default the catalog version) or when it is older
+    than ``max_age`` seconds (0: never by age).
+
+    A stale value is returned at once while a single background thread builds
+    the new one, so readers never wait for a refresh. Only a cold cache (or a
+    caller asking for ``fresh``) waits, and concurrent waiters share one build.
+    """
+
+    def __init__(self, name: str, load: Callable[[Session], T], max_age: float = 0,
+                 key: Callable[[], Hashable] = catalog.current_version):
+        self.name = name
+        self.load = load
+        self.max_age = max_age
+        self._key = key
+        self._entry: Optional[Tuple[Hashable, float, T]] = None  # (key, built at, value)
+        self._flight = SingleFlight()
+        self._refreshing = threading.Lock()
+
+    def get(self, db: Session, fresh: bool = False) -> T:
+        key = self._key()
+        entry = self._entry
+        if entry is None or fresh:
+            value, shared = self._flight.do(key, lambda: self._build(key, db))
+            CACHE_LOOKUPS.labels(self.name, "coalesced" if shared else "miss").inc()
+            return value
+        if entry[0] == key and (not self.max_age or time.monotonic() - entry[1] < self.max_age):
+            CACHE_LOOKUPS.labels(self.name, "fresh").inc()
+        else:
+            CACHE_LOOKUPS.labels(self.name, "stale").inc()
+            self._revalidate(key)
+        return entry[2]
+
+    def peek(self) -> Optional[T]:
+        """The cached value as it is, without building or refreshing it."""
+        entry = self._entry
+        return None if entry is None else entry[2]
+
+    def _build(self, key: Hashable, db: Session) -> T:
+        built_at = time.monotonic()
+        value = self.load(db)
+        self._entry = (key, built_at, value)
+        return value
+
+    def _revalidate(self, key: Hashable) -> None:
+        # One refresh at a time; readers arriving meanwhile keep the stale value
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._refresh, args=(key,), name=f"refresh-{self.name}", daemon=True).start()
+        except BaseException:
+            self._refreshing.release()
+            raise
+
+    def _refresh(self, key: Hashable) -> None:
+        db = SessionLocal()
+        try:
+            self._build(key, db)
+        except Exception:
+            logger.exception("Refreshing %s failed; serving the stale value", self.name)
+        finally:
+            db.close()
+            self._refreshing.release()
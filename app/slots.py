@@ -0,0 +1,201 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .settings import settings
+from .singleflight import StaleWhileRevalidate
+
+
+class SlotUnavailable(ValueError):
+    """The requested slot is not on the schedule or can no longer be booked."""
+
+
+def _parse_hours(value: str):
+    opens, closes = (time.fromisoformat(part.strip()) for part in value.split("-", 1))
+    return opens, closes
+
+
+class SlotSchedule:
+    """The daily grid of slots, in the kitchen's local time (naive datetimes)."""
+
+    def __init__(self, hours: str, minutes: int, days_ahead: int, lead_minutes: int, utc_offset: float):
+        self.opens, self.closes = _parse_hours(hours)
+        self.length = timedelta(minutes=minutes)
+        self.days_ahead = days_ahead
+        self.lead = timedelta(minutes=lead_minutes)
+        self.offset = timedelta(hours=utc_offset)
+
+    def now(self) -> datetime:
+        return datetime.utcnow() + self.offset
+
+    def local(self, value: datetime) -> datetime:
+        """Naive kitchen time; aware datetimes from clients are converted."""
+        if value.tzinfo is None:
+            return value
+        return value.astimezone(timezone(self.offset)).replace(tzinfo=None)
+
+    def starts(self, day: date) -> List[datetime]:
+        start = datetime.combine(day, self.opens)
+        end = datetime.combine(day, self.closes)
+        slots = []
+        while start + self.length <= end:
+            slots.append(start)
+            start += self.length
+        return slots
+
+    def on_grid(self, starts_at: datetime) -> bool:
+        offset = starts_at - datetime.combine(starts_at.date(), self.opens)
+        return (
+            offset >= timedelta(0)
+            and offset % self.length == timedelta(0)
+            and starts_at + self.length <= datetime.combine(starts_at.date(), self.closes)
+        )
+
+    def upcoming(self, now: Optional[datetime] = None) -> List[datetime]:
+        """Slots that can be booked now, soonest first."""
+        now = now or self.now()
+        earliest = now + self.lead
+        return [
+            starts_at
+            for days in range(self.days_ahead)
+            for starts_at in self.starts(now.date() + timedelta(days=days))
+            if starts_at >= earliest
+        ]
+
+    def check(self, starts_at: datetime, now: Optional[datetime] = None) -> datetime:
+        """``starts_at`` in kitchen time if it is a bookable slot, else SlotUnavailable."""
+        starts_at = self.local(starts_at)
+        now = now or self.now()
+        if not self.on_grid(starts_at):
+            raise SlotUnavailable("Unknown delivery slot")
+        if starts_at < now + self.lead or starts_at.date() >= now.date() + timedelta(days=self.days_ahead):
+            raise SlotUnavailable("Delivery slot can no longer be booked")
+        return starts_at
+
+
+class SlotBookings(NamedTuple):
+    booked: int
+    capacity: Optional[int]  # override; None: SLOT_CAPACITY
+
+
+NO_BOOKINGS = SlotBookings(0, None)
+
+
+def _capacity(bookings: SlotBookings) -> int:
+    return settings.slot_capacity if bookings.capacity is None else bookings.capacity
+
+
+def slot_out(starts_at: datetime, bookings: SlotBookings) -> dict:
+    """SlotOut fields for one slot."""
+    capacity = _capacity(bookings)
+    return {
+        "starts_at": starts_at,
+        "ends_at": starts_at + slot_schedule.length,
+        "capacity": capacity,
+        "available": max(0, capacity - bookings.booked),
+    }
+
+
+class SlotIndex:
+    """Bookings of every slot from today on, in a dict keyed by slot start.
+
+    Availability is one dict lookup per slot however many future slots have
+    bookings. This worker's bookings and cancellations update it once they
+    are committed (with the counts the database returned); the whole index is
+    reloaded in the background every SLOT_INDEX_MAX_AGE seconds, and at
+    midnight, to pick up the other workers'. Only for display: reserve_slot
+    decides in the database.
+    """
+
+    def __init__(self, schedule: SlotSchedule, max_age: float):
+        self.schedule = schedule
+        self._cache = StaleWhileRevalidate("slots", self._load, max_age=max_age, key=self._today)
+
+    def _today(self) -> date:
+        return self.schedule.now().date()
+
+    def _load(self, db: Session) -> Dict[datetime, SlotBookings]:
+        since = datetime.combine(self._today(), time.min)
+        slot = models.DeliverySlot
+        statement = select(slot.starts_at, slot.booked, slot.capacity).where(slot.starts_at >= since)
+        return {row.starts_at: SlotBookings(row.booked, row.capacity) for row in db.execute(statement)}
+
+    def record(self, changes: Dict[datetime, SlotBookings]) -> None:
+        """Committed bookings of some slots. Call after db.commit(): a rolled
+        back booking must not show up until the next reload."""
+        bookings = self._cache.peek()
+        if bookings is not None:
+            bookings.update(changes)
+
+    def availability(self, db: Session, now: Optional[datetime] = None) -> List[dict]:
+        bookings = self._cache.get(db)
+        return [
+            slot_out(starts_at, bookings.get(starts_at, NO_BOOKINGS))
+            for starts_at in self.schedule.upcoming(now)
+        ]
+
+
+def reserve_slot(db: Session, starts_at: datetime, force: bool = False) -> Optional[SlotBookings]:
+    """Book one order into the slot in a single upsert.
+
+    The increment is conditional on free capacity, so concurrent checkouts
+    (other workers included) can never overbook. Returns None if the slot
+    is full; then the caller rolls back. Otherwise the caller commits and
+    passes the returned bookings to slot_index.record(). ``force`` books
+    regardless (an order paid after its reservation expired).
+    """
+    slot = models.DeliverySlot
+    statement = insert(slot).values(starts_at=starts_at, booked=1).on_conflict_do_update(
+        index_elements=[slot.starts_at],
+        set_={"booked": slot.booked + 1},
+        where=None if force else slot.booked < func.coalesce(slot.capacity, settings.slot_capacity),
+    ).returning(slot.booked, slot.capacity)
+    row = db.execute(statement).first()
+    if row is None:
+        return None
+    bookings = SlotBookings(row.booked, row.capacity)
+    if not force and bookings.booked > _capacity(bookings):
+        return None  # first booking of a slot with no capacity
+    return bookings
+
+
+def release_slots(db: Session, slots: Dict[datetime, int]) -> Dict[datetime, SlotBookings]:
+    """Give back ``count`` bookings per slot start. The caller commits, then
+    passes the returned bookings to slot_index.record()."""
+    if not slots:
+        return {}
+    slot = models.DeliverySlot
+    returned = case(slots, value=slot.starts_at)
+    result = db.execute(
+        update(slot)
+        .where(slot.starts_at.in_(slots))
+        .values(booked=func.max(slot.booked - returned, 0))
+        .returning(slot.starts_at, slot.booked, slot.capacity)
+        .execution_options(synchronize_session=False)
+    )
+    return {row.starts_at: SlotBookings(row.booked, row.capacity) for row in result}
+
+
+def set_capacity(db: Session, starts_at: datetime, capacity: Optional[int]) -> SlotBookings:
+    """Override one slot's capacity (None: back to SLOT_CAPACITY). The caller
+    commits, then records the returned bookings in slot_index.
+
+    Orders already booked keep their slot even if it is now over capacity.
+    """
+    slot = models.DeliverySlot
+    statement = insert(slot).values(starts_at=starts_at, capacity=capacity, booked=0).on_conflict_do_update(
+        index_elements=[slot.starts_at], set_={"capacity": capacity},
+    ).returning(slot.booked, slot.capacity)
+    row = db.execute(statement).one()
+    return SlotBookings(row.booked, row.capacity)
+
+
+slot_schedule = SlotSchedule(
+    settings.slot_hours, settings.slot_minutes, settings.slot_days_ahead,
+    settings.slot_lead_minutes, settings.slot_utc_offset,
+)
+slot_index = SlotIndex(slot_schedule, settings.slot_index_max_age)
@@ -0,0 +1,122 @@
+import asyncio
+import hmac
+import logging
+from typing import TYPE_CHECKING, Optional, Set
+
+from .metrics import telegram_request_middleware
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from aiogram import Bot, Dispatcher
+
+
+WEBHOOK_PATH = "/telegram/webhook"
+
+# aiogram is heavy to import (well over a second on a cold start), so the Bot is
+# created on first use instead of at import time, and only if a token is set.
+_bot = None
+_dispatcher = None
+
+
+def get_telegram_bot() -> Optional["Bot"]:
+    """Shared aiogram Bot (one HTTP session per process), or None without BOT_TOKEN."""
+    global _bot
+    if _bot is None and settings.bot_token:
+        from aiogram import Bot
+
+        session = None
+        if settings.telegram_api_url:
+            from aiogram.client.session.aiohttp import AiohttpSession
+            from aiogram.client.telegram import TelegramAPIServer
+
+            session = AiohttpSession(api=TelegramAPIServer.from_base(settings.telegram_api_url))
+        _bot = Bot(token=settings.bot_token, session=session)
+        _bot.session.middleware(telegram_request_middleware)  # latency/errors per API method
+    return _bot
+
+
+def get_dispatcher() -> "Dispatcher":
+    """Dispatcher with the bot's command handlers, for webhook mode."""
+    global _dispatcher
+    if _dispatcher is None:
+        from aiogram import Dispatcher
+
+        from .bot_handlers import router
+
+        _dispatcher = Dispatcher()
+        _dispatcher.include_router(router)
+    return _dispatcher
+
+
+def webhook_enabled() -> bool:
+    return settings.bot_mode == "webhook" and bool(settings.bot_token)
+
+
+def webhook_url() -> str:
+    return settings.bot_webhook_url or settings.web_app_url.rstrip("/") + WEBHOOK_PATH
+
+
+def check_webhook_secret(token: Optional[str]) -> bool:
+    if not settings.bot_webhook_secret:
+        return True
+    return token is not None and hmac.compare_digest(token, settings.bot_webhook_secret)
+
+
+class UpdateProcessor:
+    """Handles webhook updates concurrently, at most ``concurrency`` at a time.
+
+    submit() returns as soon as the update is scheduled, so Telegram gets its
+    200 quickly. When every slot is busy, submit() waits for one to free up,
+    which pushes back on Telegram instead of piling up tasks.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, bot: "Bot", update) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, bot: "Bot", update) -> None:
+        try:
+            await get_dispatcher().feed_update(bot, update)
+        except Exception:
+            logger.exception("Failed to handle Telegram update %s", update.update_id)
+        finally:
+            self._semaphore.release()
+
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+update_processor = UpdateProcessor(settings.bot_webhook_concurrency)
+
+
+async def start_webhook() -> None:
+    """Register the webhook with Telegram (idempotent, safe to call from every worker)."""
+    bot = get_telegram_bot()
+    dispatcher = get_dispatcher()
+    await bot.set_webhook(
+        url=webhook_url(),
+        secret_token=settings.bot_webhook_secret or None,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+        max_connections=settings.bot_webhook_concurrency,
+    )
+    logger.info("Telegram webhook set to %s", webhook_url())
+
+
+async def close_telegram_bot() -> None:
+    global _bot
+    await update_processor.drain()
+    if _bot is not None:
+        await _bot.session.close()
+        _bot = None
@@ -1,13 +1,17 @@
 import base64
 import json
+import logging
 import uuid
 from typing import Dict, Any
 
-import httpx
 from fastapi import HTTPException, status
 
+from .metrics import track_external
+from .money import format_rubles
 from .settings import settings
 
+logger = logging.getLogger(__name__)
+
 
 class YooKassaClient:
     """YooKassa API client for payment processing."""
@@ -17,13 +21,10 @@ class YooKassaClient:
     def __init__(self):
         self.shop_id = settings.yookassa_shop_id
         self.secret_key = settings.yookassa_secret_key
-
-        print(f"[DEBUG] YooKassa shop_id: {self.shop_id}")
-        print(f"[DEBUG] YooKassa secret_key: {'*' * len(self.secret_key) if self.secret_key else 'None'}")
-        print(f"[DEBUG] YooKassa client initialized successfully")
+        self.base_url = (settings.yookassa_api_url or self.BASE_URL).rstrip("/")
 
         if not self.shop_id or not self.secret_key:
-            print("[ERROR] YooKassa credentials not configured - shop_id or secret_key is empty")
+            logger.error("YooKassa credentials not configured - shop_id or secret_key is empty")
             raise ValueError("YooKassa credentials not configured")
         
         # Create basic auth header
@@ -33,10 +34,11 @@ class YooKassaClient:
             "Authorization": f"Basic {encoded_credentials}",
             "Content-Type": "application/json"
         }
+        logger.debug("YooKassa client initialized", extra={"shop_id": self.shop_id})
     
     async def create_payment(
         self,
-        amount: float,
+        amount: int,  # kopecks
         currency: str = "RUB",
         description: str = "Order payment",
         return_url: str = None,
@@ -49,7 +51,7 @@ class YooKassaClient:
         
         payment_data = {
             "amount": {
-                "value": f"{amount:.2f}",
+                "value": format_rubles(amount),
                 "currency": currency
             },
             "confirmation": {
@@ -65,14 +67,17 @@ class YooKassaClient:
         request_headers = self.headers.copy()
         request_headers["Idempotence-Key"] = str(uuid.uuid4())
 
+        import httpx  # imported lazily to keep app startup fast
+
         async with httpx.AsyncClient() as client:
             try:
-                response = await client.post(
-                    f"{self.BASE_URL}/payments", headers=request_headers,
-                    json=payment_data,
-                    timeout=30.0
-                )
-                response.raise_for_status()
+                async with track_external("yookassa", "create_payment"):
+                    response = await client.post(
+                        f"{self.base_url}/payments", headers=request_headers,
+                        json=payment_data,
+                        timeout=30.0
+                    )
+                    response.raise_for_status()
                 return response.json()
             except httpx.HTTPStatusError as e:
                 error_detail = f"YooKassa API error: {e.response.status_code}"
@@ -94,14 +99,17 @@ class YooKassaClient:
     async def get_payment(self, payment_id: str) -> Dict[str, Any]:
         """Get payment status from YooKassa."""
         
+        import httpx
+
         async with httpx.AsyncClient() as client:
             try:
-                response = await client.get(
-                    f"{self.BASE_URL}/payments/{payment_id}",
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
+                async with track_external("yookassa", "get_payment"):
+                    response = await client.get(
+                        f"{self.base_url}/payments/{payment_id}",
+                        headers=self.headers,
+                        timeout=30.0
+                    )
+                    response.raise_for_status()
                 return response.json()
             except httpx.HTTPStatusError as e:
                 raise HTTPException(
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of per-request Mini App authentication overhead.
+
+Signs a realistic initData with a test bot token and times:
+  - full verification (parse + HMAC-SHA256 + JSON), as on a cache miss
+  - InitDataCache hit, as on every further request of the same session
+  - a request through the FastAPI dependency (GET /api/me, TestClient)
+
+    python benchmarks/auth.py --iterations 20000
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import timeit
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+BOT_TOKEN = "123456:BENCHMARK-TOKEN"
+
+
+def sign_init_data(bot_token: str, user_id: int, auth_date: int) -> str:
+    fields = {
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": json.dumps({
+            "id": user_id, "first_name": "Bench", "last_name": "User",
+            "username": "bench_user", "language_code": "ru", "allows_write_to_pm": True,
+        }, separators=(",", ":")),
+        "auth_date": str(auth_date),
+    }
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def per_call_us(func, iterations: int) -> float:
+    return min(timeit.repeat(func, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ["BOT_TOKEN"] = BOT_TOKEN
+    from app.auth import InitDataCache, InitDataError, verify_init_data
+
+    init_data = sign_init_data(BOT_TOKEN, 777, int(time.time()))
+    forged = init_data.replace("777", "778", 1)
+    assert verify_init_data(init_data, BOT_TOKEN, 86400).id == 777
+    try:
+        verify_init_data(forged, BOT_TOKEN, 86400)
+        raise AssertionError("forged initData accepted")
+    except InitDataError:
+        pass
+
+    cache = InitDataCache(maxsize=10000, ttl=3600)
+    cache.verify(init_data, BOT_TOKEN, 86400)
+
+    full = per_call_us(lambda: verify_init_data(init_data, BOT_TOKEN, 86400), args.iterations)
+    hit = per_call_us(lambda: cache.verify(init_data, BOT_TOKEN, 86400), args.iterations)
+    print(f"verify (cache miss): {full:7.2f} us/call")
+    print(f"cache hit:           {hit:7.2f} us/call  ({full / hit:.1f}x faster)")
+
+    from fastapi.testclient import TestClient
+
+    import main as app_main
+
+    with TestClient(app_main.app) as client:
+        headers = {"X-Telegram-Init-Data": init_data}
+        assert client.get("/api/me", headers=headers).json()["telegram_user_id"] == 777
+        assert client.get("/api/me", headers={"X-Telegram-Init-Data": forged}).status_code == 401
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            client.get("/api/me", headers=headers)
+        authed = (time.perf_counter() - started) / args.requests * 1e6
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            client.get("/health")
+        baseline = (time.perf_counter() - started) / args.requests * 1e6
+    print(f"GET /api/me:         {authed:7.1f} us/request (GET /health: {baseline:.1f} us)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Broadcast throughput benchmark against the fake Telegram Bot API.
+
+Seeds a temporary SQLite database with N customers, starts
+benchmarks/fake_telegram.py in-process with Telegram-like flood limits and
+sends one broadcast through app.broadcast. Reports requests/s, how many 429s
+the fake server returned and the final recipient counters.
+
+    python benchmarks/broadcast.py --recipients 500 --global-rate 30 --rate 25
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _seed(session_factory, recipients: int) -> None:
+    from sqlalchemy import insert
+
+    from app import models
+
+    now = datetime.utcnow()
+    db = session_factory()
+    try:
+        db.execute(insert(models.Order), [
+            {
+                "telegram_user_id": 1_000_000 + i,
+                "customer_name": f"Customer {i}",
+                "customer_phone": "+70000000000",
+                "delivery_type": models.DeliveryType.PICKUP,
+                "payment_type": models.PaymentType.CASH,
+                "subtotal": 10000,
+                "delivery_cost": 0,
+                "total_amount": 10000,
+                "status": models.OrderStatus.COMPLETED,
+                "created_at": now,
+                "updated_at": now,
+            }
+            # Every customer has two orders: recipients must still be distinct
+            for i in list(range(recipients)) * 2
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run(args) -> int:
+    import uvicorn
+    from sqlalchemy import create_engine
+
+    from fake_telegram import FakeTelegram, create_app
+
+    port = _free_port()
+    os.environ["BOT_TOKEN"] = "123456:BENCH"
+    os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["BROADCAST_RATE"] = str(args.rate)
+    os.environ["BROADCAST_CONCURRENCY"] = str(args.concurrency)
+
+    from app import broadcast, database, models
+
+    db_dir = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{db_dir}/bench.db", connect_args={"check_same_thread": False})
+    database.SessionLocal.configure(bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+    _seed(database.SessionLocal, args.recipients)
+
+    blocked = range(1_000_000, 1_000_000 + args.blocked)
+    fake = FakeTelegram(args.global_rate, args.chat_rate, blocked, args.latency)
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    broadcast.get_telegram_bot()  # aiogram import is not part of the measurement
+    manager = broadcast.BroadcastManager()
+    db = database.SessionLocal()
+    try:
+        created = broadcast.create_broadcast(db, "<b>Benchmark</b> announcement")
+        broadcast_id, total = created.id, created.total
+    finally:
+        db.close()
+
+    started = time.perf_counter()
+    await manager.start(broadcast_id)
+    await asyncio.gather(*manager._tasks.values())
+    elapsed = time.perf_counter() - started
+
+    db = database.SessionLocal()
+    try:
+        result = db.get(models.Broadcast, broadcast_id)
+        sends = [call for call in fake.calls if call["method"] == "sendMessage"]
+        throttled = len(sends) - result.sent - result.blocked - result.failed
+        print(f"recipients: {total}, status: {result.status.value}")
+        print(f"sent: {result.sent}, blocked: {result.blocked}, failed: {result.failed}")
+        print(f"elapsed: {elapsed:.2f} s, {len(sends) / elapsed:.1f} requests/s "
+              f"(bucket {args.rate}/s, server limit {args.global_rate or 'none'}/s)")
+        print(f"429 responses: {throttled}")
+        ok = result.status == models.BroadcastStatus.COMPLETED and result.sent == total - args.blocked
+    finally:
+        db.close()
+
+    await broadcast.get_telegram_bot().session.close()
+    server.should_exit = True
+    await server_task
+    return 0 if ok else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=300)
+    parser.add_argument("--blocked", type=int, default=10, help="recipients that blocked the bot")
+    parser.add_argument("--rate", type=float, default=25, help="client token bucket, messages/s")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--global-rate", type=float, default=30, help="fake server limit, messages/s")
+    parser.add_argument("--chat-rate", type=float, default=1)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
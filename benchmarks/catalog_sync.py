@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Cross-worker catalog invalidation: how long until every uvicorn worker
+serves a product change made through the admin API.
+
+Starts benchmarks/fake_redis.py in-process (or uses --redis-url) and main:app
+with --workers processes and CACHE_BACKEND=--backend. Every worker first
+builds its in-memory price snapshot (POST /api/orders/quote). Then, --rounds
+times, the admin changes the product's price and batches of --probes quotes
+on fresh connections (spread over the workers by the kernel) are sent until
+a whole batch shows the new price, or --timeout passes.
+
+With --backend redis every round must converge (exit 1 otherwise) and the
+propagation time is printed; with --backend memory the rounds that never
+converge show the stale-worker problem the bus fixes.
+
+    python benchmarks/catalog_sync.py --workers 4
+    python benchmarks/catalog_sync.py --workers 4 --backend memory
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from loadtest import ADMIN_ID, BOT_TOKEN, _free_port, _wait_healthy, percentile  # noqa: E402
+
+
+def _seed(database_url: str) -> int:
+    from sqlalchemy import create_engine, insert, select
+
+    from app import models
+    from app.database import Base
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product), [{"title": "Багет", "description": "", "price": 10000, "image": ""}])
+        product_id = conn.execute(select(models.Product.id)).scalar_one()
+    engine.dispose()
+    return product_id
+
+
+async def quoted_prices(probe_client, product_id: int, probes: int) -> List[Optional[float]]:
+    """Quote the product ``probes`` times at once, each on a new connection."""
+    body = {"delivery_type": "pickup", "items": [{"product_id": product_id, "quantity": 1}]}
+
+    async def probe():
+        response = await probe_client.post("/api/orders/quote", json=body)
+        return response.json()["subtotal"] if response.status_code == 200 else None
+
+    return await asyncio.gather(*(probe() for _ in range(probes)))
+
+
+async def run(args) -> int:
+    import httpx
+
+    from auth import sign_init_data
+    from fake_redis import FakeRedis
+
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-catalog-sync-"))
+    database_url = f"sqlite:///{(workdir / 'catalog.db').as_posix()}"
+    product_id = _seed(database_url)
+
+    fake = None
+    redis_url = args.redis_url
+    if args.backend == "redis" and not redis_url:
+        redis_port = _free_port()
+        fake = await FakeRedis().start(redis_port)
+        redis_url = f"redis://127.0.0.1:{redis_port}/0"
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        BOT_TOKEN=BOT_TOKEN,
+        ADMIN_USER_ID=str(ADMIN_ID),
+        RATE_LIMIT_ENABLED="0",
+        LOG_LEVEL="WARNING",
+        BOT_MODE="polling",
+        CACHE_BACKEND=args.backend,
+        CACHE_REDIS_URL=redis_url or "",
+    )
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    log_path = workdir / "app.log"
+    with open(log_path, "w") as log_file:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+            cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+        )
+
+    base_url = f"http://127.0.0.1:{port}"
+    admin = {"X-Telegram-Init-Data": sign_init_data(BOT_TOKEN, ADMIN_ID, int(time.time()))}
+    converged: List[float] = []
+    batches: List[float] = []
+    first_batch = 0
+    stale_rounds = 0
+    # No keep-alive: every probe opens a new connection, which any worker may accept
+    no_keepalive = httpx.Limits(max_keepalive_connections=0)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=10.0) as client, \
+                httpx.AsyncClient(base_url=base_url, timeout=10.0, limits=no_keepalive) as probe_client:
+            await _wait_healthy(client, process)
+            # Give every worker a price snapshot to go stale
+            await quoted_prices(probe_client, product_id, args.probes * 2)
+
+            for round_number in range(1, args.rounds + 1):
+                price = 100.0 + round_number
+                response = await client.put(f"/api/admin/products/{product_id}", json={"price": price}, headers=admin)
+                response.raise_for_status()
+                started = time.perf_counter()
+                deadline = started + args.timeout
+                for attempt in itertools.count():
+                    batch_started = time.perf_counter()
+                    prices = await quoted_prices(probe_client, product_id, args.probes)
+                    batches.append(time.perf_counter() - batch_started)
+                    if all(value == price for value in prices):
+                        converged.append(time.perf_counter() - started)
+                        first_batch += attempt == 0
+                        break
+                    if time.perf_counter() >= deadline:
+                        stale_rounds += 1
+                        stale = sum(value != price for value in prices)
+                        print(f"round {round_number}: {stale}/{len(prices)} quotes still stale after {args.timeout}s")
+                        break
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if fake is not None:
+            fake.close()
+
+    print(f"backend {args.backend}, {args.workers} workers: "
+          f"{len(converged)}/{args.rounds} price changes seen by every probe")
+    if converged:
+        converged.sort()
+        batches.sort()
+        # The admin response returns after the bump is published, so a batch
+        # sent right after it is the earliest check; it takes a while itself
+        print(f"already agreed in the first batch after the write: {first_batch}/{len(converged)} rounds")
+        print(f"time until a full batch of {args.probes} quotes agreed: "
+              f"p50 {percentile(converged, 50) * 1000:.1f} ms, max {converged[-1] * 1000:.1f} ms "
+              f"(one batch: p50 {percentile(batches, 50) * 1000:.1f} ms)")
+    if fake is not None:
+        print(f"fake redis commands: {dict(fake.calls)}")
+    if args.backend == "redis" and stale_rounds:
+        print(f"FAIL: {stale_rounds} rounds never converged; app log: {log_path}")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--backend", choices=["redis", "memory"], default="redis")
+    parser.add_argument("--redis-url", help="real Redis server instead of the in-process fake")
+    parser.add_argument("--rounds", type=int, default=20, help="price changes")
+    parser.add_argument("--probes", type=int, default=40, help="quotes per batch")
+    parser.add_argument("--timeout", type=float, default=3.0, help="seconds to wait for every worker")
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Local fake Redis server (RESP2/RESP3 over TCP) for tests and benchmarks.
+
+Speaks enough of the protocol for the project's shared cache, catalog
+version bus and Redis rate-limit backend, with the real ``redis`` client:
+PING, ECHO, GET, SET (EX/PX/NX/XX), MGET, DEL, INCR(BY), EXPIRE, PEXPIRE, TTL,
+PUBLISH, SUBSCRIBE, UNSUBSCRIBE, HELLO, plus CLIENT/SELECT acknowledged
+with OK.
+Everything lives in memory in one process; no persistence.
+
+    python benchmarks/fake_redis.py --port 6399
+    CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6399/0 uvicorn main:app --workers 4
+
+Use in-process: ``server = await FakeRedis().start(port)``, ``server.close()``.
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class RespError(Exception):
+    pass
+
+
+class Push(list):
+    """Out-of-band message (pub/sub): a RESP3 push, a plain array in RESP2."""
+
+
+def _encode(value, resp3: bool = False) -> bytes:
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    if isinstance(value, RespError):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, int):
+        return f":{int(value)}\r\n".encode()
+    if isinstance(value, str):  # simple string
+        return f"+{value}\r\n".encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, dict):
+        if resp3:
+            return b"%%%d\r\n" % len(value) + b"".join(
+                _encode(key, resp3) + _encode(item, resp3) for key, item in value.items())
+        return _encode([part for pair in value.items() for part in pair])
+    if isinstance(value, (list, tuple)):
+        prefix = b">" if resp3 and isinstance(value, Push) else b"*"
+        return prefix + b"%d\r\n" % len(value) + b"".join(_encode(item, resp3) for item in value)
+    raise TypeError(f"cannot encode {type(value).__name__}")
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):  # inline command (redis-cli, telnet)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+class FakeRedis:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()  # command name -> count
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}  # key -> (value, expires at)
+        self._channels: Dict[bytes, Dict[asyncio.StreamWriter, bool]] = defaultdict(dict)  # -> {writer: resp3}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, port: int, host: str = "127.0.0.1") -> "FakeRedis":
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[0]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscribed: Set[bytes] = set()
+        resp3 = False
+        try:
+            while True:
+                command = await _read_command(reader)
+                if command is None:
+                    break
+                if not command:
+                    continue
+                name = command[0].upper().decode()
+                self.calls[name] += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if name in ("SUBSCRIBE", "UNSUBSCRIBE"):
+                    channels = command[1:] or (list(subscribed) if name == "UNSUBSCRIBE" else [])
+                    for channel in channels:
+                        if name == "SUBSCRIBE":
+                            subscribed.add(channel)
+                            self._channels[channel][writer] = resp3
+                        else:
+                            subscribed.discard(channel)
+                            self._channels[channel].pop(writer, None)
+                        writer.write(_encode(Push([name.lower().encode(), channel, len(subscribed)]), resp3))
+                elif name == "HELLO":
+                    version = int(command[1]) if len(command) > 1 else (3 if resp3 else 2)
+                    if version not in (2, 3):
+                        writer.write(_encode(RespError("NOPROTO unsupported protocol version")))
+                    else:
+                        resp3 = version == 3
+                        writer.write(_encode({b"server": b"redis", b"version": b"7.2.0", b"proto": version,
+                                              b"id": id(writer), b"mode": b"standalone", b"role": b"master",
+                                              b"modules": []}, resp3))
+                elif name == "QUIT":
+                    writer.write(_encode("OK"))
+                    break
+                else:
+                    try:
+                        reply = self.execute(name, command[1:])
+                    except RespError as e:
+                        reply = e
+                    except (IndexError, ValueError):
+                        reply = RespError(f"ERR wrong arguments for '{name.lower()}' command")
+                    writer.write(_encode(reply, resp3))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # shutting down with clients still connected
+        finally:
+            for channel in subscribed:
+                self._channels[channel].pop(writer, None)
+            writer.close()
+
+    def execute(self, name: str, args: List[bytes]):
+        if name == "PING":
+            return args[0] if args else "PONG"
+        if name == "ECHO":
+            return args[0]
+        if name in ("CLIENT", "SELECT"):
+            return "OK"
+        if name == "GET":
+            return self._get(args[0])
+        if name == "MGET":
+            return [self._get(key) for key in args]
+        if name == "SET":
+            key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+            expires = None
+            if b"EX" in options:
+                expires = time.monotonic() + float(args[2 + options.index(b"EX") + 1])
+            if b"PX" in options:
+                expires = time.monotonic() + float(args[2 + options.index(b"PX") + 1]) / 1000
+            exists = self._get(key) is not None
+            if (b"NX" in options and exists) or (b"XX" in options and not exists):
+                return None
+            self._data[key] = (value, expires)
+            return "OK"
+        if name == "DEL":
+            return sum(self._data.pop(key, None) is not None for key in args)
+        if name in ("INCR", "INCRBY"):
+            entry = self._data.get(args[0])
+            try:
+                value = int(self._get(args[0]) or 0) + (int(args[1]) if name == "INCRBY" else 1)
+            except ValueError:
+                raise RespError("ERR value is not an integer or out of range")
+            self._data[args[0]] = (str(value).encode(), entry[1] if entry else None)
+            return value
+        if name in ("EXPIRE", "PEXPIRE"):
+            value = self._get(args[0])
+            if value is None:
+                return 0
+            seconds = float(args[1]) / (1000 if name == "PEXPIRE" else 1)
+            self._data[args[0]] = (value, time.monotonic() + seconds)
+            return 1
+        if name == "TTL":
+            if self._get(args[0]) is None:
+                return -2
+            expires = self._data[args[0]][1]
+            return -1 if expires is None else max(0, round(expires - time.monotonic()))
+        if name == "PUBLISH":
+            channel, message = args
+            receivers = list(self._channels.get(channel, {}).items())
+            for writer, resp3 in receivers:
+                writer.write(_encode(Push([b"message", channel, message]), resp3))
+            return len(receivers)
+        raise RespError(f"ERR unknown command '{name.lower()}'")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every command")
+    args = parser.parse_args()
+
+    async def serve():
+        fake = await FakeRedis(args.latency).start(args.port, args.host)
+        print(f"fake redis on redis://{args.host}:{args.port}/0")
+        await fake._server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
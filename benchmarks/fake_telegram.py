@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Local fake Telegram Bot API server for tests and benchmarks.
+
+Point the app (and bot.py) at it with TELEGRAM_API_URL=http://127.0.0.1:8081.
+It answers the methods the project uses, records every call, and can emulate
+Telegram's flood limits (429 + retry_after), blocked users (403) and latency.
+
+    python benchmarks/fake_telegram.py --port 8081 --global-rate 30 --chat-rate 1
+
+Inspection endpoints: GET /_calls (recorded calls), DELETE /_calls (reset).
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+from typing import Dict, Iterable, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+class FakeTelegram:
+    def __init__(self, global_rate: float = 0, chat_rate: float = 0,
+                 blocked: Iterable[int] = (), latency: float = 0.0):
+        self.global_rate = global_rate      # messages per second, 0 = unlimited
+        self.chat_rate = chat_rate          # messages per second per chat, 0 = unlimited
+        self.blocked = set(blocked)
+        self.latency = latency
+        self.calls = []
+        self.webhook_url = ""
+        self._message_id = 0
+        self._global_window: deque = deque()
+        self._chat_windows: Dict[int, deque] = defaultdict(deque)
+
+    def _rate_limited(self, chat_id: Optional[int]) -> Optional[int]:
+        """Return retry_after seconds if this send would exceed a limit."""
+        now = time.monotonic()
+        checks = []
+        if self.global_rate:
+            checks.append((self._global_window, self.global_rate))
+        if self.chat_rate and chat_id is not None:
+            checks.append((self._chat_windows[chat_id], self.chat_rate))
+        for window, rate in checks:
+            while window and now - window[0] >= 1.0:
+                window.popleft()
+            if len(window) >= rate:
+                return max(1, int(1.0 - (now - window[0]) + 0.999))
+        for window, _ in checks:
+            window.append(now)
+        return None
+
+    def _message(self, params: dict) -> dict:
+        self._message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    async def handle(self, method: str, params: dict) -> JSONResponse:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append({"method": method, "params": params, "ts": time.time()})
+
+        if method in ("sendMessage", "sendPhoto", "copyMessage", "forwardMessage"):
+            chat_id = int(params.get("chat_id", 0))
+            if chat_id in self.blocked:
+                return self._error(403, "Forbidden: bot was blocked by the user")
+            retry_after = self._rate_limited(chat_id)
+            if retry_after:
+                return self._error(429, f"Too Many Requests: retry after {retry_after}",
+                                   {"retry_after": retry_after})
+            return self._ok(self._message(params))
+        if method == "editMessageText":
+            return self._ok(self._message(params))
+        if method == "getMe":
+            return self._ok(BOT_USER)
+        if method == "getUpdates":
+            return self._ok([])
+        if method == "setWebhook":
+            self.webhook_url = params.get("url", "")
+            return self._ok(True)
+        if method == "deleteWebhook":
+            self.webhook_url = ""
+            return self._ok(True)
+        if method == "getWebhookInfo":
+            return self._ok({"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": 0})
+        return self._ok(True)
+
+    @staticmethod
+    def _ok(result) -> JSONResponse:
+        return JSONResponse({"ok": True, "result": result})
+
+    @staticmethod
+    def _error(code: int, description: str, parameters: Optional[dict] = None) -> JSONResponse:
+        body = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return JSONResponse(body, status_code=code)
+
+
+async def _read_params(request: Request) -> dict:
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        return await request.json()
+    params = {}
+    if content_type.startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        form = await request.form()
+        for key, value in form.items():
+            # aiogram sends nested objects (reply_markup, ...) JSON-encoded
+            if isinstance(value, str) and value[:1] in "[{":
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+    params.update(request.query_params)
+    return params
+
+
+def create_app(fake: Optional[FakeTelegram] = None) -> Starlette:
+    fake = fake or FakeTelegram()
+
+    async def api_method(request: Request):
+        return await fake.handle(request.path_params["method"], await _read_params(request))
+
+    async def list_calls(request: Request):
+        return JSONResponse(fake.calls)
+
+    async def reset_calls(request: Request):
+        fake.calls.clear()
+        return JSONResponse({"ok": True})
+
+    app = Starlette(routes=[
+        Route("/_calls", list_calls, methods=["GET"]),
+        Route("/_calls", reset_calls, methods=["DELETE"]),
+        Route("/bot{token}/{method}", api_method, methods=["GET", "POST"]),
+    ])
+    app.state.fake = fake
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=float, default=0, help="messages/s for the whole bot (Telegram: ~30)")
+    parser.add_argument("--chat-rate", type=float, default=0, help="messages/s per chat (Telegram: ~1)")
+    parser.add_argument("--blocked", default="", help="comma-separated chat ids that blocked the bot")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    args = parser.parse_args()
+
+    blocked = [int(x) for x in args.blocked.split(",") if x.strip()]
+    fake = FakeTelegram(args.global_rate, args.chat_rate, blocked, args.latency)
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Local fake YooKassa v3 API server for tests and benchmarks.
+
+Point the app at it with YOOKASSA_API_URL=http://127.0.0.1:8082/v3 (any
+YOOKASSA_SHOP_ID/YOOKASSA_SECRET_KEY pair is accepted as long as it is sent).
+It creates and returns payments like the real API, honours Idempotence-Key
+and can add latency to every call.
+
+    python benchmarks/fake_yookassa.py --port 8082 --latency 0.15 \
+        --webhook-url http://127.0.0.1:8000/api/orders/webhook/payment
+
+Test endpoints: POST /_payments/{id}/succeed and /_payments/{id}/cancel change
+the payment status and return the notification YooKassa would send (it is
+also delivered to --webhook-url when set).
+"""
+
+import argparse
+import asyncio
+import base64
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class FakeYooKassa:
+    def __init__(self, latency: float = 0.0, webhook_url: str = ""):
+        self.latency = latency
+        self.webhook_url = webhook_url
+        self.payments: Dict[str, dict] = {}
+        self._idempotence: Dict[str, str] = {}  # Idempotence-Key -> payment id
+        self.calls = 0
+
+    def create_payment(self, body: dict, idempotence_key: str, shop_id: str) -> dict:
+        if idempotence_key in self._idempotence:
+            return self.payments[self._idempotence[idempotence_key]]
+        payment_id = str(uuid.uuid4())
+        payment = {
+            "id": payment_id,
+            "status": "pending",
+            "paid": False,
+            "amount": body["amount"],
+            "confirmation": {
+                "type": "redirect",
+                "return_url": body.get("confirmation", {}).get("return_url", ""),
+                "confirmation_url": f"https://yoomoney.ru/checkout/payments/v2/contract?orderId={payment_id}",
+            },
+            "created_at": _now(),
+            "description": body.get("description", ""),
+            "metadata": body.get("metadata", {}),
+            "recipient": {"account_id": shop_id, "gateway_id": "100500"},
+            "refundable": False,
+            "test": True,
+        }
+        self.payments[payment_id] = payment
+        self._idempotence[idempotence_key] = payment_id
+        return payment
+
+    def set_status(self, payment_id: str, status: str) -> Optional[dict]:
+        """Move a payment to ``status`` and return the webhook notification for it."""
+        payment = self.payments.get(payment_id)
+        if payment is None:
+            return None
+        payment["status"] = status
+        payment["paid"] = status == "succeeded"
+        if status == "succeeded":
+            payment["captured_at"] = _now()
+        return {"type": "notification", "event": f"payment.{status}", "object": payment}
+
+    async def deliver(self, notification: dict) -> None:
+        if not self.webhook_url:
+            return
+        import httpx
+
+        async with httpx.AsyncClient() as client:
+            await client.post(self.webhook_url, json=notification, timeout=10.0)
+
+
+def _error(code: int, error_code: str, description: str) -> JSONResponse:
+    return JSONResponse(
+        {"type": "error", "id": str(uuid.uuid4()), "code": error_code, "description": description},
+        status_code=code,
+    )
+
+
+def create_app(fake: Optional[FakeYooKassa] = None) -> Starlette:
+    fake = fake or FakeYooKassa()
+
+    async def create_payment(request: Request):
+        fake.calls += 1
+        if fake.latency:
+            await asyncio.sleep(fake.latency)
+        auth = request.headers.get("authorization", "")
+        if not auth.startswith("Basic "):
+            return _error(401, "invalid_credentials", "Basic authentication required")
+        key = request.headers.get("idempotence-key")
+        if not key:
+            return _error(400, "invalid_request", "Idempotence-Key header is required")
+        body = await request.json()
+        if "amount" not in body:
+            return _error(400, "invalid_request", "amount is required")
+        shop_id = base64.b64decode(auth[6:]).decode(errors="replace").partition(":")[0]
+        return JSONResponse(fake.create_payment(body, key, shop_id))
+
+    async def get_payment(request: Request):
+        fake.calls += 1
+        if fake.latency:
+            await asyncio.sleep(fake.latency)
+        payment = fake.payments.get(request.path_params["payment_id"])
+        if payment is None:
+            return _error(404, "not_found", "Payment not found")
+        return JSONResponse(payment)
+
+    def change_status(status: str):
+        async def endpoint(request: Request):
+            notification = fake.set_status(request.path_params["payment_id"], status)
+            if notification is None:
+                return _error(404, "not_found", "Payment not found")
+            await fake.deliver(notification)
+            return JSONResponse(notification)
+        return endpoint
+
+    app = Starlette(routes=[
+        Route("/v3/payments", create_payment, methods=["POST"]),
+        Route("/v3/payments/{payment_id}", get_payment, methods=["GET"]),
+        Route("/_payments/{payment_id}/succeed", change_status("succeeded"), methods=["POST"]),
+        Route("/_payments/{payment_id}/cancel", change_status("canceled"), methods=["POST"]),
+    ])
+    app.state.fake = fake
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--webhook-url", default="", help="where status changes are delivered")
+    args = parser.parse_args()
+
+    fake = FakeYooKassa(args.latency, args.webhook_url)
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
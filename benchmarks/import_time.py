@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for main.py (cold-start guard).
+
+Runs `python -X importtime -c "import main"` several times, takes the best
+cumulative time of the `main` module and fails (exit code 1) when it exceeds
+the budget or when a module that must stay lazy shows up at import time.
+
+    python benchmarks/import_time.py --budget-ms 1500 --runs 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Heavy optional dependencies that must only be imported on first use
+LAZY_MODULES = ["aiogram", "aiohttp", "httpx"]
+
+
+def measure_once(module: str):
+    """Return (cumulative_us of module, set of imported top-level packages)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    cumulative_us = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        name = name.strip()
+        imported.add(name.split(".")[0])
+        if name == module:
+            cumulative_us = int(cumulative)
+    if cumulative_us is None:
+        raise RuntimeError(f"no importtime entry for {module}")
+    return cumulative_us, imported
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500")))
+    args = parser.parse_args()
+
+    # First run compiles .pyc files and is not representative of a restart
+    measure_once(args.module)
+    samples = []
+    imported = set()
+    for _ in range(args.runs):
+        cumulative_us, imported = measure_once(args.module)
+        samples.append(cumulative_us / 1000)
+
+    best = min(samples)
+    print(f"import {args.module}: best {best:.1f} ms, "
+          f"median {sorted(samples)[len(samples) // 2]:.1f} ms, budget {args.budget_ms:.0f} ms")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager)}")
+        failed = True
+    if best > args.budget_ms:
+        print(f"FAIL: import time {best:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
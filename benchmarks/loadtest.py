@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: main:app under uvicorn against a throwaway database,
+with benchmarks/fake_yookassa.py and benchmarks/fake_telegram.py standing in
+for the external APIs.
+
+Virtual users (--concurrency) each repeat a scenario picked by --mix weight:
+
+  browse   GET /, GET /api/products, GET /api/products/{id}
+  order    POST /api/orders/ (cash)
+  payment  POST /api/orders/ (online), POST /api/orders/{id}/payment,
+           then the YooKassa webhook POST /api/orders/webhook/payment
+  history  GET /api/orders/, GET /api/orders/{id}
+
+Every user is a separate Telegram user with signed initData. Rate limits are
+disabled unless --rate-limits is given, since they would cap the measurement.
+Requests made during --warmup are not counted.
+
+Reports throughput and p50/p95/p99 per endpoint and writes them to
+benchmarks/results/ (or --output) as JSON; --compare prints the change
+against an earlier result file.
+
+    python benchmarks/loadtest.py --concurrency 50 --duration 30 --workers 2
+    python benchmarks/loadtest.py --compare benchmarks/results/<earlier>.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+BOT_TOKEN = "123456:LOADTEST"
+ADMIN_ID = 42
+DEFAULT_MIX = "browse=60,order=15,payment=10,history=15"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def _git_commit() -> Dict[str, object]:
+    def git(*args):
+        result = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else ""
+
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+class Stats:
+    """Latencies and status codes per endpoint, only while recording."""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def add(self, endpoint: str, status: str, elapsed: float) -> None:
+        if self.recording:
+            self.latencies[endpoint].append(elapsed)
+            self.statuses[endpoint][status] += 1
+
+    def summary(self, duration: float) -> dict:
+        endpoints = {}
+        everything = []
+        for endpoint in sorted(self.latencies):
+            values = sorted(self.latencies[endpoint])
+            everything.extend(values)
+            endpoints[endpoint] = self._describe(values, duration, self.statuses[endpoint])
+        total_statuses = defaultdict(int)
+        for statuses in self.statuses.values():
+            for status, count in statuses.items():
+                total_statuses[status] += count
+        return {"total": self._describe(sorted(everything), duration, total_statuses), "endpoints": endpoints}
+
+    @staticmethod
+    def _describe(values: List[float], duration: float, statuses) -> dict:
+        errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+        return {
+            "requests": len(values),
+            "errors": errors,
+            "rps": round(len(values) / duration, 2) if duration else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+            "statuses": dict(sorted(statuses.items())),
+        }
+
+
+class VirtualUser:
+    def __init__(self, client, stats: Stats, user_id: int, product_ids: List[int], yookassa):
+        from auth import sign_init_data
+
+        self.client = client
+        self.stats = stats
+        self.product_ids = product_ids
+        self.yookassa = yookassa
+        self.headers = {"X-Telegram-Init-Data": sign_init_data(BOT_TOKEN, user_id, int(time.time()))}
+        self.order_ids: List[int] = []
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except Exception as e:
+            self.stats.add(endpoint, type(e).__name__, time.perf_counter() - started)
+            return None
+        self.stats.add(endpoint, str(response.status_code), time.perf_counter() - started)
+        return response
+
+    def _order_body(self, payment_type: str) -> dict:
+        delivery = random.random() < 0.5
+        return {
+            "customer_name": "Load Test",
+            "customer_phone": "+70000000000",
+            "customer_address": "ул. Тестовая, 1" if delivery else None,
+            "delivery_type": "delivery" if delivery else "pickup",
+            "payment_type": payment_type,
+            "items": [
+                {"product_id": product_id, "quantity": random.randint(1, 3)}
+                for product_id in random.sample(self.product_ids, random.randint(1, 4))
+            ],
+        }
+
+    async def browse(self) -> None:
+        await self.request("GET /", "GET", "/")
+        await self.request("GET /api/products", "GET", "/api/products")
+        await self.request("GET /api/products/{id}", "GET", f"/api/products/{random.choice(self.product_ids)}")
+
+    async def order(self) -> Optional[int]:
+        response = await self.request("POST /api/orders/", "POST", "/api/orders/", json=self._order_body("cash"))
+        if response is not None and response.status_code == 200:
+            self.order_ids.append(response.json()["id"])
+            return self.order_ids[-1]
+        return None
+
+    async def payment(self) -> None:
+        response = await self.request("POST /api/orders/", "POST", "/api/orders/", json=self._order_body("online"))
+        if response is None or response.status_code != 200:
+            return
+        order_id = response.json()["id"]
+        self.order_ids.append(order_id)
+        response = await self.request(
+            "POST /api/orders/{id}/payment", "POST", f"/api/orders/{order_id}/payment", json={"order_id": order_id}
+        )
+        if response is None or response.status_code != 200:
+            return
+        notification = self.yookassa.set_status(response.json()["payment_id"], "succeeded")
+        await self.request("POST /api/orders/webhook/payment", "POST", "/api/orders/webhook/payment", json=notification)
+
+    async def history(self) -> None:
+        await self.request("GET /api/orders/", "GET", "/api/orders/")
+        if self.order_ids:
+            await self.request("GET /api/orders/{id}", "GET", f"/api/orders/{random.choice(self.order_ids)}")
+
+
+SCENARIOS = {
+    "browse": VirtualUser.browse,
+    "order": VirtualUser.order,
+    "payment": VirtualUser.payment,
+    "history": VirtualUser.history,
+}
+
+
+def _seed(database_url: str, products: int) -> List[int]:
+    from sqlalchemy import create_engine, insert, select
+
+    from app import models
+    from app.database import Base
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product), [
+            {
+                "title": f"Товар {i}",
+                "description": "Свежая выпечка к празднику " * 4,
+                "price": random.randint(50, 900) * 100,  # kopecks
+                "image": f"/static/uploads/product-{i}.jpg",
+                "created_at": datetime.utcnow(),
+            }
+            for i in range(products)
+        ])
+        ids = list(conn.execute(select(models.Product.id)).scalars())
+    engine.dispose()
+    return ids
+
+
+async def _start_server(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", access_log=False))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+async def _wait_healthy(client, process, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"app exited with code {process.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("app did not become healthy in time")
+
+
+def print_summary(result: dict) -> None:
+    print(f"{'endpoint':38} {'req':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, row in rows:
+        print(f"{name:38} {row['requests']:7d} {row['rps']:8.1f} {row['p50_ms']:8.1f} "
+              f"{row['p95_ms']:8.1f} {row['p99_ms']:8.1f} {row['errors']:7d}")
+
+
+def print_comparison(result: dict, previous: dict) -> None:
+    print(f"\nvs {previous['meta'].get('commit') or '?'} ({previous['meta'].get('timestamp', '')}):")
+    print(f"{'endpoint':38} {'rps':>16} {'p95 ms':>18}")
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, row in rows:
+        old = previous["total"] if name == "TOTAL" else previous["endpoints"].get(name)
+        if not old:
+            continue
+
+        def change(new_value, old_value):
+            return f"{(new_value - old_value) / old_value * 100:+6.1f}%" if old_value else "     n/a"
+
+        print(f"{name:38} {row['rps']:7.1f} {change(row['rps'], old['rps'])} "
+              f"{row['p95_ms']:9.1f} {change(row['p95_ms'], old['p95_ms'])}")
+
+
+async def run(args) -> int:
+    import httpx
+
+    from fake_telegram import FakeTelegram, create_app as create_telegram_app
+    from fake_yookassa import FakeYooKassa, create_app as create_yookassa_app
+
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-loadtest-"))
+    database_url = f"sqlite:///{(workdir / 'loadtest.db').as_posix()}"
+    product_ids = _seed(database_url, args.products)
+
+    telegram = FakeTelegram(latency=args.telegram_latency)
+    yookassa = FakeYooKassa(latency=args.yookassa_latency)
+    telegram_port, yookassa_port, app_port = _free_port(), _free_port(), _free_port()
+    telegram_server, telegram_task = await _start_server(create_telegram_app(telegram), telegram_port)
+    yookassa_server, yookassa_task = await _start_server(create_yookassa_app(yookassa), yookassa_port)
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        BOT_TOKEN=BOT_TOKEN,
+        ADMIN_USER_ID=str(ADMIN_ID),
+        TELEGRAM_API_URL=f"http://127.0.0.1:{telegram_port}",
+        YOOKASSA_API_URL=f"http://127.0.0.1:{yookassa_port}/v3",
+        YOOKASSA_SHOP_ID="100500",
+        YOOKASSA_SECRET_KEY="test_loadtest",
+        RATE_LIMIT_ENABLED="1" if args.rate_limits else "0",
+        LOG_LEVEL="WARNING",
+        BOT_MODE="polling",
+    )
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    log_path = workdir / "app.log"
+    with open(log_path, "w") as log_file:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+             "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+            cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+        )
+
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    mix = parse_mix(args.mix)
+    scenarios, weights = list(mix), list(mix.values())
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", limits=limits, timeout=30.0) as client:
+            await _wait_healthy(client, process)
+            users = [
+                VirtualUser(client, stats, 5_000_000 + i, product_ids, yookassa) for i in range(args.concurrency)
+            ]
+            deadline = time.monotonic() + args.warmup + args.duration
+
+            async def user_loop(user: VirtualUser):
+                while time.monotonic() < deadline:
+                    await SCENARIOS[random.choices(scenarios, weights)[0]](user)
+
+            tasks = [asyncio.create_task(user_loop(user)) for user in users]
+            await asyncio.sleep(args.warmup)
+            stats.recording = True
+            started = time.perf_counter()
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        telegram_server.should_exit = yookassa_server.should_exit = True
+        await asyncio.gather(telegram_task, yookassa_task)
+
+    result = {
+        "meta": {
+            **_git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "duration_s": round(elapsed, 2),
+            "telegram_calls": len(telegram.calls),
+            "yookassa_payments": len(yookassa.payments),
+        },
+        **stats.summary(elapsed),
+    }
+    print_summary(result)
+    print(f"\ntelegram calls: {len(telegram.calls)}, yookassa payments: {len(yookassa.payments)}, "
+          f"app log: {log_path}")
+
+    output = Path(args.output) if args.output else (
+        ROOT / "benchmarks" / "results"
+        / f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['meta']['commit'] or 'nogit'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"results: {output}")
+
+    if args.compare:
+        print_comparison(result, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+    return 0 if result["total"]["requests"] and not result["total"]["errors"] else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds before measuring starts")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights")
+    parser.add_argument("--products", type=int, default=60)
+    parser.add_argument("--yookassa-latency", type=float, default=0.15, help="seconds per fake YooKassa call")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="seconds per fake Telegram call")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the app's rate limits on")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/loadtest-<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Per-request logging cost in the request path: old print() calls vs the queue-based logger.
+
+Replays what create_order used to do on every request (two prints, one of
+them dumping the whole order) against what it does now (a sampled-out DEBUG
+record plus one INFO record handed to the writer thread). Only time spent in
+the calling thread is measured, since that is what blocks the event loop.
+
+The sink is a pipe drained at --drain-kbps, like stdout attached to a
+container log collector. When the collector falls behind, print() blocks the
+caller; queued records wait in memory for the writer thread instead.
+--drain-kbps 0 drains as fast as possible.
+
+    python benchmarks/logging_overhead.py --iterations 20000 --drain-kbps 1024
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+ORDER = {
+    "customer_name": "Иван Петров",
+    "customer_phone": "+7 999 123-45-67",
+    "customer_address": "ул. Ленина, 1, кв. 2",
+    "delivery_type": "delivery",
+    "payment_type": "cash",
+    "comment": "Позвонить за час",
+    "items": [{"product_id": i, "quantity": 2} for i in range(5)],
+}
+
+
+def old_path(stream, telegram_user_id: int, order_id: int) -> None:
+    print(f"[ORDER] Creating order for user {telegram_user_id}", file=stream)
+    print(f"[ORDER] Order data: {ORDER}", file=stream)
+    print(f"[ORDER] Order created successfully with ID: {order_id}", file=stream)
+
+
+def new_path(logger: logging.Logger, telegram_user_id: int, order_id: int) -> None:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Order data", extra={"telegram_user_id": telegram_user_id, "order": ORDER})
+    logger.info("Order %s created", order_id, extra={"telegram_user_id": telegram_user_id})
+
+
+def open_pipe_sink(drain_kbps: int, copy_to: Path):
+    """Writable, line-buffered end of a pipe whose reader is throttled."""
+    read_fd, write_fd = os.pipe()
+
+    def drain():
+        with open(read_fd, "rb", buffering=0) as reader, open(copy_to, "wb") as copy:
+            while True:
+                chunk = reader.read(4096)
+                if not chunk:
+                    return
+                copy.write(chunk)
+                if drain_kbps:
+                    time.sleep(len(chunk) / (drain_kbps * 1024))
+
+    thread = threading.Thread(target=drain, daemon=True)
+    thread.start()
+    return open(write_fd, "w", buffering=1, encoding="utf-8"), thread
+
+
+def measure(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--drain-kbps", type=int, default=1024, help="log collector speed, 0 = unlimited")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp())
+    sink, reader = open_pipe_sink(args.drain_kbps, workdir / "print.log")
+    old_us = measure(lambda i: old_path(sink, 777, i), args.iterations)
+    sink.close()
+    reader.join()
+
+    sink_path = workdir / "logging.log"
+    sink, reader = open_pipe_sink(args.drain_kbps, sink_path)
+
+    os.environ.setdefault("LOG_LEVEL", "INFO")
+    os.environ.setdefault("LOG_DEBUG_SAMPLE_RATE", "0.01")
+    from app import logs
+
+    real_stdout, sys.stdout = sys.stdout, sink
+    try:
+        logs.setup_logging()
+    finally:
+        sys.stdout = real_stdout
+    logger = logging.getLogger("app.routes.orders")
+    token = logs.request_id_var.set("bench-request")
+    new_us = measure(lambda i: new_path(logger, 777, i), args.iterations)
+    logs.request_id_var.reset(token)
+    started = time.perf_counter()
+    logs.shutdown_logging()
+    drain_ms = (time.perf_counter() - started) * 1000
+    sink.close()
+    reader.join()
+
+    print(f"print():        {old_us:7.2f} us/request in the caller")
+    print(f"queued logging: {new_us:7.2f} us/request in the caller "
+          f"(writer thread needed another {drain_ms:.0f} ms to flush)")
+    with open(sink_path, encoding="utf-8") as f:
+        leaked = sum(1 for line in f if "+7 999" in line and line.startswith("{"))
+    print(f"JSON lines leaking the phone number: {leaked}")
+    return 0 if leaked == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
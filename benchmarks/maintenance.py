@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Database maintenance under load: request latency while each task runs.
+
+Seeds a throwaway database with --orders orders (a database big enough for
+a backup to take a while), starts main:app under uvicorn with --workers
+processes and keeps --concurrency virtual users busy: two thirds read
+their order history (GET /api/orders/), one third place cash orders
+(POST /api/orders/, a write). Meanwhile this process runs the maintenance
+tasks one after another against the same file, with idle phases between:
+
+  idle          no maintenance
+  backup        SQLite backup API, BACKUP_PAGES_PER_STEP pages per step
+  backup-1step  the same copy in a single step, for comparison
+  optimize      ANALYZE / PRAGMA optimize
+  vacuum        the first run: full VACUUM switching to incremental
+  vacuum-incr   incremental vacuum of the space freed by deleted orders
+  integrity     PRAGMA integrity_check
+
+Prints duration per task and p50/p99/max latency of reads and writes per
+phase, then the app's own http_request_duration_during_maintenance_seconds
+counts (requests the workers attributed to a running task). Fails (exit 1)
+if any request errored.
+
+    python benchmarks/maintenance.py --orders 200000 --workers 2
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from loadtest import ADMIN_ID, _free_port, _wait_healthy, percentile  # noqa: E402
+
+USERS = 5000  # seeded orders are spread over these customers
+
+
+def _seed(orders: int) -> int:
+    from sqlalchemy import insert, select
+
+    from app import models
+    from app.database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product), [{"title": "Багет", "description": "", "price": 10000, "image": ""}])
+        product_id = conn.execute(select(models.Product.id)).scalar_one()
+        for start in range(0, orders, 10000):
+            conn.execute(insert(models.Order), [
+                {
+                    "telegram_user_id": i % USERS, "customer_name": "Покупатель", "customer_phone": "+70000000000",
+                    "customer_address": "ул. Пекарная, д. 1, кв. 1", "delivery_type": models.DeliveryType.PICKUP,
+                    "payment_type": models.PaymentType.CASH, "comment": "Позвонить за час " * 8,
+                    "subtotal": 10000, "delivery_cost": 0, "total_amount": 10000,
+                    "status": models.OrderStatus.COMPLETED, "created_at": now, "updated_at": now,
+                }
+                for i in range(start, min(start + 10000, orders))
+            ])
+    return product_id
+
+
+def _free_space(fraction: float) -> int:
+    """Delete a share of the old orders so that vacuum has pages to give back."""
+    from app.database import engine
+
+    with engine.begin() as conn:
+        return conn.exec_driver_sql(f"DELETE FROM orders WHERE id % {round(1 / fraction)} = 0").rowcount
+
+
+async def run(args) -> int:
+    import httpx
+
+    from app import maintenance
+
+    product_id = _seed(args.orders)
+    size = maintenance.DATABASE_PATH.stat().st_size // (1024 * 1024)
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        BOT_TOKEN="",
+        ADMIN_USER_ID=str(ADMIN_ID),
+        AUTH_ALLOW_TELEGRAM_ID_HEADER="1",
+        RATE_LIMIT_ENABLED="0",
+        LOG_LEVEL="WARNING",
+        BOT_MODE="polling",
+        MAINTENANCE_ENABLED="0",  # this process runs the tasks, at known times
+    )
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    log_path = maintenance.DATABASE_PATH.with_name("app.log")
+    with open(log_path, "w") as log_file:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+            cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+        )
+
+    phase = "warmup"
+    latencies = defaultdict(list)  # (phase, kind) -> seconds
+    errors = defaultdict(int)
+    stop = asyncio.Event()
+    order = {"customer_name": "Нагрузка", "customer_phone": "+70000000000", "delivery_type": "pickup",
+             "payment_type": "cash", "items": [{"product_id": product_id, "quantity": 1}]}
+
+    async def user(client, number: int):
+        headers = {"X-Telegram-Id": str(number % USERS)}
+        write = number % 3 == 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            current = phase
+            if write:
+                response = await client.post("/api/orders/", json=order, headers=headers)
+            else:
+                response = await client.get("/api/orders/", headers=headers)
+            kind = "write" if write else "read"
+            if response.status_code != 200:
+                errors[(current, kind, response.status_code)] += 1
+            latencies[(current, kind)].append(time.perf_counter() - started)
+
+    jobs = {job.name: job for job in maintenance.default_jobs(maintenance.BACKUP_DIR)}
+    scheduler = maintenance.MaintenanceScheduler([], maintenance.DATABASE_PATH, 0, "00:00-00:00")
+    one_step = maintenance.MaintenanceJob("backup", 0, False, lambda source: maintenance.backup_database(
+        source, maintenance.BACKUP_DIR, 2, -1, 0))
+    phases = [("backup", jobs["backup"]), ("backup-1step", one_step), ("optimize", jobs["optimize"]),
+              ("vacuum", jobs["vacuum"]), ("vacuum-incr", jobs["vacuum"]), ("integrity", jobs["integrity"])]
+    durations = {}
+
+    base_url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+            await _wait_healthy(client, process)
+            users = [asyncio.create_task(user(client, number)) for number in range(args.concurrency)]
+            await asyncio.sleep(args.idle)
+            for name, job in phases:
+                phase = "idle"
+                await asyncio.sleep(args.idle)
+                if name == "vacuum-incr":
+                    await asyncio.to_thread(_free_space, 0.25)
+                phase = name
+                started = time.perf_counter()
+                ok = await asyncio.to_thread(scheduler.run_job, job)
+                durations[name] = (time.perf_counter() - started, ok)
+            phase = "idle"
+            await asyncio.sleep(args.idle)
+            stop.set()
+            await asyncio.gather(*users)
+            metrics = (await client.get("/metrics")).text
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    print(f"database {size} MiB, {args.orders} orders, {args.workers} workers, {args.concurrency} users")
+    print(f"{'phase':13} {'took s':>7} {'kind':6} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name in ["idle"] + [name for name, _ in phases]:
+        took = f"{durations[name][0]:.2f}" if name in durations else "-"
+        for kind in ("read", "write"):
+            values = sorted(latencies.get((name, kind), []))
+            if not values:
+                continue
+            print(f"{name:13} {took:>7} {kind:6} {len(values):>8} {percentile(values, 50) * 1000:>8.1f} "
+                  f"{percentile(values, 99) * 1000:>8.1f} {values[-1] * 1000:>8.1f}")
+    during = [line for line in metrics.splitlines()
+              if line.startswith("http_request_duration_during_maintenance_seconds_count")]
+    print("requests the app attributed to maintenance (one worker's registry):")
+    for line in during:
+        print(f"  {line}")
+
+    failed = [name for name, (_, ok) in durations.items() if not ok]
+    for key, count in errors.items():
+        print(f"FAIL {count} requests in {key[0]} ({key[1]}) answered {key[2]}")
+    for name in failed:
+        print(f"FAIL task {name} failed; see the output above")
+    return 1 if errors or failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200000, help="orders seeded before the run")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=6, help="virtual users")
+    parser.add_argument("--idle", type=float, default=3.0, help="seconds of load without maintenance between tasks")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-maintenance-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{(workdir / 'maintenance.db').as_posix()}"
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Money invariants, checked on random data (a property check without a test
+framework; --seed reproduces a run).
+
+  conversions  --cases random kopeck amounts: rubles <-> kopecks and the
+               YooKassa string round-trip exactly, JSON shows the exact
+               decimal, more than two decimals is rejected, percent_of
+               rounds half up
+  quotes       --cases random carts priced with random rule sets: every
+               amount is an int, lines add up to the subtotal, the discount
+               stays within it, total = subtotal - discount + delivery +
+               surcharge, and QuoteOut's JSON converts back to the same kopecks
+  orders       --orders orders placed through the API with prices such as
+               0.10 and 19.99: every total is exactly what decimal arithmetic
+               gives, and the admin summary's SQL SUM equals their sum; also
+               prints how far the same totals drift when summed as floats
+  migration    a database with the pre-kopeck schema (FLOAT rubles) converted
+               by prepare_schema at startup: columns become INTEGER, every amount
+               exactly rubles * 100; a second run changes nothing
+
+Prints the cases checked per property and the first counterexample of each
+one that failed; exits 1 if any failed.
+
+    python benchmarks/money_totals.py --cases 5000 --orders 300
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from fractions import Fraction
+from math import floor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+ADMIN_ID = 42
+
+# products, orders and order_items as created before money was kept in kopecks
+LEGACY_SCHEMA = """
+CREATE TABLE products (
+    id INTEGER NOT NULL, title VARCHAR(255) NOT NULL, description TEXT, price FLOAT NOT NULL,
+    image VARCHAR(1024), created_at DATETIME NOT NULL, PRIMARY KEY (id)
+);
+CREATE TABLE orders (
+    id INTEGER NOT NULL, telegram_user_id INTEGER NOT NULL, customer_name VARCHAR(255) NOT NULL,
+    customer_phone VARCHAR(50) NOT NULL, customer_address TEXT, delivery_type VARCHAR(8) NOT NULL,
+    payment_type VARCHAR(6) NOT NULL, comment TEXT, subtotal FLOAT NOT NULL, delivery_cost FLOAT NOT NULL,
+    total_amount FLOAT NOT NULL, status VARCHAR(10) NOT NULL, payment_id VARCHAR(255),
+    created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL, PRIMARY KEY (id)
+);
+CREATE TABLE order_items (
+    id INTEGER NOT NULL, order_id INTEGER NOT NULL, product_id INTEGER NOT NULL,
+    product_name VARCHAR(255) NOT NULL, product_price FLOAT NOT NULL, quantity INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(order_id) REFERENCES orders (id), FOREIGN KEY(product_id) REFERENCES products (id)
+);
+"""
+
+
+class Properties:
+    def __init__(self):
+        self.cases = Counter()
+        self.failures = {}  # property -> first counterexample
+
+    def check(self, name: str, holds: bool, example) -> None:
+        self.cases[name] += 1
+        if not holds and name not in self.failures:
+            self.failures[name] = example
+
+
+def _rubles(rng: random.Random, high: int) -> str:
+    """A ruble amount as an admin or client types it, up to ``high`` rubles."""
+    return f"{rng.randint(0, high)}.{rng.randint(0, 99):02d}"
+
+
+def check_conversions(props: Properties, rng: random.Random, cases: int) -> None:
+    from app.money import format_rubles, percent_of, to_kopecks, to_rubles
+    from app.serialization import dumps
+
+    for _ in range(cases):
+        kopecks = rng.randint(-10 ** 12, 10 ** 12)
+        props.check("to_kopecks(to_rubles(k)) == k", to_kopecks(to_rubles(kopecks)) == kopecks, kopecks)
+        props.check("to_kopecks(format_rubles(k)) == k", to_kopecks(format_rubles(kopecks)) == kopecks, kopecks)
+        text = dumps({"amount": to_rubles(kopecks)}).decode()
+        props.check("JSON shows the exact decimal", Decimal(json.loads(text, parse_float=Decimal)["amount"])
+                    == Decimal(format_rubles(kopecks)), text)
+        three = f"{format_rubles(abs(kopecks))}{rng.randint(1, 9)}"
+        try:
+            to_kopecks(three)
+            rejected = False
+        except ValueError:
+            rejected = True
+        props.check("three decimals rejected", rejected, three)
+
+        amount = abs(kopecks)
+        percent = rng.choice([0, 1, 5, 10, 12.5, 15, 33.3, 50, 99.99, 100])
+        expected = floor(Fraction(amount) * Fraction(str(percent)) / 100 + Fraction(1, 2))
+        props.check("percent_of rounds half up", percent_of(amount, percent) == expected, (amount, percent))
+
+
+def _random_rules(rng: random.Random):
+    from app import schemas
+
+    return schemas.PricingRules(
+        delivery_fee=_rubles(rng, 900),
+        free_delivery_from=rng.choice([None, _rubles(rng, 5000)]),
+        zones=[schemas.DeliveryZoneRule(name=f"z{i}", fee=_rubles(rng, 900),
+                                        free_from=rng.choice([None, _rubles(rng, 5000)]))
+               for i in range(rng.randint(0, 5))],
+        surcharges=[schemas.SurchargeRule(name=f"s{i}", starts=time(rng.randrange(24), rng.randrange(60)),
+                                          ends=time(rng.randrange(24), rng.randrange(60)), amount=_rubles(rng, 300),
+                                          delivery_only=rng.random() < 0.5)
+                    for i in range(rng.randint(0, 4))],
+        promo_codes=[schemas.PromoCodeRule(code=f"p{i}", percent_off=rng.choice([0, 5, 12.5, 33.3, 100]),
+                                           amount_off=_rubles(rng, 500), free_delivery=rng.random() < 0.3,
+                                           min_subtotal=_rubles(rng, 1000))
+                     for i in range(rng.randint(0, 4))],
+    )
+
+
+def check_quotes(props: Properties, rng: random.Random, cases: int) -> int:
+    from app import schemas
+    from app.money import to_kopecks
+    from app.pricing import PricedProduct, PricingEngine, PricingError, price_cart
+
+    money = ("subtotal", "discount", "delivery_cost", "surcharge", "total_amount")
+    rejected = 0
+    for _ in range(cases):
+        rules = _random_rules(rng)
+        engine = PricingEngine(rules)
+        prices = {i: PricedProduct(f"p{i}", rng.randint(1, 500000)) for i in range(1, 11)}
+        items = [schemas.OrderItemCreate(product_id=rng.randint(1, 10), quantity=rng.randint(1, 20))
+                 for _ in range(rng.randint(1, 6))]
+        delivery_type = rng.choice(["delivery", "pickup"])
+        zone = rng.choice([None] + [zone.name for zone in rules.zones])
+        promo = rng.choice([None] + [promo.code.upper() for promo in rules.promo_codes])
+        at = datetime(2024, 1, 1) + timedelta(minutes=rng.randrange(24 * 60))
+        try:
+            quote = price_cart(items, delivery_type, prices, engine, zone, promo, at)
+        except PricingError:
+            rejected += 1  # cart below the promo code's minimum
+            continue
+        example = (rules.model_dump(mode="json"), [item.model_dump() for item in items], delivery_type, zone, promo, at)
+        amounts = [getattr(quote, name) for name in money] + [x for line in quote.lines for x in line[2:]]
+        props.check("every amount is an int", all(type(x) is int for x in amounts), example)
+        props.check("line total == price * quantity",
+                    all(line.line_total == line.price * line.quantity for line in quote.lines), example)
+        props.check("lines add up to the subtotal", sum(line.line_total for line in quote.lines) == quote.subtotal,
+                    example)
+        props.check("0 <= discount <= subtotal", 0 <= quote.discount <= quote.subtotal, example)
+        props.check("total == subtotal - discount + delivery + surcharge",
+                    quote.total_amount == quote.subtotal - quote.discount + quote.delivery_cost + quote.surcharge,
+                    example)
+        out = schemas.QuoteOut.model_validate({**{name: getattr(quote, name) for name in money},
+                                               "items": [line._asdict() for line in quote.lines],
+                                               "free_delivery_threshold": quote.free_delivery_threshold})
+        shown = json.loads(out.model_dump_json())
+        props.check("QuoteOut JSON converts back to the same kopecks",
+                    all(to_kopecks(shown[name]) == getattr(quote, name) for name in money), example)
+    return rejected
+
+
+def check_orders(props: Properties, rng: random.Random, orders: int) -> str:
+    from fastapi.testclient import TestClient
+
+    import main as app_main
+    from app.money import to_kopecks
+
+    admin = {"X-Telegram-Id": str(ADMIN_ID)}
+    # Prices a float total gets wrong: 0.1 * 3 == 0.30000000000000004
+    typed = ["0.10", "0.20", "0.30", "0.01", "19.99", "33.33", "149.90"] + [_rubles(rng, 900) for _ in range(13)]
+    exact_sum, float_sum, float_off = Decimal(0), 0.0, 0
+    with TestClient(app_main.app) as client:
+        products = {}
+        for i, price in enumerate(typed):
+            response = client.post("/api/admin/products", headers=admin, json={"title": f"Товар {i}", "price": float(price)})
+            products[response.json()["id"]] = price
+        placed = []
+        for i in range(orders):
+            lines = [(rng.choice(list(products)), rng.randint(1, 9)) for _ in range(rng.randint(1, 5))]
+            delivery = rng.random() < 0.5
+            response = client.post("/api/orders/", headers={"X-Telegram-Id": str(1000 + i)}, json={
+                "customer_name": "Проверка", "customer_phone": "+70000000000",
+                "customer_address": "ул. Пекарная, 1" if delivery else None,
+                "delivery_type": "delivery" if delivery else "pickup", "payment_type": "cash",
+                "items": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in lines],
+            })
+            if response.status_code != 200:
+                props.check("orders are accepted", False, response.text[:200])
+                continue
+            order = response.json()
+            placed.append(order)
+            # What the order must cost, in decimal arithmetic, with the default rules
+            subtotal = sum(Decimal(products[product_id]) * quantity for product_id, quantity in lines)
+            fee = Decimal(500) if delivery and subtotal < 1500 else Decimal(0)
+            props.check("order total is the exact decimal total",
+                        to_kopecks(order["total_amount"]) == to_kopecks(subtotal + fee), (lines, delivery, order))
+            exact_sum += subtotal + fee
+            # The same order summed in floats, the way totals were computed before kopecks
+            float_total = sum(float(products[product_id]) * quantity for product_id, quantity in lines) + float(fee)
+            float_sum += float_total
+            float_off += Decimal(repr(float_total)) != subtotal + fee
+        summary = client.get("/api/admin/orders/summary", headers=admin).json()
+    summed = sum(to_kopecks(row["total_amount"]) for row in summary)
+    props.check("SQL SUM(total_amount) == sum of the order totals",
+                summed == sum(to_kopecks(order["total_amount"]) for order in placed), summary)
+    props.check("SQL SUM(total_amount) == exact decimal sum", summed == to_kopecks(exact_sum), (summed, exact_sum))
+    return (f"{len(placed)} orders worth {exact_sum} ₽; as floats {float_off} order totals were off "
+            f"and their sum came to {float_sum!r} ₽")
+
+
+def check_migration(props: Properties, rng: random.Random, workdir: Path, rows: int) -> None:
+    from sqlalchemy import create_engine
+
+    from app import models  # noqa: F401  (registers the tables)
+    from app.database import prepare_schema
+    from app.money import to_kopecks
+
+    path = workdir / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    now = datetime.utcnow().isoformat(" ")
+    expected = {"products": {}, "orders": {}, "order_items": {}}
+    for i in range(1, rows + 1):
+        price = float(_rubles(rng, 900))
+        subtotal, cost = price * rng.randint(1, 9), float(rng.choice(["0", "500", "0.1", "99.99"]))
+        total = subtotal + cost  # the float arithmetic the old code did
+        conn.execute("INSERT INTO products (id, title, price, created_at) VALUES (?, ?, ?, ?)", (i, f"p{i}", price, now))
+        conn.execute(
+            "INSERT INTO orders (id, telegram_user_id, customer_name, customer_phone, delivery_type, payment_type,"
+            " subtotal, delivery_cost, total_amount, status, created_at, updated_at)"
+            " VALUES (?, 1, 'c', '+7', 'PICKUP', 'CASH', ?, ?, ?, 'COMPLETED', ?, ?)",
+            (i, subtotal, cost, total, now, now),
+        )
+        conn.execute("INSERT INTO order_items (id, order_id, product_id, product_name, product_price, quantity)"
+                     " VALUES (?, ?, ?, 'p', ?, 1)", (i, i, i, price))
+        expected["products"][i] = {"price": price}
+        expected["orders"][i] = {"subtotal": subtotal, "delivery_cost": cost, "total_amount": total}
+        expected["order_items"][i] = {"product_price": price}
+    conn.commit()
+    conn.close()
+
+    engine = create_engine(f"sqlite:///{path.as_posix()}")
+    for run in (1, 2):  # the second run must find nothing to do
+        prepare_schema(engine)
+        conn = sqlite3.connect(path)
+        for table, by_id in expected.items():
+            declared = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column in next(iter(by_id.values())):
+                props.check("money columns are INTEGER after the migration", declared[column] == "INTEGER",
+                            (run, table, column, declared[column]))
+                for row_id, value, kind in conn.execute(f"SELECT id, {column}, typeof({column}) FROM {table}"):
+                    # ROUND(x * 100) of what the column held: repr() is that float's shortest decimal
+                    want = to_kopecks(f"{Decimal(repr(by_id[row_id][column])):.2f}")
+                    props.check("migrated amount == round(rubles * 100)", value == want and kind == "integer",
+                                (run, table, column, row_id, by_id[row_id][column], value, kind))
+        conn.close()
+    engine.dispose()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=5000, help="random cases for conversions and quotes")
+    parser.add_argument("--orders", type=int, default=300, help="orders placed through the API")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    rng = random.Random(seed)
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-money-"))
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{(workdir / 'money.db').as_posix()}",
+        BOT_TOKEN="",
+        ADMIN_USER_ID=str(ADMIN_ID),
+        AUTH_ALLOW_TELEGRAM_ID_HEADER="1",
+        RATE_LIMIT_ENABLED="0",
+        MAINTENANCE_ENABLED="0",
+        LOG_LEVEL="ERROR",
+    )
+    os.chdir(ROOT)  # templates/ is resolved relative to the working directory
+
+    props = Properties()
+    check_conversions(props, rng, args.cases)
+    rejected = check_quotes(props, rng, args.cases)
+    orders = check_orders(props, rng, args.orders)
+    check_migration(props, rng, workdir, rows=200)
+
+    print(f"seed {seed}")
+    for name, count in props.cases.items():
+        print(f"{'FAIL' if name in props.failures else 'ok  '} {count:>6}  {name}")
+    print(f"quotes: {rejected} carts below a promo code's minimum were rejected, as they should be")
+    print(f"orders: {orders}")
+    for name, example in props.failures.items():
+        print(f"FAIL {name}: {example!r}"[:2000])
+    return 1 if props.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
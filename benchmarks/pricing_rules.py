@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Pricing rules at checkout: what evaluating a large rule set costs per order.
+
+Stores a rule set with --zones delivery zones, --promos promo codes and
+--surcharges time-of-day surcharges in a throwaway database, then prices a
+five-line cart --repeat times (random zone, promo code and time of day)
+three ways:
+
+  default     the default rules (flat fee, free delivery from a subtotal)
+  compiled    the stored rules through pricing_rules.get(db) + price_cart,
+              as quote_cart and create_order do
+  scan        the same rules interpreted on every call: zones, promo codes
+              and surcharges searched in the lists as the admin wrote them
+
+Prints microseconds per cart and the SQL statements the compiled path ran:
+one reload after the rules are saved, then none. Also saves a promo code
+whose expiry has a UTC offset (as an admin may send it) and prices with it
+just before and after that instant. Exits 1 if the compiled and scanned
+totals disagree, a priced cart ran a query, or the offset expiry is not
+honoured.
+
+    python benchmarks/pricing_rules.py --zones 200 --promos 5000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, time as dtime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.money import percent_of  # noqa: E402  (no database import: DATABASE_URL is set in main)
+
+
+def _rules(zones: int, promos: int, surcharges: int):
+    from app import schemas
+
+    # Amounts in rubles, as an admin sends them
+    return schemas.PricingRules(
+        zones=[schemas.DeliveryZoneRule(name=f"Зона {i}", fee=200 + i % 500, free_from=1000 + i * 10 if i % 3 else None)
+               for i in range(zones)],
+        surcharges=[
+            schemas.SurchargeRule(name=f"Час {i}", starts=dtime(i % 24, 0), ends=dtime((i + 2) % 24, 30),
+                                  amount=10 + i, delivery_only=i % 2 == 0)
+            for i in range(surcharges)
+        ],
+        promo_codes=[
+            schemas.PromoCodeRule(code=f"PROMO{i}", percent_off=i % 30, amount_off=i % 50,
+                                  free_delivery=i % 7 == 0, min_subtotal=i % 400)
+            for i in range(promos)
+        ],
+    )
+
+
+def _scan(rules, delivery_type: str, subtotal: int, zone, promo_code, at: datetime):
+    """The rules evaluated straight from the lists, no compiled tables."""
+    discount, free_delivery = 0, False
+    if promo_code:
+        promo = next(p for p in rules.promo_codes if p.code.upper() == promo_code.upper())
+        discount = min(subtotal, percent_of(subtotal, promo.percent_off) + promo.amount_off)
+        free_delivery = promo.free_delivery
+    delivery_cost = 0
+    if delivery_type == "delivery":
+        fee, free_from = rules.delivery_fee, rules.free_delivery_from
+        for candidate in rules.zones:
+            if candidate.name == zone:
+                fee, free_from = candidate.fee, candidate.free_from
+        free = free_delivery or (free_from is not None and subtotal - discount >= free_from)
+        delivery_cost = 0 if free else fee
+    surcharge = 0
+    minute = at.hour * 60 + at.minute
+    for rule in rules.surcharges:
+        if rule.delivery_only and delivery_type != "delivery":
+            continue
+        start = rule.starts.hour * 60 + rule.starts.minute
+        end = rule.ends.hour * 60 + rule.ends.minute
+        if (start <= minute < end) if end > start else (minute >= start or minute < end):
+            surcharge += rule.amount
+    return subtotal - discount + delivery_cost + surcharge
+
+
+def _aware_expiry(db) -> list:
+    """Problems pricing with a promo code saved with ``valid_until`` in UTC ("...Z")."""
+    from app.pricing import PricingEngine, PricingError, load_rules, save_rules
+    from app.schemas import PricingRules
+    from app.slots import slot_schedule
+
+    expires = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    save_rules(db, PricingRules.model_validate(
+        {"promo_codes": [{"code": "UTC", "amount_off": 10, "valid_until": "2030-01-01T00:00:00Z"}]}))
+    engine = PricingEngine(load_rules(db))
+    db.rollback()
+    local = slot_schedule.local(expires)
+    problems = []
+    for now, expired in ((local - timedelta(minutes=1), False), (local + timedelta(minutes=1), True)):
+        try:
+            engine.adjust("pickup", 100000, promo_code="utc", now=now)
+            if expired:
+                problems.append(f"accepted at {now} after it expired at {local}")
+        except PricingError:
+            if not expired:
+                problems.append(f"rejected at {now} before it expired at {local}")
+        except TypeError as e:
+            problems.append(f"{type(e).__name__}: {e}")
+            break
+    return problems
+
+
+def _time(fn, carts, rounds: int = 5) -> float:
+    """Median seconds per cart over ``rounds`` passes."""
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for cart in carts:
+            fn(*cart)
+        samples.append((time.perf_counter() - started) / len(carts))
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zones", type=int, default=200)
+    parser.add_argument("--promos", type=int, default=5000)
+    parser.add_argument("--surcharges", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=20000, help="carts priced per pass")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-pricing-"))
+    # No reloads by age (PRICING_CACHE_MAX_AGE): statements counted are those a rules change causes
+    os.environ.update(DATABASE_URL=f"sqlite:///{(workdir / 'pricing.db').as_posix()}", LOG_LEVEL="ERROR",
+                      PRICING_CACHE_MAX_AGE="0")
+
+    from sqlalchemy import event
+
+    from app import catalog
+    from app.database import Base, SessionLocal, engine
+    from app.pricing import PricedProduct, PricingEngine, price_cart, pricing_rules, save_rules
+    from app.schemas import OrderItemCreate, PricingRules
+
+    Base.metadata.create_all(bind=engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    rules = _rules(args.zones, args.promos, args.surcharges)
+    started = time.perf_counter()
+    PricingEngine(rules)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    prices = {i: PricedProduct(f"Товар {i}", 5000 + i * 790) for i in range(1, 21)}  # kopecks
+    rng = random.Random(1)
+    today = datetime.combine(datetime.utcnow().date(), dtime())
+    carts = []
+    for _ in range(args.repeat):
+        items = [OrderItemCreate(product_id=rng.randint(1, 20), quantity=rng.randint(1, 3)) for _ in range(5)]
+        delivery_type = "delivery" if rng.random() < 0.8 else "pickup"
+        zone = f"Зона {rng.randrange(args.zones)}" if args.zones and rng.random() < 0.9 else None
+        promo = f"promo{rng.randrange(args.promos)}" if args.promos and rng.random() < 0.3 else None
+        at = today + timedelta(minutes=rng.randrange(24 * 60))
+        carts.append((items, delivery_type, zone, promo, at))
+    # Promo codes whose minimum the cart misses are rejected; keep valid carts only
+    minimums = {promo.code.upper(): promo.min_subtotal for promo in rules.promo_codes}
+    valid = []
+    for items, delivery_type, zone, promo, at in carts:
+        subtotal = sum(prices[item.product_id].price * item.quantity for item in items)
+        if promo is None or subtotal >= minimums[promo.upper()]:
+            valid.append((items, delivery_type, zone, promo, at))
+    carts = valid
+
+    default_engine = PricingEngine(PricingRules())
+    db = SessionLocal()
+    try:
+        save_rules(db, rules)
+        db.commit()
+        catalog.bump_version()
+        del statements[:]
+        pricing_rules.get(db)  # the first checkout after a change recompiles
+        reload_statements = len(statements)
+
+        default = _time(lambda items, delivery_type, zone, promo, at: price_cart(
+            items, delivery_type, prices, default_engine, None, None, at), carts)
+        del statements[:]
+        compiled = _time(lambda items, delivery_type, zone, promo, at: price_cart(
+            items, delivery_type, prices, pricing_rules.get(db), zone, promo, at), carts)
+        checkout_statements = len(statements)
+
+        def scan(items, delivery_type, zone, promo, at):
+            subtotal = sum(prices[item.product_id].price * item.quantity for item in items)
+            return _scan(rules, delivery_type, subtotal, zone, promo, at)
+
+        scanned = _time(scan, carts)
+        mismatches = sum(
+            1 for cart in carts
+            if price_cart(cart[0], cart[1], prices, pricing_rules.get(db), *cart[2:]).total_amount != scan(*cart)
+        )
+        expiry_problems = _aware_expiry(db)
+    finally:
+        db.close()
+
+    print(f"{args.zones} zones, {args.promos} promo codes, {args.surcharges} surcharges; "
+          f"compiled in {compile_ms:.1f} ms with {reload_statements} SQL statement(s) to load")
+    print(f"{len(carts)} carts of 5 lines:")
+    print(f"  default rules   {default * 1e6:8.2f} us/cart")
+    print(f"  compiled rules  {compiled * 1e6:8.2f} us/cart  ({(compiled - default) * 1e6:+.2f} us, "
+          f"{checkout_statements} SQL statements over all carts)")
+    print(f"  scanned rules   {scanned * 1e6:8.2f} us/cart")
+    print(f"promo code expiring at 2030-01-01T00:00:00Z: {'; '.join(expiry_problems) or 'ok'}")
+    if mismatches:
+        print(f"FAIL {mismatches} carts priced differently by the compiled and scanned rules")
+    if checkout_statements:
+        print(f"FAIL pricing ran {checkout_statements} SQL statements with unchanged rules")
+    if expiry_problems:
+        print("FAIL a promo code expiry with a UTC offset was not honoured")
+    return 1 if mismatches or checkout_statements or expiry_problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
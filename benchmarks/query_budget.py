@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+SQL query budget check: every @query_budget route within its budget, no N+1.
+
+Runs main:app in-process (TestClient) on a throwaway database with
+SQL_BUDGET_MODE=raise and a fake YooKassa server, makes the user several
+orders so that per-order lazy loads would show up as repeated statements,
+then calls each budgeted route. Prints statements per route and fails
+(exit code 1) on a budget overrun or a statement repeated
+SQL_N_PLUS_ONE_THRESHOLD times.
+
+    python benchmarks/query_budget.py --orders 5
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+USER_ID = 777
+ADMIN_ID = 42
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_fake_yookassa(port: int):
+    import uvicorn
+
+    from fake_yookassa import FakeYooKassa, create_app
+
+    fake = FakeYooKassa()
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), port=port, log_level="warning"))
+    thread = threading.Thread(target=lambda: asyncio.run(server.serve()), daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return fake, server, thread
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=5, help="orders the user has before history is read")
+    args = parser.parse_args()
+
+    yookassa_port = _free_port()
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-querybudget-"))
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{(workdir / 'budget.db').as_posix()}",
+        SQL_BUDGET_MODE="raise",
+        SQL_DEBUG_HEADER="1",
+        BOT_TOKEN="",
+        ADMIN_USER_ID=str(ADMIN_ID),
+        AUTH_ALLOW_TELEGRAM_ID_HEADER="1",
+        RATE_LIMIT_ENABLED="0",
+        YOOKASSA_API_URL=f"http://127.0.0.1:{yookassa_port}/v3",
+        YOOKASSA_SHOP_ID="100500",
+        YOOKASSA_SECRET_KEY="test_budget",
+        LOG_LEVEL="ERROR",
+    )
+    os.chdir(ROOT)  # templates/ is resolved relative to the working directory
+
+    from fastapi.testclient import TestClient
+
+    import main as app_main
+    from app.querybudget import QueryBudgetExceeded
+
+    fake, server, thread = _start_fake_yookassa(yookassa_port)
+    user = {"X-Telegram-Id": str(USER_ID)}
+    admin = {"X-Telegram-Id": str(ADMIN_ID)}
+    rows, failures = [], []
+
+    with TestClient(app_main.app) as client:
+        def call(method: str, url: str, headers=None, **kwargs):
+            try:
+                response = client.request(method, url, headers=headers or {}, **kwargs)
+            except QueryBudgetExceeded as e:
+                failures.append(str(e))
+                rows.append((f"{method} {url}", "-", "-", "over"))
+                return None
+            rows.append((f"{method} {url}", response.headers.get("x-sql-queries", "?"),
+                         response.headers.get("x-sql-repeated", "0"), response.headers.get("x-sql-budget", "-")))
+            if response.status_code >= 400:
+                failures.append(f"{method} {url}: HTTP {response.status_code} {response.text[:200]}")
+            return response
+
+        product_ids = []
+        for i in range(6):
+            response = call("POST", "/api/admin/products", admin, json={"title": f"Товар {i}", "price": 100 + i})
+            if response is not None and response.status_code == 200:
+                product_ids.append(response.json()["id"])
+
+        items = [{"product_id": product_id, "quantity": 2} for product_id in product_ids[:4]]
+        response = call("GET", "/api/slots")
+        slot = response.json()[0]["starts_at"] if response is not None and response.status_code == 200 else None
+        order_ids = []
+        for i in range(args.orders):
+            response = call("POST", "/api/orders/", user, json={
+                "customer_name": "Budget Check", "customer_phone": "+70000000000",
+                "delivery_type": "pickup", "payment_type": "online" if i == 0 else "cash", "items": items,
+                "delivery_slot": slot,
+            })
+            if response is not None and response.status_code == 200:
+                order_ids.append(response.json()["id"])
+        if len(product_ids) < 6 or not order_ids:
+            for failure in failures:
+                print(f"FAIL {failure}")
+            return 1
+
+        call("GET", "/")
+        call("GET", "/api/products")
+        call("GET", f"/api/products/{product_ids[0]}")
+        # New pricing rules: the next quote recompiles them (and reloads prices)
+        call("PUT", "/api/admin/pricing-rules", admin, json={
+            "zones": [{"name": "Центр", "fee": 300, "free_from": 1000}],
+            "surcharges": [{"name": "Ночь", "starts": "22:00", "ends": "06:00", "amount": 150}],
+            "promo_codes": [{"code": "BUDGET", "percent_off": 10}],
+        })
+        call("POST", "/api/orders/quote", json={"delivery_type": "delivery", "items": items,
+                                                "delivery_zone": "Центр", "promo_code": "budget"})
+        call("GET", "/api/delivery-zones")
+        call("GET", "/api/orders/", user)
+        call("GET", f"/api/orders/{order_ids[0]}", user)
+        response = call("POST", f"/api/orders/{order_ids[0]}/payment", user, json={"order_id": order_ids[0]})
+        if response is not None and response.status_code == 200:
+            notification = fake.set_status(response.json()["payment_id"], "succeeded")
+            call("POST", "/api/orders/webhook/payment", json=notification)
+        call("GET", "/api/admin/orders", admin)
+        call("GET", "/api/admin/orders/summary", admin)
+
+    server.should_exit = True
+    thread.join()
+
+    print(f"{'request':40} {'queries':>8} {'repeated':>9} {'budget':>7}")
+    seen = set()
+    for name, queries, repeated, budget in rows:
+        if name in seen:
+            continue
+        seen.add(name)
+        print(f"{name:40} {queries:>8} {repeated:>9} {budget:>7}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
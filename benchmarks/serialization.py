@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Response serialization cost: FastAPI's response_model path vs the fast paths
+in app/serialization.py.
+
+Seeds a throwaway database with --products products and one user with
+--orders orders (--items items each), then for GET /api/products and
+GET /api/orders/ times:
+
+  response_model   ORM query, FastAPI validation with from_attributes,
+                   jsonable output, JSONResponse (json.dumps); what the
+                   routes did before
+  TypeAdapter      ORM query, precompiled adapter, dump_json to bytes
+  rows + stdlib    column query to dicts, json.dumps (no orjson installed)
+  rows + FastJSONResponse
+                   column query to dicts, orjson; what the routes do now
+
+All variants must produce the same JSON, which is checked first.
+
+    python benchmarks/serialization.py --products 1000 --orders 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+USER_ID = 777
+
+
+def _seed(db, products: int, orders: int, items: int) -> None:
+    from sqlalchemy import insert
+
+    from app import models
+
+    now = datetime.utcnow()
+    db.execute(insert(models.Product), [
+        {
+            "title": f"Товар {i}",
+            "description": "Свежая выпечка, пшеничная мука высшего сорта, сливочное масло",
+            "price": random.randint(50, 900) * 100,  # kopecks
+            "image": f"/static/uploads/product-{i}.jpg",
+            "created_at": now - timedelta(minutes=i, microseconds=random.randint(0, 999999)),
+        }
+        for i in range(products)
+    ])
+    db.execute(insert(models.Order), [
+        {
+            "telegram_user_id": USER_ID,
+            "customer_name": "Иван Петров",
+            "customer_phone": "+79991234567",
+            "customer_address": "ул. Ленина, 1, кв. 2",
+            "delivery_type": models.DeliveryType.DELIVERY,
+            "payment_type": models.PaymentType.CASH,
+            "comment": "Позвонить за час",
+            "subtotal": 100000,
+            "delivery_cost": 0,
+            "total_amount": 100000,
+            "status": models.OrderStatus.COMPLETED,
+            "created_at": now - timedelta(hours=i),
+            "updated_at": now - timedelta(hours=i),
+        }
+        for i in range(orders)
+    ])
+    db.execute(insert(models.OrderItem), [
+        {
+            "order_id": order_id,
+            "product_id": 1 + (order_id * items + n) % products,
+            "product_name": f"Товар {n}",
+            "product_price": 25000,
+            "quantity": 1 + n,
+        }
+        for order_id in range(1, orders + 1)
+        for n in range(items)
+    ])
+    db.commit()
+
+
+def best_ms(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--items", type=int, default=3, help="items per order")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-serialization-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{(workdir / 'bench.db').as_posix()}"
+
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from pydantic import TypeAdapter
+    from sqlalchemy.orm import selectinload
+
+    from app import models, schemas, serialization
+    from app.database import Base, SessionLocal, engine
+    from app.routes import orders as order_routes, public as public_routes
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    _seed(db, args.products, args.orders, args.items)
+
+    def response_field(router, path):
+        return next(route.response_field for route in router.routes if route.path == path and "GET" in route.methods)
+
+    product_list = TypeAdapter(List[schemas.ProductOut])
+    order_list = TypeAdapter(List[schemas.OrderOut])
+    cases = {
+        f"GET /api/products ({args.products} products)": dict(
+            field=response_field(public_routes.router, "/api/products"),
+            adapter=product_list,
+            orm=lambda: db.query(models.Product).order_by(models.Product.created_at.desc()).all(),
+            rows=lambda: serialization.rows(
+                db, serialization.select_products().order_by(models.Product.created_at.desc())),
+        ),
+        f"GET /api/orders/ ({args.orders} orders x {args.items} items)": dict(
+            field=response_field(order_routes.router, "/api/orders/"),
+            adapter=order_list,
+            orm=lambda: db.query(models.Order).options(selectinload(models.Order.items))
+            .filter(models.Order.telegram_user_id == USER_ID).order_by(models.Order.created_at.desc()).all(),
+            rows=lambda: serialization.orders_with_items(
+                db, serialization.select_orders().where(models.Order.telegram_user_id == USER_ID)
+                .order_by(models.Order.created_at.desc())),
+        ),
+    }
+
+    loop = asyncio.new_event_loop()
+    encoder = "orjson" if serialization.orjson is not None else "stdlib json (orjson not installed)"
+    print(f"fast path encoder: {encoder}\n")
+    print(f"{'':52} {'load ms':>8} {'serialize ms':>13} {'total ms':>9}")
+    ok = True
+    for name, case in cases.items():
+        def default_serialize(objects):
+            content = loop.run_until_complete(serialize_response(field=case["field"], response_content=objects))
+            return JSONResponse(content).body
+
+        def stdlib_dumps(data):
+            return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=serialization._default).encode()
+
+        def session_reset():
+            db.expire_all()
+            db.expunge_all()
+
+        variants = [
+            ("response_model", case["orm"], default_serialize),
+            ("TypeAdapter", case["orm"], lambda objects: serialization.model_json(case["adapter"], objects)),
+            ("rows + stdlib", case["rows"], stdlib_dumps),
+            ("rows + FastJSONResponse", case["rows"], lambda data: serialization.FastJSONResponse(data).body),
+        ]
+
+        reference = None
+        print(name)
+        for label, load, serialize in variants:
+            session_reset()
+            data = load()
+            body = serialize(data)
+            decoded = json.loads(body)
+            if reference is None:
+                reference = decoded
+            elif decoded != reference:
+                print(f"  {label}: output differs from response_model")
+                ok = False
+
+            def load_only():
+                session_reset()
+                load()
+
+            load_ms = best_ms(load_only, args.repeat)
+            data = load()
+            serialize_ms = best_ms(lambda: serialize(data), args.repeat)
+            print(f"  {label:50} {load_ms:8.2f} {serialize_ms:13.2f} {load_ms + serialize_ms:9.2f}")
+        print()
+
+    db.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Single-flight and stale-while-revalidate for the catalog reads: SQL work
+and reader latency when hundreds of requests hit a cold or stale cache.
+
+Seeds a throwaway database with --products products and makes every SQL
+statement --query-delay seconds slower (a loaded database). Then, for the
+product list (GET /api/products) and the index page (GET /), --readers
+threads start at the same moment:
+
+  uncached  every reader runs the query itself (the code before the cache)
+  cold      empty cache: one reader builds, the others wait for its result
+  stale     after a catalog bump: everyone gets the previous copy at once,
+            one background refresh runs
+
+Prints SQL statements (readers + background refresh), wall time, slowest
+reader and the cache_lookups_total outcomes per scenario. Exits 1 if a cold
+or stale cache ran more than one build, or a stale reader waited for the
+refresh.
+
+    python benchmarks/singleflight.py --readers 200 --query-delay 0.05
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+OUTCOMES = ("fresh", "stale", "miss", "coalesced")
+
+
+def _seed(products: int) -> None:
+    from sqlalchemy import insert
+
+    from app import models
+    from app.database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product), [
+            {"title": f"Товар {i}", "description": "Описание " * 10, "price": 10000 + i * 100, "image": "", "stock": 50}
+            for i in range(products)
+        ])
+
+
+def _lookups(name: str) -> dict:
+    from prometheus_client import REGISTRY
+
+    return {
+        outcome: REGISTRY.get_sample_value("cache_lookups_total", {"cache": name, "outcome": outcome}) or 0
+        for outcome in OUTCOMES
+    }
+
+
+def _readers(count: int, read) -> tuple:
+    """Run ``read(db)`` in ``count`` threads released together; (wall, slowest reader)."""
+    from app.database import SessionLocal
+
+    barrier = threading.Barrier(count + 1)
+    latencies = []
+
+    def reader():
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            started = time.perf_counter()
+            read(db)
+            latencies.append(time.perf_counter() - started)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, max(latencies)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=200, help="concurrent requests per scenario")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--query-delay", type=float, default=0.05, help="seconds added to every SQL statement")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-singleflight-"))
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{(workdir / 'singleflight.db').as_posix()}",
+        BOT_TOKEN="",
+        LOG_LEVEL="ERROR",
+        CACHE_BACKEND="memory",
+    )
+    os.chdir(ROOT)  # templates/ is resolved relative to the working directory
+
+    from sqlalchemy import event
+
+    import main as app_main
+    from app import catalog
+    from app.database import engine
+    from app.routes import public
+
+    _seed(args.products)
+    statements = {"readers": 0, "refresh": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def slow_statement(conn, cursor, statement, parameters, context, executemany):
+        background = threading.current_thread().name.startswith("refresh-")
+        statements["refresh" if background else "readers"] += 1
+        time.sleep(args.query_delay)
+
+    index_cache = app_main.index_page._cache
+    targets = [
+        ("GET /api/products", public.product_list, public._render_products, lambda: None),
+        ("GET /", index_cache, index_cache.load, lambda: setattr(app_main.index_page, "_page", None)),
+    ]
+    failures = []
+    print(f"{args.readers} readers, {args.products} products, +{args.query_delay * 1000:.0f} ms per statement")
+    print(f"{'request':18} {'scenario':9} {'statements':>10} {'wall ms':>8} {'slowest ms':>10}  lookups")
+    for label, swr, load, reset_page in targets:
+        def run(scenario, read, settle=None):
+            before, lookups_before = dict(statements), _lookups(swr.name)
+            wall, slowest = _readers(args.readers, read)
+            if settle is not None:
+                settle()
+            ran = statements["readers"] - before["readers"]
+            refreshed = statements["refresh"] - before["refresh"]
+            lookups = {k: int(v - lookups_before[k]) for k, v in _lookups(swr.name).items() if v - lookups_before[k]}
+            shown = f"{ran}+{refreshed}" if refreshed else str(ran)
+            print(f"{label:18} {scenario:9} {shown:>10} {wall * 1000:>8.1f} {slowest * 1000:>10.1f}  {lookups}")
+            return ran, slowest, refreshed
+
+        per_build, _, _ = run("uncached", load)
+        per_build //= args.readers
+
+        swr._entry = None
+        reset_page()
+        ran, _, _ = run("cold", swr.get)
+        if ran > per_build:
+            failures.append(f"{label}: cold cache ran {ran} statements, one build is {per_build}")
+
+        def wait_refreshed():
+            # The refresh thread holds the lock until it has stored the new value
+            with swr._refreshing:
+                pass
+
+        catalog.bump_version()
+        ran, slowest, refreshed = run("stale", swr.get, settle=wait_refreshed)
+        if ran:
+            failures.append(f"{label}: stale readers ran {ran} statements themselves")
+        if slowest >= args.query_delay:
+            failures.append(f"{label}: a stale reader waited {slowest * 1000:.1f} ms for the refresh")
+        if refreshed != per_build:
+            failures.append(f"{label}: the refresh ran {refreshed} statements, one build is {per_build}")
+        if swr._entry[0] != swr._key():
+            failures.append(f"{label}: the background refresh did not store the new version")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Slot availability with months of future bookings: the in-memory capacity
+index against counting orders per slot on every request.
+
+Seeds a throwaway database with --days days of booked slots (every slot of
+every day, --orders-per-slot orders each, plus the delivery_slots counters
+checkout maintains), then times GET /api/slots' work both ways:
+
+  index     slot_index.availability(): one dict lookup per bookable slot
+  count     the same answer from SELECT delivery_slot, COUNT(*) FROM orders
+            GROUP BY delivery_slot over the future orders
+
+Run it with growing --days: the index stays flat, the count grows with the
+bookings. Exits 1 if the two disagree.
+
+    python benchmarks/slot_availability.py --days 90
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _seed(days: int, orders_per_slot: int) -> int:
+    from sqlalchemy import insert
+
+    from app import models
+    from app.database import Base, engine
+    from app.slots import slot_schedule
+
+    Base.metadata.create_all(bind=engine)
+    today = slot_schedule.now().date()
+    starts = [s for day in range(days) for s in slot_schedule.starts(today + timedelta(days=day))]
+    with engine.begin() as conn:
+        conn.execute(insert(models.DeliverySlot), [{"starts_at": s, "booked": orders_per_slot} for s in starts])
+        conn.execute(insert(models.Order), [
+            {
+                "telegram_user_id": 7, "customer_name": "Slot Check", "customer_phone": "+70000000000",
+                "delivery_type": models.DeliveryType.PICKUP, "payment_type": models.PaymentType.CASH,
+                "subtotal": 10000, "delivery_cost": 0, "total_amount": 10000,
+                "status": models.OrderStatus.PENDING, "stock_reserved": True, "delivery_slot": s,
+                "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+            }
+            for s in starts for _ in range(orders_per_slot)
+        ])
+    return len(starts)
+
+
+def _count_availability(db):
+    """The same answer without the index: count the reserved orders per slot."""
+    from sqlalchemy import func, select
+
+    from app import models
+    from app.slots import NO_BOOKINGS, SlotBookings, slot_out, slot_schedule
+
+    since = datetime.combine(slot_schedule.now().date(), datetime.min.time())
+    booked = dict(db.execute(
+        select(models.Order.delivery_slot, func.count())
+        .where(models.Order.delivery_slot >= since, models.Order.stock_reserved.is_(True))
+        .group_by(models.Order.delivery_slot)
+    ).all())
+    return [
+        slot_out(starts_at, SlotBookings(booked[starts_at], None) if starts_at in booked else NO_BOOKINGS)
+        for starts_at in slot_schedule.upcoming()
+    ]
+
+
+def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=90, help="days of future bookings")
+    parser.add_argument("--orders-per-slot", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-slots-"))
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{(workdir / 'slots.db').as_posix()}",
+        SLOT_CAPACITY=str(args.orders_per_slot * 2),
+        LOG_LEVEL="ERROR",
+    )
+
+    from app.database import SessionLocal
+    from app.slots import slot_index, slot_schedule
+
+    slots = _seed(args.days, args.orders_per_slot)
+    db = SessionLocal()
+    try:
+        slot_index.availability(db)  # build the index once, as the first request would
+        indexed = _time(lambda: slot_index.availability(db), args.repeat)
+        counted = _time(lambda: _count_availability(db), args.repeat)
+        same = slot_index.availability(db) == _count_availability(db)
+    finally:
+        db.close()
+
+    bookable = len(slot_schedule.upcoming())
+    print(f"{args.days} days booked ({slots} slots, {slots * args.orders_per_slot} orders), "
+          f"{bookable} bookable slots shown")
+    print(f"index: {indexed * 1000:.3f} ms   count: {counted * 1000:.3f} ms   "
+          f"({counted / indexed:.0f}x)   same answer: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Checkout contention on a hot product with limited stock.
+
+Starts main:app under uvicorn (--workers processes) against a throwaway
+database with two products:
+
+  hot        stock = --stock, every checkout buys it
+  untracked  stock NULL (never sells out), the baseline for throughput
+
+After --warmup unmeasured checkouts (the workers need several hundred
+requests before their throughput settles), runs --checkouts concurrent
+checkouts (--concurrency in flight, each a separate Telegram user,
+1..--max-quantity units) against each product, then cancels every hot order
+through the admin bulk endpoint, twice in parallel.
+
+Checks, and exits 1 if any fails:
+
+  - no oversell: units sold equal the stock taken, stock never below zero,
+    and with more demand than stock the product sells out exactly;
+  - rejected checkouts get 409, never 500 or a timeout;
+  - cancelling returns exactly the sold units, once.
+
+Prints throughput and p50/p95/p99 latency for both products.
+
+    python benchmarks/stock_contention.py --workers 4 --checkouts 600 --stock 200
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from loadtest import ADMIN_ID, BOT_TOKEN, _free_port, _wait_healthy, percentile  # noqa: E402
+
+
+def _seed(database_url: str, stock: int):
+    from sqlalchemy import create_engine, insert, select
+
+    from app import models
+    from app.database import Base
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product), [
+            {"title": "Горячий товар", "description": "", "price": 30000, "image": "", "stock": stock},
+            {"title": "Товар без учёта", "description": "", "price": 30000, "image": "", "stock": None},
+        ])
+        hot, untracked = conn.execute(select(models.Product.id).order_by(models.Product.id)).scalars()
+    engine.dispose()
+    return hot, untracked
+
+
+def _stock(database_url: str, product_id: int):
+    from sqlalchemy import create_engine, select
+
+    from app import models
+
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        value = conn.execute(select(models.Product.stock).where(models.Product.id == product_id)).scalar_one()
+    engine.dispose()
+    return value
+
+
+async def checkouts(client, product_id: int, args, first_user: int):
+    """Run args.checkouts concurrent checkouts; returns (elapsed, results)."""
+    from auth import sign_init_data
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    async def checkout(user_id: int):
+        quantity = random.randint(1, args.max_quantity)
+        body = {
+            "customer_name": "Load Test",
+            "customer_phone": "+70000000000",
+            "delivery_type": "pickup",
+            "payment_type": "online",
+            "items": [{"product_id": product_id, "quantity": quantity}],
+        }
+        headers = {"X-Telegram-Init-Data": sign_init_data(BOT_TOKEN, user_id, int(time.time()))}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/orders/", json=body, headers=headers)
+                outcome = str(response.status_code)
+                order_id = response.json()["id"] if response.status_code == 200 else None
+            except Exception as e:
+                outcome, order_id = type(e).__name__, None
+            results.append((outcome, time.perf_counter() - started, quantity, order_id))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(checkout(first_user + i) for i in range(args.checkouts)))
+    return time.perf_counter() - started, results
+
+
+def report(name: str, elapsed: float, results) -> None:
+    latencies = sorted(latency for _, latency, _, _ in results)
+    statuses = Counter(outcome for outcome, _, _, _ in results)
+    print(f"{name:12} {len(results) / elapsed:8.1f} {percentile(latencies, 50) * 1000:8.1f} "
+          f"{percentile(latencies, 95) * 1000:8.1f} {percentile(latencies, 99) * 1000:8.1f}  "
+          f"{dict(sorted(statuses.items()))}")
+
+
+async def run(args) -> int:
+    import httpx
+
+    workdir = Path(tempfile.mkdtemp(prefix="fastteleap-stock-"))
+    database_url = f"sqlite:///{(workdir / 'stock.db').as_posix()}"
+    hot, untracked = _seed(database_url, args.stock)
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        BOT_TOKEN=BOT_TOKEN,
+        ADMIN_USER_ID=str(ADMIN_ID),
+        RATE_LIMIT_ENABLED="0",
+        LOG_LEVEL="WARNING",
+        BOT_MODE="polling",
+    )
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    log_path = workdir / "app.log"
+    with open(log_path, "w") as log_file:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+            cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+        )
+
+    failures: List[str] = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60.0) as client:
+            await _wait_healthy(client, process)
+            # Warm every worker up (imports, first queries) before measuring
+            await checkouts(client, untracked, argparse.Namespace(**{**vars(args), "checkouts": args.warmup}), 6_000_000)
+            hot_elapsed, hot_results = await checkouts(client, hot, args, 7_000_000)
+            base_elapsed, base_results = await checkouts(client, untracked, args, 8_000_000)
+
+            print(f"{'product':12} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+            report("hot", hot_elapsed, hot_results)
+            report("untracked", base_elapsed, base_results)
+
+            sold = sum(quantity for outcome, _, quantity, _ in hot_results if outcome == "200")
+            left = _stock(database_url, hot)
+            print(f"\nhot product: stock {args.stock}, sold {sold}, left {left}")
+            if left is None or left < 0 or sold + left != args.stock:
+                failures.append(f"oversell or lost stock: sold {sold} + left {left} != {args.stock}")
+            demand = sum(quantity for _, _, quantity, _ in hot_results)
+            if demand >= args.stock + args.max_quantity and left >= args.max_quantity:
+                failures.append(f"{left} units left although demand ({demand}) exceeded the stock")
+            for name, results, allowed in (("hot", hot_results, {"200", "409"}), ("untracked", base_results, {"200"})):
+                unexpected = Counter(outcome for outcome, _, _, _ in results if outcome not in allowed)
+                if unexpected:
+                    failures.append(f"{name}: unexpected outcomes {dict(unexpected)}")
+
+            # Cancel every hot order twice in parallel: stock must come back exactly once
+            from auth import sign_init_data
+
+            order_ids = [order_id for outcome, _, _, order_id in hot_results if outcome == "200"]
+            admin = {"X-Telegram-Init-Data": sign_init_data(BOT_TOKEN, ADMIN_ID, int(time.time()))}
+            body = {"order_ids": order_ids, "status": "cancelled"}
+            responses = await asyncio.gather(*(
+                client.post("/api/admin/orders/status", json=body, headers=admin) for _ in range(2 if order_ids else 0)
+            ))
+            if any(response.status_code != 200 for response in responses):
+                failures.append(f"bulk cancel failed: {[response.status_code for response in responses]}")
+            restored = _stock(database_url, hot)
+            print(f"after cancelling {len(order_ids)} orders: stock {restored}")
+            if order_ids and restored != args.stock:
+                failures.append(f"stock after cancelling everything is {restored}, expected {args.stock}")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        print(f"app log: {log_path}")
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    parser.add_argument("--checkouts", type=int, default=400, help="checkouts per product")
+    parser.add_argument("--concurrency", type=int, default=100, help="checkouts in flight")
+    parser.add_argument("--stock", type=int, default=150, help="initial stock of the hot product")
+    parser.add_argument("--max-quantity", type=int, default=2, help="units per checkout, 1..N")
+    parser.add_argument("--warmup", type=int, default=1000, help="unmeasured checkouts first")
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
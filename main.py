@@ -1,32 +1,113 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+import asyncio
+import hmac
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, status
+from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
+from typing import Optional
+from sqlalchemy.orm import Session
 
 try:
     # If running from inside test_app directory: uvicorn main:app --reload
-    from app.database import Base, engine
+    from app.assets import AssetManifest, HashedStaticFiles, asset_response
+    from app.broadcast import broadcast_manager
+    from app.cache import catalog_sync
+    from app.database import get_db, prepare_schema
+    from app.inventory import reservation_sweeper
+    from app.maintenance import maintenance_scheduler
+    from app.notifications import admin_notifier
+    from app.logs import RequestIdMiddleware, setup_logging, shutdown_logging
+    from app.metrics import MetricsMiddleware, render_metrics
+    from app.querybudget import QueryBudgetMiddleware, query_budget
+    from app.ratelimit import RateLimitMiddleware
+    from app.pages import RenderedPage
     from app.routes import public as public_routes
     from app.routes import admin as admin_routes
     from app.routes import orders as orders_routes
+    from app.routes import telegram as telegram_routes
+    from app.settings import settings
+    from app.telegram import close_telegram_bot, get_telegram_bot, start_webhook, webhook_enabled
 except ImportError:
     # If running from project root: uvicorn test_app.main:app --reload
-    from test_app.app.database import Base, engine
+    from test_app.app.assets import AssetManifest, HashedStaticFiles, asset_response
+    from test_app.app.broadcast import broadcast_manager
+    from test_app.app.cache import catalog_sync
+    from test_app.app.database import get_db, prepare_schema
+    from test_app.app.inventory import reservation_sweeper
+    from test_app.app.maintenance import maintenance_scheduler
+    from test_app.app.notifications import admin_notifier
+    from test_app.app.logs import RequestIdMiddleware, setup_logging, shutdown_logging
+    from test_app.app.metrics import MetricsMiddleware, render_metrics
+    from test_app.app.querybudget import QueryBudgetMiddleware, query_budget
+    from test_app.app.ratelimit import RateLimitMiddleware
+    from test_app.app.pages import RenderedPage
     from test_app.app.routes import public as public_routes
     from test_app.app.routes import admin as admin_routes
     from test_app.app.routes import orders as orders_routes
+    from test_app.app.routes import telegram as telegram_routes
+    from test_app.app.settings import settings
+    from test_app.app.telegram import close_telegram_bot, get_telegram_bot, start_webhook, webhook_enabled
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-# Mount static using absolute path to ensure uploads are served in any CWD
 STATIC_DIR = Path(__file__).resolve().parent / "static"
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
-templates = Jinja2Templates(directory="templates")
+# Fingerprinted + precompressed script.js/style.css, built in lifespan
+asset_manifest = AssetManifest(STATIC_DIR)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # All startup side effects live here so that importing main stays cheap
+    setup_logging()
+    # Shared catalog version first: everything cached below is keyed on it
+    await catalog_sync.start()
+    prepare_schema()  # tables, new columns, indexes; workers starting together take turns
+    asset_manifest.build()
+
+    if webhook_enabled():
+        # Bot updates are served by this process; needs aiogram right away
+        try:
+            await start_webhook()
+        except Exception:
+            logger.exception("Failed to set Telegram webhook")
+    elif settings.bot_token:
+        # Import aiogram in the background; readiness does not wait for it
+        app.state.telegram_warmup = asyncio.create_task(asyncio.to_thread(get_telegram_bot))
+    else:
+        logger.warning("BOT_TOKEN is not configured in settings. Telegram notifications will not work.")
+
+    if settings.bot_token:
+        # Broadcasts interrupted by a restart continue where they stopped
+        broadcast_manager.start_resuming()
+
+    # Unpaid online orders give their reserved stock back after a timeout
+    reservation_sweeper.start()
+    # Backups, planner statistics, vacuum and integrity checks (one worker per task)
+    maintenance_scheduler.start()
+
+    yield
 
-# Create DB tables
-Base.metadata.create_all(bind=engine)
+    await reservation_sweeper.stop()
+    await maintenance_scheduler.stop()
+    await catalog_sync.stop()
+    await broadcast_manager.stop()
+    await admin_notifier.close()
+    await close_telegram_bot()
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Mount static using absolute path to ensure uploads are served in any CWD
+app.mount("/static", HashedStaticFiles(directory=str(STATIC_DIR), manifest=asset_manifest), name="static")
+templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = asset_manifest.url
+# index.html with config + first catalog page inlined, cached per catalog version
+index_page = RenderedPage(templates, "index.html")
 
 # CORS for Telegram Mini App and local dev
 origins = [
@@ -38,6 +119,14 @@ origins = [
     "http://127.0.0.1:5173",
 ]
 
+# Query budgets / N+1 detection; only wired in when enabled (development, checks)
+if settings.sql_budget_mode != "off" or settings.sql_debug_header:
+    app.add_middleware(QueryBudgetMiddleware)
+
+# Per-user/per-IP limits and in-flight caps for order and payment endpoints.
+# Added before CORS so that 429/503 answers still carry CORS headers.
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -45,16 +134,31 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost: latency includes every other middleware, rejections included
+app.add_middleware(MetricsMiddleware)
+# Outermost, so log lines from every middleware carry the request id
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(public_routes.router)
 app.include_router(admin_routes.router)
 app.include_router(orders_routes.router)
+app.include_router(telegram_routes.router)
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+@query_budget(1)
+def read_root(request: Request, db: Session = Depends(get_db)):
+    # The page references hashed asset URLs, so it must be revalidated itself
+    return asset_response(index_page.get(db), request.headers, request.method, "no-cache")
 
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(authorization: Optional[str] = Header(None)):
+    if settings.metrics_token and not hmac.compare_digest(authorization or "", f"Bearer {settings.metrics_token}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
@@ -3,12 +3,13 @@
 Скрипт для запуска FastAPI сервера и Telegram бота одновременно
 """
 
-import subprocess
+import argparse
 import sys
 import os
-import time
 from pathlib import Path
 
+from supervisor import Supervisor, default_workers
+
 
 def ensure_env_file():
     """Создаёт .env файл, если его нет, используя реальные ENV из Render"""
@@ -23,7 +24,9 @@ def ensure_env_file():
             "ADMIN_USER_ID",
             "WEB_APP_URL",
             "YOOKASSA_SHOP_ID",
-            "YOOKASSA_SECRET_KEY"
+            "YOOKASSA_SECRET_KEY",
+            "BOT_MODE",
+            "BOT_WEBHOOK_SECRET",
         ]
 
         with open(env_path, "w", encoding="utf-8") as f:
@@ -54,34 +57,20 @@ def check_env_file():
     return True
 
 
-def start_fastapi_server():
-    """Запускает FastAPI сервер"""
-    print("🚀 Запуск FastAPI сервера...")
-    try:
-        process = subprocess.Popen([
-            sys.executable, "-m", "uvicorn",
-            "main:app",
-            "--host", "0.0.0.0",
-            "--port", "8000"
-        ])
-        return process
-    except Exception as e:
-        print(f"❌ Ошибка запуска FastAPI сервера: {e}")
-        return None
-
-
-def start_telegram_bot():
-    """Запускает Telegram бота"""
-    print("🤖 Запуск Telegram бота...")
-    try:
-        process = subprocess.Popen([sys.executable, "bot.py"])
-        return process
-    except Exception as e:
-        print(f"❌ Ошибка запуска Telegram бота: {e}")
-        return None
+def parse_args():
+    parser = argparse.ArgumentParser(description="Запуск FastAPI воркеров и Telegram бота")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="число воркеров uvicorn (по умолчанию WEB_CONCURRENCY, иначе 1, "
+                             "а с CACHE_BACKEND=redis и RATE_LIMIT_BACKEND=redis — число CPU)")
+    parser.add_argument("--no-bot", action="store_true", help="не запускать bot.py")
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+
     print("Запуск Telegram Mini App с аутентификацией")
     print("=" * 50)
 
@@ -92,44 +81,22 @@ def main():
     if not check_env_file():
         return 1
 
-    # Запускаем FastAPI
-    fastapi_process = start_fastapi_server()
-    if not fastapi_process:
-        return 1
+    # В режиме webhook обновления бота принимает сам API, bot.py не нужен
+    from app.settings import settings
+    with_bot = not args.no_bot and settings.bot_mode != "webhook"
+    if settings.bot_mode == "webhook":
+        print("🤖 Telegram бот: режим webhook (внутри API)")
 
-    # Даем серверу стартовать
-    time.sleep(3)
-
-    # Запускаем Telegram бота
-    bot_process = start_telegram_bot()
-    if not bot_process:
-        fastapi_process.terminate()
-        return 1
+    # Супервизор сам дожидается /health воркеров, перезапускает упавшие процессы
+    # и корректно останавливает их по SIGTERM/Ctrl+C
+    supervisor = Supervisor("main:app", args.host, args.port, args.workers, with_bot=with_bot)
 
-    print("\n✅ Оба сервиса запущены успешно!")
-    print("🌐 FastAPI сервер: http://localhost:8000")
-    print("📱 Telegram бот: готов к работе")
-    print("📚 API документация: http://localhost:8000/docs")
+    print(f"🌐 FastAPI сервер: http://localhost:{args.port}")
+    print(f"📚 API документация: http://localhost:{args.port}/docs")
+    print("🔄 Rolling restart воркеров: kill -HUP <pid>")
     print("\n🛑 Для остановки нажмите Ctrl+C")
 
-    try:
-        while True:
-            if fastapi_process.poll() is not None:
-                print("❌ FastAPI сервер остановлен")
-                break
-            if bot_process.poll() is not None:
-                print("❌ Telegram бот остановлен")
-                break
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("\n🛑 Остановка сервисов...")
-        if fastapi_process:
-            fastapi_process.terminate()
-        if bot_process:
-            bot_process.terminate()
-        print("✅ Сервисы остановлены")
-
-    return 0
+    return supervisor.run()
 
 
 if __name__ == "__main__":
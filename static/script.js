@@ -26,7 +26,10 @@ applyTheme();
 // ==================== ADMIN DETECTION ====================
 let ADMIN_ID = null; // fetched from backend config
 const telegramUserId = tg?.initDataUnsafe?.user?.id || null;
+// Signed by Telegram; the server verifies it and takes the user id from it
+const telegramInitData = tg?.initData || '';
 let adminEnabled = false;
+let slotsRequired = false; // the order must name a delivery slot
 
 const applyAdminVisibility = () => {
     if (elements?.adminFab) {
@@ -34,19 +37,40 @@ const applyAdminVisibility = () => {
     }
 };
 
+const getAuthHeaders = () => ({
+    'X-Telegram-Init-Data': telegramInitData,
+    'X-Telegram-Id': String(telegramUserId || '')
+});
+
 const getAdminHeaders = () => ({
     'Content-Type': 'application/json',
-    'X-Telegram-Id': String(telegramUserId || '')
+    ...getAuthHeaders()
 });
 
+// Config and the first catalog page are inlined into index.html by the server
+const readBootstrapData = () => {
+    const el = document.getElementById('bootstrap-data');
+    if (!el) return null;
+    try {
+        return JSON.parse(el.textContent);
+    } catch (e) {
+        console.error('Bootstrap data parse error:', e);
+        return null;
+    }
+};
+
+const applyConfig = (data) => {
+    ADMIN_ID = Number(data?.admin_id ?? 0);
+    slotsRequired = Boolean(data?.slots_required);
+    adminEnabled = Boolean(telegramUserId) && Number(telegramUserId) === ADMIN_ID;
+    applyAdminVisibility();
+};
+
 async function loadConfig() {
     try {
         const res = await fetch('/api/config');
         if (!res.ok) throw new Error('Failed to load config');
-        const data = await res.json();
-        ADMIN_ID = Number(data?.admin_id ?? 0);
-        adminEnabled = Boolean(telegramUserId) && Number(telegramUserId) === ADMIN_ID;
-        applyAdminVisibility();
+        applyConfig(await res.json());
     } catch (e) {
         console.error('Config fetch error:', e);
         ADMIN_ID = null;
@@ -58,30 +82,36 @@ async function loadConfig() {
 // ==================== PRODUCTS DATA (fetched from backend) ====================
 let products = [];
 
-async function loadProducts() {
+// fresh: right after an admin edit, wait for the server to rebuild its
+// cached list instead of getting the previous copy while it refreshes
+// (the server honours that only for the admin, hence the auth headers)
+async function loadProducts(fresh = false) {
     try {
         // Add a cache-busting parameter to ensure fresh data is always fetched
         const cacheBuster = `?_=${new Date().getTime()}`;
-        const res = await fetch(`/api/products${cacheBuster}`);
+        const options = fresh ? { headers: { ...getAuthHeaders(), 'Cache-Control': 'no-cache' } } : undefined;
+        const res = await fetch(`/api/products${cacheBuster}`, options);
 
         if (!res.ok) throw new Error('Failed to load products');
-        const data = await res.json();
-
-        products = data.map(p => ({
-            id: p.id,
-            name: p.title,
-            description: p.description ?? '',
-            price: p.price,
-            image: p.image ?? ''
-        }));
-
-        renderProducts();
-        updateCartView();
+        applyProducts(await res.json());
     } catch (e) {
         console.error('Products fetch error:', e);
     }
 }
 
+function applyProducts(data) {
+    products = data.map(p => ({
+        id: p.id,
+        name: p.title,
+        description: p.description ?? '',
+        price: p.price,
+        image: p.image ?? ''
+    }));
+
+    renderProducts();
+    updateCartView();
+}
+
 // ==================== STATE MANAGEMENT ====================
 let cart = [];
 let deliveryType = 'delivery';
@@ -135,6 +165,7 @@ const renderProducts = () => {
     products.forEach((product, index) => {
         const card = document.createElement('div');
         card.className = 'product-card';
+        card.dataset.productId = product.id;
         card.style.animationDelay = `${index * 0.05}s`;
         
         const adminControls = adminEnabled ? `
@@ -216,6 +247,62 @@ const calculateTotal = () => {
     }, 0);
 };
 
+// Server-side price of the cart, delivery included (POST /api/orders/quote).
+// The server prices orders the same way, so this is what the user will pay.
+let quote = null;
+
+const orderTotalText = () => (quote ? quote.total_amount : calculateTotal());
+
+let quoteTimer = null;
+let quoteRequest = null; // AbortController of the quote in flight
+
+// Slot, zone and promo code change the price: sent with quotes and the order
+const pricingFields = () => ({
+    delivery_slot: document.getElementById('delivery-slot')?.value || null,
+    delivery_zone: (deliveryType === 'delivery' && document.getElementById('delivery-zone')?.value) || null,
+    promo_code: document.getElementById('promo-code')?.value.trim() || null,
+});
+
+const fetchQuote = async () => {
+    // Only the latest cart counts: a slow answer for an earlier one is dropped
+    quoteRequest?.abort();
+    quoteRequest = null;
+    if (cart.length === 0) {
+        quote = null;
+        return;
+    }
+    const request = new AbortController();
+    quoteRequest = request;
+    try {
+        const res = await fetch('/api/orders/quote', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                delivery_type: deliveryType,
+                ...pricingFields(),
+                items: cart.map(item => ({ product_id: item.id, quantity: item.quantity })),
+            }),
+            signal: request.signal,
+        });
+        // e.g. an unknown promo code: no quote; the order itself reports why
+        const data = res.ok ? await res.json() : null;
+        if (request.signal.aborted) return;
+        quote = data;
+        if (quote && elements.orderFormModalOverlay.classList.contains('active')) {
+            tg.MainButton.setText(`Подтвердить заказ · ${quote.total_amount} ₽`);
+        }
+    } catch (error) {
+        if (error.name !== 'AbortError') console.error('Quote failed:', error);
+    }
+};
+
+// Debounced: a burst of +/- taps costs one request
+const refreshQuote = () => {
+    clearTimeout(quoteTimer);
+    quoteRequest?.abort(); // its cart is already out of date
+    quoteTimer = setTimeout(fetchQuote, 250);
+};
+
 const updateCartView = () => {
     const totalItems = cart.reduce((sum, item) => sum + item.quantity, 0);
     const totalPrice = calculateTotal();
@@ -271,6 +358,8 @@ const updateCartView = () => {
     
     elements.cartTotal.textContent = `${totalPrice} ₽`;
     tg.MainButton.setText(`Оформить заказ · ${totalPrice} ₽`);
+    quote = null;
+    refreshQuote();
 };
 
 // ==================== MODAL FUNCTIONS ====================
@@ -301,6 +390,60 @@ const hideAdminModal = () => {
     closeModal(elements.adminModalOverlay, elements.adminModal);
 };
 
+// Delivery slots with free places, refreshed every time the form opens
+const slotLabel = (slot) => {
+    const start = new Date(slot.starts_at);
+    const end = new Date(slot.ends_at);
+    const day = start.toLocaleDateString('ru-RU', { weekday: 'short', day: 'numeric', month: 'short' });
+    const time = (d) => d.toLocaleTimeString('ru-RU', { hour: '2-digit', minute: '2-digit' });
+    return `${day}, ${time(start)}–${time(end)}`;
+};
+
+async function loadSlots() {
+    const group = document.getElementById('slot-group');
+    const select = document.getElementById('delivery-slot');
+    if (!group || !select) return;
+    try {
+        const res = await fetch('/api/slots');
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const slots = (await res.json()).filter(slot => slot.available > 0);
+        const selected = select.value;
+        select.innerHTML = (slotsRequired ? '' : '<option value="">Как можно скорее</option>') +
+            slots.map(slot => `<option value="${slot.starts_at}">${slotLabel(slot)}</option>`).join('');
+        if (slots.some(slot => slot.starts_at === selected)) select.value = selected;
+        group.style.display = slots.length || slotsRequired ? 'block' : 'none';
+    } catch (e) {
+        console.error('Slots fetch error:', e);
+        group.style.display = 'none';
+    }
+}
+
+// Delivery zones (empty: one fee everywhere), refreshed every time the form opens
+let deliveryZones = [];
+
+const updateZoneField = () => {
+    const group = document.getElementById('zone-group');
+    if (group) group.style.display = deliveryType === 'delivery' && deliveryZones.length ? 'block' : 'none';
+};
+
+async function loadZones() {
+    const select = document.getElementById('delivery-zone');
+    if (!select) return;
+    try {
+        const res = await fetch('/api/delivery-zones');
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        deliveryZones = await res.json();
+        const selected = select.value;
+        select.replaceChildren(...deliveryZones.map(zone => new Option(`${zone.name} · ${zone.fee} ₽`, zone.name)));
+        if (deliveryZones.some(zone => zone.name === selected)) select.value = selected;
+    } catch (e) {
+        console.error('Delivery zones fetch error:', e);
+        deliveryZones = [];
+    }
+    updateZoneField();
+    refreshQuote();
+}
+
 const showOrderForm = () => {
     console.log('[DEBUG] showOrderForm called, cart length:', cart.length);
     if (cart.length === 0) {
@@ -310,11 +453,13 @@ const showOrderForm = () => {
     }
 
     console.log('[DEBUG] Hiding cart modal and showing order form');
+    loadSlots();
+    loadZones();
     hideCartModal();
     setTimeout(() => {
         openModal(elements.orderFormModalOverlay, elements.orderFormModal);
         tg.MainButton.show();
-        tg.MainButton.setText(`Подтвердить заказ · ${calculateTotal()} ₽`);
+        tg.MainButton.setText(`Подтвердить заказ · ${orderTotalText()} ₽`);
         console.log('[DEBUG] Order form modal opened, MainButton shown');
     }, 300);
 };
@@ -351,6 +496,7 @@ const updateAddressField = () => {
     const addressInput = document.getElementById('address');
     elements.addressGroup.style.display = deliveryType === 'delivery' ? 'block' : 'none';
     addressInput.required = deliveryType === 'delivery';
+    updateZoneField();
 };
 
 const handleMainButtonClick = async () => {
@@ -376,6 +522,12 @@ const handleMainButtonClick = async () => {
         return;
     }
 
+    const deliverySlot = document.getElementById('delivery-slot')?.value || null;
+    if (slotsRequired && !deliverySlot) {
+        tg.showAlert('Пожалуйста, выберите время получения.');
+        return;
+    }
+
     // Show loading indicator on the main button
     tg.MainButton.showProgress();
 
@@ -386,6 +538,7 @@ const handleMainButtonClick = async () => {
         delivery_type: deliveryType, // FIX: Use correct variable name
         payment_type: paymentType,   // FIX: Use correct variable name
         comment: document.getElementById('comment').value,
+        ...pricingFields(),
         items: cart.map(item => {
             const product = products.find(p => p.id === item.id);
             return {
@@ -403,7 +556,7 @@ const handleMainButtonClick = async () => {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
-                'X-Telegram-Id': String(telegramUserId || ''),
+                ...getAuthHeaders(),
             },
             body: JSON.stringify(orderData)
         });
@@ -424,7 +577,7 @@ const handleMainButtonClick = async () => {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'X-Telegram-Id': String(telegramUserId || ''),
+                    ...getAuthHeaders(),
                 },
                 body: JSON.stringify({ order_id: order.id }),
             });
@@ -507,10 +660,33 @@ const navigateTo = (pageId) => {
     tg.HapticFeedback.impactOccurred('light');
 };
 
+// Deep link from the bot's /menu: ?product=<id> opens the menu at that product
+const openLinkedProduct = () => {
+    const productId = new URLSearchParams(window.location.search).get('product');
+    if (!productId) return;
+    const card = elements.menuGrid.querySelector(`.product-card[data-product-id="${CSS.escape(productId)}"]`);
+    if (!card) return;
+    navigateTo('menu');
+    card.classList.add('highlighted');
+    setTimeout(() => card.scrollIntoView({ behavior: 'smooth', block: 'center' }), 300);
+};
+
 // ==================== EVENT LISTENERS ====================
 
-// Load config first, then products
-loadConfig().then(() => loadProducts());
+// Use the inlined bootstrap data when present; otherwise load config first, then products
+const bootstrapData = readBootstrapData();
+if (bootstrapData?.config) {
+    applyConfig(bootstrapData.config);
+    // Paint the inlined first page right away; fetch the rest only if it was truncated
+    applyProducts(bootstrapData.products ?? []);
+    if (!bootstrapData.products_complete) {
+        loadProducts().then(openLinkedProduct);
+    } else {
+        openLinkedProduct();
+    }
+} else {
+    loadConfig().then(() => loadProducts()).then(openLinkedProduct);
+}
 
 // Navigation
 elements.navLinks.addEventListener('click', (e) => {
@@ -570,7 +746,7 @@ elements.menuGrid.addEventListener('click', async (e) => {
                 headers: getAdminHeaders()
             });
             if (!res.ok) throw new Error('Delete failed');
-            await loadProducts();
+            await loadProducts(true);
             tg.HapticFeedback.notificationOccurred('success');
         } catch (err) {
             console.error(err);
@@ -649,7 +825,7 @@ if (elements.adminForm) {
             try {
                 const uploadRes = await fetch('/api/admin/upload-image', {
                     method: 'POST',
-                    headers: { 'X-Telegram-Id': String(telegramUserId || '') },
+                    headers: getAuthHeaders(),
                     body: formData
                 });
                 if (!uploadRes.ok) throw new Error('Upload failed');
@@ -681,7 +857,7 @@ if (elements.adminForm) {
                 const errText = await res.text();
                 throw new Error(errText || 'Admin save failed');
             }
-            await loadProducts();
+            await loadProducts(true);
             hideAdminModal();
             if (elements.adminImagePreview) {
                 elements.adminImagePreview.src = '';
@@ -771,6 +947,7 @@ elements.orderForm.addEventListener('click', (e) => {
     if (option.dataset.delivery) {
         deliveryType = option.dataset.delivery;
         updateAddressField();
+        refreshQuote();
     }
     
     if (option.dataset.payment) {
@@ -825,6 +1002,11 @@ observer.observe(document.body, {
     attributeFilter: ['class']
 });
 
+// Re-quote when anything that changes the price changes
+document.getElementById('delivery-slot')?.addEventListener('change', refreshQuote);
+document.getElementById('delivery-zone')?.addEventListener('change', refreshQuote);
+document.getElementById('promo-code')?.addEventListener('input', refreshQuote);
+
 // ==================== FORM VALIDATION ====================
 const phoneInput = document.getElementById('phone');
 
@@ -1058,29 +1240,6 @@ const getProduct = (id) => {
     return products.find(p => p.id === id);
 };
 
-// Calculate delivery cost
-const getDeliveryCost = () => {
-    const total = calculateTotal();
-    const FREE_DELIVERY_THRESHOLD = 1500;
-    const DELIVERY_COST = 250;
-    
-    if (deliveryType === 'pickup') return 0;
-    return total >= FREE_DELIVERY_THRESHOLD ? 0 : DELIVERY_COST;
-};
-
-// Update cart total with delivery
-const updateCartTotalWithDelivery = () => {
-    const subtotal = calculateTotal();
-    const delivery = getDeliveryCost();
-    const total = subtotal + delivery;
-    
-    return {
-        subtotal,
-        delivery,
-        total
-    };
-};
-
 // Export for debugging (remove in production)
 if (typeof window !== 'undefined') {
     window.bakeryApp = {
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Супервизор процессов: несколько воркеров uvicorn на одном порту и Telegram бот.
+
+- Схему БД (таблицы, новые колонки, индексы) супервизор готовит один раз,
+  до старта воркеров, чтобы N процессов не меняли её одновременно.
+- Слушающий сокет открывает супервизор и передаёт его всем воркерам,
+  поэтому при перезапуске воркера порт не закрывается ни на миг.
+- Каждый воркер дополнительно слушает свой приватный порт на 127.0.0.1 —
+  по нему супервизор проверяет /health именно этого воркера.
+- Упавший процесс перезапускается с экспоненциальной задержкой.
+- SIGTERM/SIGINT: воркеры получают SIGTERM и дообрабатывают текущие запросы.
+- SIGHUP: поочерёдный (rolling) перезапуск воркеров без простоя.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Callable, List, Optional
+
+ROOT = Path(__file__).resolve().parent
+
+HEALTH_PATH = "/health"
+READY_TIMEOUT = 60.0          # сколько ждём /health от нового воркера
+GRACEFUL_TIMEOUT = 30         # сколько воркер дообрабатывает запросы после SIGTERM
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+STABLE_AFTER = 60.0           # процесс, проживший дольше, считается здоровым
+
+# Передача сокета дочернему процессу через fd работает только на POSIX
+FD_PASSING = os.name == "posix"
+
+
+def _backend(name: str) -> str:
+    return os.getenv(name, "memory").strip().lower()
+
+
+def default_workers() -> int:
+    """Количество воркеров: WEB_CONCURRENCY; иначе число CPU, если кэш и лимиты
+    запросов общие (Redis), и один воркер, если они в памяти процесса."""
+    value = os.getenv("WEB_CONCURRENCY")
+    if value:
+        return max(1, int(value))
+    if _backend("CACHE_BACKEND") != "redis" or _backend("RATE_LIMIT_BACKEND") != "redis":
+        return 1
+    return os.cpu_count() or 1
+
+
+def multi_worker_warnings(workers: int) -> List[str]:
+    """Что работает хуже, когда воркеров больше одного."""
+    warnings = []
+    if _backend("CACHE_BACKEND") != "redis":
+        warnings.append("CACHE_BACKEND=memory: изменения каталога и правил цен доходят до остальных воркеров "
+                        "только через CATALOG_CACHE_MAX_AGE / PRICING_CACHE_MAX_AGE секунд")
+    if _backend("RATE_LIMIT_BACKEND") != "redis":
+        warnings.append("RATE_LIMIT_BACKEND=memory: лимиты запросов считаются в каждом воркере отдельно, "
+                        f"то есть в {workers} раз мягче")
+    # EventHub живёт в памяти процесса при любом бэкенде
+    warnings.append("лента заказов админа (/api/admin/orders/ws) показывает только заказы, "
+                    "принятые тем же воркером")
+    return warnings
+
+
+def prepare_metrics_dir() -> Optional[Path]:
+    """Каталог для метрик Prometheus всех процессов (multiprocess mode).
+
+    Передаётся воркерам через PROMETHEUS_MULTIPROC_DIR и очищается перед
+    стартом: файлы от прошлого запуска исказили бы счётчики. Возвращает путь,
+    если каталог создан супервизором (его нужно удалить при остановке).
+    """
+    configured = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    path = Path(configured) if configured else Path(tempfile.mkdtemp(prefix="fastteleap-metrics-"))
+    for item in path.glob("*.db"):
+        item.unlink()
+    path.mkdir(parents=True, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(path)
+    return None if configured else path
+
+
+def mark_process_dead(pid: int) -> None:
+    """Убирает gauge-метрики завершившегося процесса (например, in-flight)."""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(pid)
+
+
+def check_health(port: int, timeout: float = 1.0) -> bool:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{HEALTH_PATH}", timeout=timeout) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+class Child:
+    """Один дочерний процесс под наблюдением супервизора."""
+
+    def __init__(self, name: str, spawn: Callable[["Child"], subprocess.Popen],
+                 ready_port: Optional[Callable[["Child"], Optional[int]]] = None):
+        self.name = name
+        self._spawn = spawn
+        self._ready_port = ready_port
+        self.process: Optional[subprocess.Popen] = None
+        self.health_port: Optional[int] = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at: Optional[float] = None
+
+    def start(self) -> None:
+        self.process = self._spawn(self)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def wait_ready(self, timeout: float = READY_TIMEOUT) -> bool:
+        """Ждёт, пока процесс ответит на /health (если проверка задана)."""
+        port = self._ready_port(self) if self._ready_port else None
+        if port is None:
+            return self.alive
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.alive:
+                return False
+            if check_health(port):
+                return True
+            time.sleep(0.2)
+        return False
+
+    def schedule_restart(self) -> float:
+        """Планирует перезапуск с экспоненциальной задержкой и возвращает её."""
+        if time.monotonic() - self.started_at > STABLE_AFTER:
+            self.failures = 0
+        self.failures += 1
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+        self.restart_at = time.monotonic() + delay
+        return delay
+
+    def terminate(self) -> None:
+        if self.alive:
+            self.process.send_signal(signal.SIGTERM)
+
+    def wait_exit(self, timeout: float) -> None:
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️ {self.name} не завершился за {timeout:.0f} с — kill")
+            self.process.kill()
+            self.process.wait()
+
+
+class Supervisor:
+    def __init__(self, app: str, host: str, port: int, workers: int, with_bot: bool):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers_count = workers if FD_PASSING else 1
+        self.with_bot = with_bot
+        self.listen_socket: Optional[socket.socket] = None
+        self.workers: List[Child] = []
+        self.bot: Optional[Child] = None
+        self._stopping = False
+        self._reload_requested = False
+        self.metrics_dir: Optional[Path] = None
+
+    # ---------- запуск процессов ----------
+
+    def _spawn_worker(self, child: Child) -> subprocess.Popen:
+        if not FD_PASSING:
+            child.health_port = self.port
+            return subprocess.Popen([
+                sys.executable, "-m", "uvicorn", self.app,
+                "--host", self.host, "--port", str(self.port),
+                "--timeout-graceful-shutdown", str(GRACEFUL_TIMEOUT),
+            ], cwd=ROOT)
+
+        # Приватный сокет для проверки готовности именно этого воркера
+        health_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        health_socket.bind(("127.0.0.1", 0))
+        health_socket.listen(16)
+        health_socket.set_inheritable(True)
+        child.health_port = health_socket.getsockname()[1]
+
+        listen_fd = self.listen_socket.fileno()
+        health_fd = health_socket.fileno()
+        try:
+            return subprocess.Popen([
+                sys.executable, str(Path(__file__).resolve()), "worker",
+                "--app", self.app, "--fd", str(listen_fd), "--fd", str(health_fd),
+            ], cwd=ROOT, pass_fds=(listen_fd, health_fd))
+        finally:
+            # Копия сокета осталась у воркера
+            health_socket.close()
+
+    def _spawn_bot(self, child: Child) -> subprocess.Popen:
+        return subprocess.Popen([sys.executable, "bot.py"], cwd=ROOT)
+
+    def _prepare_database(self) -> bool:
+        # Отдельным процессом: сам супервизор не импортирует приложение
+        result = subprocess.run([sys.executable, str(Path(__file__).resolve()), "prepare-db"], cwd=ROOT)
+        return result.returncode == 0
+
+    def _new_worker(self, index: int) -> Child:
+        return Child(f"worker-{index}", self._spawn_worker, lambda child: child.health_port)
+
+    def _bind(self) -> None:
+        if not FD_PASSING:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        self.listen_socket = sock
+
+    # ---------- сигналы ----------
+
+    def _on_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _on_reload(self, signum, frame) -> None:
+        self._reload_requested = True
+
+    def _install_signals(self) -> None:
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._on_reload)
+
+    # ---------- основной цикл ----------
+
+    def start(self) -> bool:
+        if self.workers_count > 1:
+            for warning in multi_worker_warnings(self.workers_count):
+                print(f"⚠️ {self.workers_count} воркер(ов): {warning}")
+        if not self._prepare_database():
+            print("❌ Не удалось подготовить схему БД")
+            return False
+        self._bind()
+        # Воркеры (и бот) наследуют переменную окружения
+        self.metrics_dir = prepare_metrics_dir()
+        for index in range(self.workers_count):
+            worker = self._new_worker(index)
+            worker.start()
+            self.workers.append(worker)
+        for worker in self.workers:
+            if not worker.wait_ready():
+                print(f"❌ {worker.name} не прошёл проверку {HEALTH_PATH}")
+                return False
+        print(f"✅ FastAPI: {self.workers_count} воркер(ов) готовы на http://{self.host}:{self.port}")
+
+        # Бот стартует только когда API уже отвечает
+        if self.with_bot:
+            self.bot = Child("bot", self._spawn_bot)
+            self.bot.start()
+        return True
+
+    def rolling_restart(self) -> None:
+        """Поочерёдно заменяет воркеров: новый готов -> старый дообрабатывает и выходит."""
+        print("🔄 Rolling restart воркеров...")
+        for index, old in enumerate(list(self.workers)):
+            if self._stopping:
+                return
+            new = self._new_worker(index)
+            new.start()
+            if not new.wait_ready():
+                print(f"❌ Новый {new.name} не поднялся, rolling restart прерван")
+                new.terminate()
+                new.wait_exit(GRACEFUL_TIMEOUT)
+                return
+            self.workers[index] = new
+            old.terminate()
+            old.wait_exit(GRACEFUL_TIMEOUT + 5)
+            mark_process_dead(old.process.pid)
+        print("✅ Rolling restart завершён")
+
+    def _check_children(self) -> None:
+        now = time.monotonic()
+        for child in self.workers + ([self.bot] if self.bot else []):
+            if child.alive:
+                continue
+            if child.restart_at is None:
+                mark_process_dead(child.process.pid)
+                delay = child.schedule_restart()
+                print(f"❌ {child.name} завершился (код {child.process.returncode}), "
+                      f"перезапуск через {delay:.0f} с")
+            elif now >= child.restart_at:
+                print(f"🔁 Перезапуск {child.name}")
+                child.start()
+
+    def run(self) -> int:
+        self._install_signals()
+        if not self.start():
+            self.shutdown()
+            return 1
+        try:
+            while not self._stopping:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.rolling_restart()
+                self._check_children()
+                time.sleep(0.5)
+        finally:
+            self.shutdown()
+        return 0
+
+    def shutdown(self) -> None:
+        print("\n🛑 Остановка сервисов...")
+        children = self.workers + ([self.bot] if self.bot else [])
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.wait_exit(GRACEFUL_TIMEOUT + 5)
+        if self.listen_socket is not None:
+            self.listen_socket.close()
+        if self.metrics_dir is not None:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        print("✅ Сервисы остановлены")
+
+
+def run_worker(app: str, fds: List[int]) -> None:
+    """Точка входа воркера: uvicorn на переданных супервизором сокетах."""
+    import uvicorn
+
+    sockets = [socket.socket(fileno=fd) for fd in fds]
+    config = uvicorn.Config(app, timeout_graceful_shutdown=GRACEFUL_TIMEOUT, proxy_headers=True)
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+def prepare_database() -> None:
+    """Таблицы, новые колонки, индексы, перевод денег в копейки — до старта воркеров.
+
+    Воркеры повторяют это в lifespan, но к тому времени менять уже нечего.
+    """
+    import logging
+
+    from app import models  # noqa: F401  (регистрирует таблицы)
+    from app.database import prepare_schema
+
+    logging.basicConfig(level=logging.INFO)
+    prepare_schema()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Супервизор FastAPI воркеров и Telegram бота")
+    sub = parser.add_subparsers(dest="command")
+
+    serve = sub.add_parser("serve", help="запустить воркеров (и бота)")
+    serve.add_argument("--app", default="main:app")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--workers", type=int, default=default_workers())
+    serve.add_argument("--no-bot", action="store_true", help="не запускать bot.py")
+
+    worker = sub.add_parser("worker", help="(внутреннее) процесс воркера")
+    worker.add_argument("--app", default="main:app")
+    worker.add_argument("--fd", type=int, action="append", required=True)
+
+    sub.add_parser("prepare-db", help="(внутреннее) подготовить схему БД")
+
+    args = parser.parse_args(argv)
+    if args.command == "prepare-db":
+        prepare_database()
+        return 0
+    if args.command == "worker":
+        run_worker(args.app, args.fd)
+        return 0
+    if args.command != "serve":
+        parser.print_help()
+        return 1
+    supervisor = Supervisor(args.app, args.host, args.port, args.workers, with_bot=not args.no_bot)
+    return supervisor.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())